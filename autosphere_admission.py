@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Admission Control
+Per-client token-bucket rate limits and a priority queue for chat request slots
+"""
+
+import asyncio
+import heapq
+import itertools
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+import autosphere_metrics as metrics
+
+# Lower numbers are admitted first when requests wait for a slot
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+class Overloaded(Exception):
+    """Raised when a request is not admitted"""
+
+    def __init__(self, status, retry_after, reason):
+        super().__init__(f"Request not admitted ({reason})")
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+def parse_limits(spec):
+    """Parse ``"interactive=1:20,batch=20:1000"`` into ``{class: (rate, burst)}``"""
+    limits = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, value = item.split("=", 1)
+            rate, _, burst = value.partition(":")
+            limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+def refill(tokens, updated, rate, burst, now):
+    """Tokens in a bucket at ``now``, given its level when last updated"""
+    return min(burst, tokens + (now - updated) * rate)
+
+class MemoryBucketStore:
+    """Token buckets in this process; idle clients are dropped past ``max_clients``"""
+
+    def __init__(self, max_clients=100000):
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost):
+        """Take ``cost`` tokens; return 0 if allowed, else seconds until they are available"""
+        now = time.time()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            tokens = refill(tokens, updated, rate, burst, now)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+            return wait
+
+class SQLiteBucketStore:
+    """Token buckets in a SQLite file, shared by every process that opens it"""
+
+    def __init__(self, path, idle_ttl=3600):
+        self.path = path
+        self.idle_ttl = idle_ttl
+        self._takes = 0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets (client TEXT PRIMARY KEY, tokens REAL, updated REAL)"
+        )
+        conn.commit()
+
+    def _connect(self):
+        # One connection per thread; the file is the shared state
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key, rate, burst, cost):
+        """Take ``cost`` tokens; return 0 if allowed, else seconds until they are available"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE client = ?", (key,)).fetchone()
+            tokens = refill(*(row or (burst, now)), rate, burst, now)
+            wait = 0.0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            conn.execute("INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)", (key, tokens, now))
+            self._takes += 1
+            if self._takes % 1000 == 0:
+                # Buckets idle this long are full again and need not be stored
+                conn.execute("DELETE FROM buckets WHERE updated < ?", (now - self.idle_ttl,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+def open_bucket_store(spec):
+    """Open a bucket store from ``memory`` or ``sqlite:///path/to/file.db``"""
+    if spec and spec.startswith("sqlite:///"):
+        return SQLiteBucketStore(spec[len("sqlite:///"):])
+    return MemoryBucketStore()
+
+class RateLimiter:
+    """Token-bucket limits per client and priority class.
+
+    Each class has its own ``(rate, burst)``: a client may send ``burst``
+    requests at once and ``rate`` per second after that. Classes without a
+    limit are not limited.
+    """
+
+    def __init__(self, limits, store=None):
+        self.limits = limits
+        self.store = store or MemoryBucketStore()
+        self.allowed = Counter()
+        self.limited = Counter()
+
+    def check(self, client, priority, cost=1):
+        """Return 0 if the request may proceed, else the seconds to wait before retrying"""
+        if priority not in self.limits:
+            return 0
+        rate, burst = self.limits[priority]
+        # A request larger than the burst is let through once the bucket is full
+        wait = self.store.take(f"{priority}:{client}", rate, burst, min(cost, burst))
+        if wait:
+            self.limited[priority] += 1
+            metrics.admission_rejected_total.inc(priority=priority, reason="rate_limit")
+        else:
+            self.allowed[priority] += 1
+        return wait
+
+    def stats(self):
+        return {"allowed": dict(self.allowed), "limited": dict(self.limited)}
+
+class Slot:
+    """An admitted request's hold on one in-flight slot"""
+
+    def __init__(self, gate):
+        self.gate = gate
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.gate.release()
+
+class Waiter:
+    def __init__(self, priority):
+        self.priority = priority
+        self.admitted = False
+        self.shed = False
+        # Called with the gate's lock held when the waiter is admitted or shed
+        self.wake = lambda: None
+
+class PriorityGate:
+    """Caps in-flight requests; waiting requests are admitted by priority, then arrival.
+
+    A request that finds the queue full pushes out the newest waiter of a
+    lower priority class (which gets 503), or is rejected with 429 if there
+    is none. A request that waits longer than ``queue_timeout`` gets 503.
+    Freed slots are handed straight to the next waiter, so threads and
+    asyncio tasks (``acquire_async``) can share one gate.
+    """
+
+    def __init__(self, max_in_flight=32, max_queue=64, queue_timeout=30, retry_after=5):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.rejected = Counter()
+        self._queue = []
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+
+    def _enter(self, priority):
+        """Take a free slot (returning None) or join the queue (returning the entry); may raise Overloaded"""
+        rank = PRIORITIES.get(priority, len(PRIORITIES))
+        if self.in_flight < self.max_in_flight and not self._queue:
+            self.in_flight += 1
+            return None
+        if len(self._queue) >= self.max_queue and not self._shed_for(rank):
+            self._reject(priority, "queue_full")
+            raise Overloaded(429, self.retry_after, "queue_full")
+        entry = (rank, next(self._order), Waiter(priority))
+        heapq.heappush(self._queue, entry)
+        return entry
+
+    def _leave(self, entry, reason):
+        """Give up waiting: keep a slot handed over meanwhile, else raise Overloaded"""
+        waiter = entry[2]
+        if waiter.admitted:
+            return
+        if waiter.shed:
+            raise Overloaded(503, self.retry_after, "shed")
+        self._remove(entry)
+        self._reject(waiter.priority, reason)
+        raise Overloaded(503, self.retry_after, reason)
+
+    def acquire(self, priority="interactive"):
+        """Wait for a slot; return a Slot or raise Overloaded"""
+        start = time.perf_counter()
+        with self._cond:
+            entry = self._enter(priority)
+            if entry is not None:
+                waiter = entry[2]
+                waiter.wake = self._cond.notify_all
+                deadline = time.monotonic() + self.queue_timeout
+                while not waiter.admitted and not waiter.shed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._leave(entry, "timeout")
+        metrics.admission_wait_seconds.observe(time.perf_counter() - start, priority=priority)
+        return Slot(self)
+
+    async def acquire_async(self, priority="interactive"):
+        """Wait for a slot without blocking the event loop; return a Slot or raise Overloaded"""
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        with self._cond:
+            entry = self._enter(priority)
+            if entry is not None:
+                woken = loop.create_future()
+
+                def wake():
+                    loop.call_soon_threadsafe(lambda: woken.done() or woken.set_result(None))
+                entry[2].wake = wake
+        if entry is not None:
+            try:
+                await asyncio.wait_for(woken, self.queue_timeout)
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # The client went away: hand back a slot it was given, or leave the queue
+                with self._cond:
+                    if entry[2].admitted:
+                        self._release()
+                    elif not entry[2].shed:
+                        self._remove(entry)
+                raise
+            with self._cond:
+                self._leave(entry, "timeout")
+        metrics.admission_wait_seconds.observe(time.perf_counter() - start, priority=priority)
+        return Slot(self)
+
+    def _dispatch(self):
+        """Hand free slots to the waiters at the front of the queue"""
+        while self._queue and self.in_flight < self.max_in_flight:
+            _, _, waiter = heapq.heappop(self._queue)
+            self.in_flight += 1
+            waiter.admitted = True
+            waiter.wake()
+
+    def _shed_for(self, rank):
+        """Drop the newest waiter ranked below ``rank``; return whether one was dropped"""
+        if not self._queue:
+            return False
+        victim = max(self._queue, key=lambda entry: (entry[0], entry[1]))
+        if victim[0] <= rank:
+            return False
+        victim[2].shed = True
+        self._remove(victim)
+        self._reject(victim[2].priority, "shed")
+        victim[2].wake()
+        return True
+
+    def _remove(self, entry):
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+
+    def _reject(self, priority, reason):
+        self.rejected[reason] += 1
+        metrics.admission_rejected_total.inc(priority=priority, reason=reason)
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def release(self):
+        with self._cond:
+            self._release()
+
+    def stats(self):
+        """Return a snapshot of admission state for health reporting"""
+        with self._cond:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": dict(Counter(entry[2].priority for entry in self._queue)),
+                "rejected": dict(self.rejected),
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+            }
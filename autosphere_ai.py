@@ -5,25 +5,62 @@ Standalone Python script version of the AI agent
 """
 
 import os
+import sys
+import asyncio
 import getpass
-import requests
-from langchain_ibm import ChatWatsonx
-from ibm_watsonx_ai import APIClient
-from langchain_core.messages import AIMessage, HumanMessage
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.prebuilt import create_react_agent
-from ibm_watsonx_ai.foundation_models.utils import Tool, Toolkit
-from ibm_watsonx_ai.deployments import RuntimeContext
-from langchain_core.tools import StructuredTool
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+# The IBM, LangChain and LangGraph libraries take over a second to import, so
+# they are imported where used and loaded up front by load_dependencies()
+from autosphere_cache import (
+    CASE_SENSITIVE_TOOLS, DEFAULT_TOOL_TTLS, MemoryCacheBackend, SQLiteCacheBackend, ToolCache, ToolMetadataCache,
+    normalize, parse_ttls
+)
+import autosphere_metrics as metrics
+import autosphere_tracing as tracing
 import json
 
+class ErrorReply(str):
+    """Apology sent in place of an answer; callers tell it from an answer by type, not wording"""
+
+NOT_INITIALIZED_REPLY = ErrorReply("Sorry, the AI service is not initialized. Please check your configuration.")
+ERROR_REPLY = ErrorReply("Sorry, I encountered an error while processing your message. Please try again.")
+
+# Tools given to the agent, with the config passed on each run
+TOOL_PARAMS = {
+    "GoogleSearch": None,
+    "WebCrawler": {},
+    "Wikipedia": {"maxResults": 5},
+    "DuckDuckGo": {},
+    "Weather": {},
+}
+
 class AutoSphereAI:
     def __init__(self, api_key=None, project_id=None):
         """Initialize AutoSphere AI with credentials"""
         self.api_key = api_key
         self.project_id = project_id
         self.client = None
+        self.token_manager = None
         self.agent = None
+        self.memory = None
+        self.context_window = None
+        self.tool_cache = self.create_tool_cache()
+        self.response_cache = self.create_response_cache()
+        self.tool_runner = self.create_tool_runner()
+        self.retriever = self.create_retriever()
+        self.router = self.create_router()
+        self.chat_flight, self.tool_flight, self.normalize_message = self.create_single_flight()
+        self.chat_model = None
+        self.tools = {}
+        self.instructions = None
+        self.agent_models = {}
+        self.cascade = None
+        self.default_session_id = uuid.uuid4().hex
+        self.startup_phases = {}
         self.initialized = False
         
         if api_key and project_id:
@@ -53,21 +90,27 @@ class AutoSphereAI:
 
     def validate_api_key(self, apikey):
         """Check if the given API key is valid by trying to fetch a Bearer token."""
-        url = "https://iam.cloud.ibm.com/identity/token"
-        headers = {"Content-Type": "application/x-www-form-urlencoded"}
-        data = f"grant_type=urn:ibm:params:oauth:grant-type:apikey&apikey={apikey}"
-
-        response = requests.post(url, headers=headers, data=data)
-
-        if response.status_code == 200:
-            token = response.json().get("access_token")
-            if token:
-                return True, token
-        return False, None
+        from autosphere_auth import IAMTokenManager
+        
+        if self.token_manager is None or self.token_manager.apikey != apikey:
+            self.token_manager = IAMTokenManager(
+                apikey,
+                refresh_margin=int(os.getenv('IAM_REFRESH_MARGIN', 300))
+            )
+        return self.token_manager.validate()
 
     def create_utility_agent_tool(self, tool_name, params, api_client, **kwargs):
         """Create utility agent tool"""
-        utility_agent_tool = Toolkit(api_client=api_client).get_tool(tool_name)
+        from ibm_watsonx_ai.foundation_models.utils import Toolkit
+        from langchain_core.runnables import RunnableConfig
+        from langchain_core.tools import StructuredTool
+        from autosphere_retrieval import RETRIEVAL_TOOLS, source_key
+        from autosphere_tools import remaining_time
+        
+        retriever = self.retriever if tool_name in RETRIEVAL_TOOLS else None
+        utility_agent_tool = kwargs.get("utility_agent_tool")
+        if utility_agent_tool is None:
+            utility_agent_tool = Toolkit(api_client=api_client).get_tool(tool_name)
         tool_description = utility_agent_tool.get("description")
 
         if kwargs.get("tool_description"):
@@ -89,13 +132,66 @@ class AutoSphereAI:
                 }
             }
         
-        def run_tool(**tool_input):
+        # The annotation lets LangChain pass in the run config, which carries the question
+        def run_tool(config: RunnableConfig = None, **tool_input):
             query = tool_input
             if utility_agent_tool.get("input_schema") is None:
                 query = tool_input.get("input")
-
-            results = utility_agent_tool.run(input=query, config=params)
-            return results.get("output")
+            
+            if retriever is None:
+                return run_fetch(query)
+            
+            # Pages in the index are answered without fetching them again until they expire
+            source = source_key(tool_name, query)
+            if self.tool_cache is not None:
+                max_age = self.tool_cache.ttl_for(tool_name)
+            else:
+                max_age = DEFAULT_TOOL_TTLS.get(tool_name)
+            if not retriever.has_source(source, max_age):
+                started = time.time()
+                result = run_fetch(query)
+                ingested = retriever.ingested_at(source)
+                if ingested is None or ingested < started:
+                    # Timed out, failed or empty: pass the result on as it is
+                    return result
+            question = (config or {}).get("configurable", {}).get("question") or str(query)
+            return retriever.excerpts(source, question)
+        
+        def run_fetch(query):
+            if self.tool_runner is None:
+                return fetch_shared(query)
+            return self.tool_runner.run(tool_name, query)
+        
+        def fetch_shared(query):
+            if self.tool_flight is None:
+                return fetch_indexed(query)
+            # Identical calls already running (from any request) share one fetch
+            key = json.dumps(
+                [tool_name, normalize(query, tool_name not in CASE_SENSITIVE_TOOLS), params],
+                sort_keys=True, default=str,
+            )
+            # Callers stop waiting at their own deadline, freeing the tool thread
+            return self.tool_flight.do(key, lambda: fetch_indexed(query), timeout=remaining_time())[0]
+        
+        def fetch_indexed(query):
+            def fetch():
+                results = utility_agent_tool.run(input=query, config=params)
+                return results.get("output")
+            
+            if self.tool_cache is None or retriever is not None:
+                # Pages are kept in the index instead, which expires them with the same TTL
+                result = fetch()
+            else:
+                result = self.tool_cache.get_or_run(tool_name, query, params, fetch)
+            if retriever is not None and result:
+                with tracing.span("index_page", tool=tool_name) as span:
+                    chunks = retriever.ingest(source_key(tool_name, query), result)
+                    if span is not None:
+                        span.attributes["chunks"] = chunks
+            return result
+        
+        if self.tool_runner is not None:
+            self.tool_runner.register(tool_name, fetch_shared)
         
         return StructuredTool(
             name=tool_name,
@@ -104,35 +200,167 @@ class AutoSphereAI:
             args_schema=tool_schema
         )
 
-    def create_tools(self, client):
-        """Create all available tools"""
-        tools = []
+    def create_tool_cache(self):
+        """Create the tool result cache, or None when disabled"""
+        if os.getenv('TOOL_CACHE_ENABLED', 'True').lower() != 'true':
+            return None
+        
+        max_entries = int(os.getenv('TOOL_CACHE_MAX_ENTRIES', 1000))
+        cache_path = os.getenv('TOOL_CACHE_PATH')
+        if cache_path:
+            backend = SQLiteCacheBackend(cache_path, max_entries=max_entries)
+        else:
+            backend = MemoryCacheBackend(max_entries=max_entries)
+        
+        return ToolCache(backend=backend, ttls=parse_ttls(os.getenv('TOOL_CACHE_TTLS')))
+
+    def create_response_cache(self):
+        """Create the cache of answered questions, or None when disabled"""
+        if os.getenv('RESPONSE_CACHE_ENABLED', 'True').lower() != 'true':
+            return None
+        
+        from autosphere_responses import NearDuplicateIndex, ResponseCache
+        from autosphere_singleflight import make_normalizer
         
-        # Google Search
-        tools.append(self.create_utility_agent_tool("GoogleSearch", None, client))
+        max_entries = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+        cache_path = os.getenv('RESPONSE_CACHE_PATH')
+        if cache_path:
+            backend = SQLiteCacheBackend(cache_path, max_entries=max_entries, table="response_cache")
+        else:
+            backend = MemoryCacheBackend(max_entries=max_entries)
         
-        # Web Crawler
-        tools.append(self.create_utility_agent_tool("WebCrawler", {}, client))
+        near_duplicates = None
+        if os.getenv('RESPONSE_CACHE_NEAR_DUPLICATES', 'False').lower() == 'true':
+            near_duplicates = NearDuplicateIndex(
+                threshold=float(os.getenv('RESPONSE_CACHE_SIMILARITY', 0.8)),
+                max_entries=max_entries,
+            )
+        
+        return ResponseCache(
+            backend=backend,
+            ttl=float(os.getenv('RESPONSE_CACHE_TTL', 24 * 60 * 60)),
+            tool_ttls=parse_ttls(os.getenv('RESPONSE_CACHE_TOOL_TTLS')),
+            normalize=make_normalizer(os.getenv('RESPONSE_CACHE_NORMALIZE', 'whitespace,case,punctuation')),
+            near_duplicates=near_duplicates,
+        )
+
+    def create_tool_runner(self):
+        """Create the runner that applies tool deadlines and search hedging, or None when disabled"""
+        from autosphere_tools import SEARCH_TOOLS, ToolRunner
+        
+        default_timeout = float(os.getenv('TOOL_TIMEOUT', 30))
+        if default_timeout <= 0:
+            return None
+        
+        hedged = os.getenv('TOOL_HEDGE_SEARCH', 'False').lower() == 'true'
+        return ToolRunner(
+            timeouts=parse_ttls(os.getenv('TOOL_TIMEOUTS')),
+            default_timeout=default_timeout,
+            hedge_groups=[SEARCH_TOOLS] if hedged else [],
+            hedge_delay=float(os.getenv('TOOL_HEDGE_DELAY', 0.5)),
+            max_workers=int(os.getenv('TOOL_MAX_WORKERS', 32)),
+            max_per_tool=int(os.getenv('TOOL_MAX_IN_FLIGHT', 8)),
+        )
+
+    def create_retriever(self):
+        """Create the chunk index for page-sized tool results, or None when disabled"""
+        if os.getenv('RETRIEVAL_ENABLED', 'True').lower() != 'true':
+            return None
+        
+        from autosphere_retrieval import Retriever
+        
+        return Retriever(
+            top_k=int(os.getenv('RETRIEVAL_TOP_K', 4)),
+            chunk_chars=int(os.getenv('RETRIEVAL_CHUNK_CHARS', 1000)),
+            max_page_chars=int(os.getenv('RETRIEVAL_MAX_PAGE_CHARS', 200000)),
+            max_chunks=int(os.getenv('RETRIEVAL_MAX_CHUNKS', 20000)),
+        )
+
+    def create_router(self):
+        """Create the intent router that answers simple messages directly, or None when disabled"""
+        if os.getenv('ROUTER_ENABLED', 'True').lower() != 'true':
+            return None
+        
+        from autosphere_router import IntentRouter, load_rules
         
-        # Wikipedia
-        tools.append(self.create_utility_agent_tool("Wikipedia", {"maxResults": 5}, client))
+        return IntentRouter(
+            rules=load_rules(os.getenv('ROUTER_RULES')),
+            classifier=os.getenv('ROUTER_CLASSIFIER', 'False').lower() == 'true',
+            min_confidence=float(os.getenv('ROUTER_MIN_CONFIDENCE', 0.8)),
+        )
+
+    def create_single_flight(self):
+        """Create the chat and tool request coalescers and the chat message normalizer"""
+        if os.getenv('SINGLEFLIGHT_ENABLED', 'True').lower() != 'true':
+            return None, None, None
         
-        # DuckDuckGo
-        tools.append(self.create_utility_agent_tool("DuckDuckGo", {}, client))
+        from autosphere_singleflight import SingleFlight, make_normalizer
         
-        # Weather
-        tools.append(self.create_utility_agent_tool("Weather", {}, client))
+        max_waiters = int(os.getenv('SINGLEFLIGHT_MAX_WAITERS', 100))
+        return (
+            SingleFlight("chat", max_waiters=max_waiters),
+            SingleFlight("tool", max_waiters=max_waiters),
+            make_normalizer(os.getenv('SINGLEFLIGHT_NORMALIZE', 'whitespace,case')),
+        )
+
+    def fetch_tool_metadata(self, client):
+        """Fetch descriptors for all agent tools with a single Toolkit listing"""
+        from ibm_watsonx_ai.foundation_models.utils import Toolkit
+        
+        available = {tool.get("name"): tool for tool in Toolkit(api_client=client).get_tools()}
+        return {
+            name: {
+                "description": available[name].get("description"),
+                "agent_description": available[name].get("agent_description"),
+                "input_schema": available[name].get("input_schema"),
+            }
+            for name in TOOL_PARAMS
+        }
+
+    def refresh_tool_metadata(self, client, metadata_cache, url):
+        """Re-fetch tool metadata and update the on-disk copy for the next start"""
+        try:
+            metadata_cache.save(self.fetch_tool_metadata(client), url)
+        except Exception as e:
+            print(f"⚠️ Failed to refresh tool metadata: {str(e)}")
+
+    def create_tools(self, client, url=None):
+        """Create all available tools"""
+        from ibm_watsonx_ai.foundation_models.utils import Tool
+        
+        metadata_cache = ToolMetadataCache(os.getenv('TOOL_METADATA_CACHE', '.tool_metadata.json'))
+        metadata = metadata_cache.load(TOOL_PARAMS, url)
+        
+        if metadata is None:
+            metadata = self.fetch_tool_metadata(client)
+            metadata_cache.save(metadata, url)
+        else:
+            # Start from the cached descriptors and refresh them off the startup path
+            threading.Thread(
+                target=self.refresh_tool_metadata,
+                args=(client, metadata_cache, url),
+                daemon=True
+            ).start()
+        
+        tools = []
+        for tool_name, params in TOOL_PARAMS.items():
+            utility_agent_tool = Tool(api_client=client, name=tool_name, **metadata[tool_name])
+            tools.append(self.create_utility_agent_tool(
+                tool_name, params, client, utility_agent_tool=utility_agent_tool
+            ))
 
         return tools
 
-    def create_chat_model(self, credentials, project_id, client):
-        """Create the chat model"""
-        model_id = "ibm/granite-3-3-8b-instruct"
+    def create_chat_model(self, credentials, project_id, client, model_id=None):
+        """Create the chat model: MODEL_ID, or ``model_id`` for a cascade tier"""
+        from langchain_ibm import ChatWatsonx
+        
+        model_id = model_id or os.getenv('MODEL_ID', 'ibm/granite-3-3-8b-instruct')
         parameters = {
             "frequency_penalty": 0,
-            "max_tokens": 2000,
+            "max_tokens": int(os.getenv('MAX_TOKENS', 2000)),
             "presence_penalty": 0,
-            "temperature": 0,
+            "temperature": float(os.getenv('TEMPERATURE', 0)),
             "top_p": 1
         }
         
@@ -145,18 +373,99 @@ class AutoSphereAI:
         )
         return chat_model
 
+    def create_model_cascade(self, cascade_models, tools, max_tokens):
+        """Create the cascade of smaller models tried before the agent, or None when MODEL_CASCADE is empty"""
+        if not cascade_models:
+            return None
+        
+        from autosphere_models import ModelCascade
+        
+        query_types = os.getenv('MODEL_CASCADE_TYPES', 'short,standard')
+        return ModelCascade(
+            [(model_id, model.bind_tools(tools)) for model_id, model in cascade_models],
+            final_model=os.getenv('MODEL_ID', 'ibm/granite-3-3-8b-instruct'),
+            query_types=[query_type.strip() for query_type in query_types.split(',') if query_type.strip()],
+            max_tokens=max_tokens,
+            budgets=parse_ttls(os.getenv('LATENCY_BUDGETS', 'short=5,standard=15,detailed=60')),
+        )
+
+    def create_memory(self):
+        """Create the per-session conversation memory, on disk when CHECKPOINT_PATH is set"""
+        from autosphere_memory import BoundedMemorySaver, CompactSerializer, SQLiteCheckpointSaver
+        
+        # msgpack stores every message as its own object, as LangGraph does by default
+        serde = CompactSerializer() if os.getenv('CHECKPOINT_FORMAT', 'compact').lower() == 'compact' else None
+        
+        checkpoint_path = os.getenv('CHECKPOINT_PATH')
+        if checkpoint_path:
+            return SQLiteCheckpointSaver(
+                checkpoint_path,
+                flush_interval=float(os.getenv('CHECKPOINT_FLUSH_INTERVAL', 1)),
+                compact_interval=float(os.getenv('CHECKPOINT_COMPACT_INTERVAL', 300)),
+                retention=float(os.getenv('CHECKPOINT_RETENTION', 7 * 24 * 3600)),
+                serde=serde,
+            )
+        
+        return BoundedMemorySaver(
+            max_threads=int(os.getenv('SESSION_MAX_THREADS', 1000)),
+            idle_ttl=float(os.getenv('SESSION_IDLE_TTL', 3600)),
+            max_bytes=int(float(os.getenv('SESSION_MAX_MEMORY_MB', 256)) * 1024 * 1024),
+            keep_history=os.getenv('SESSION_KEEP_HISTORY', 'False').lower() == 'true',
+            serde=serde,
+        )
+
+    def create_context_window(self, chat_model):
+        """Create the hook that keeps each prompt within the token budget"""
+        from autosphere_context import ContextWindow
+        
+        return ContextWindow(
+            chat_model,
+            window_tokens=int(os.getenv('CONTEXT_WINDOW_TOKENS', 2000)),
+            max_tokens=int(os.getenv('CONTEXT_MAX_TOKENS', 4000)),
+            summary_tokens=int(os.getenv('CONTEXT_SUMMARY_TOKENS', 400)),
+            tool_output_tokens=int(os.getenv('TOOL_OUTPUT_MAX_TOKENS', 1000)),
+        )
+
     def create_agent(self, credentials, project_id, client):
         """Create the AutoSphere AI agent"""
+        from langgraph.prebuilt import create_react_agent
+        from autosphere_context import ContextState
+        from autosphere_models import query_max_tokens
+        
         print("🤖 Creating AutoSphere AI Agent...")
         
-        # Create chat model
-        chat_model = self.create_chat_model(credentials, project_id, client)
+        cascade_ids = [model_id.strip() for model_id in os.getenv('MODEL_CASCADE', '').split(',') if model_id.strip()]
+        
+        # Create chat models and tools concurrently
+        with ThreadPoolExecutor(max_workers=2 + len(cascade_ids)) as pool:
+            chat_model_future = pool.submit(self.create_chat_model, credentials, project_id, client)
+            tools_future = pool.submit(self.create_tools, client, credentials["url"])
+            cascade_futures = [
+                (model_id, pool.submit(self.create_chat_model, credentials, project_id, client, model_id))
+                for model_id in cascade_ids
+            ]
+            chat_model = chat_model_future.result()
+            tools = tools_future.result()
+            cascade_models = [(model_id, future.result()) for model_id, future in cascade_futures]
         
-        # Create tools
-        tools = self.create_tools(client)
+        # Kept for the router, which calls them without going through the agent
+        self.chat_model = chat_model
+        self.tools = {tool.name: tool for tool in tools}
         
-        # Create memory
-        memory = MemorySaver()
+        # Create memory and the context window that bounds each prompt
+        self.memory = self.create_memory()
+        self.context_window = self.create_context_window(chat_model)
+        
+        # Completion limits per query type, for the agent and the cascade alike
+        max_tokens = query_max_tokens(
+            parse_ttls(os.getenv('QUERY_MAX_TOKENS', 'short=600,standard=1200')),
+            int(os.getenv('MAX_TOKENS', 2000))
+        )
+        self.cascade = self.create_model_cascade(cascade_models, tools, max_tokens)
+        bound_model = chat_model.bind_tools(tools)
+        self.agent_models = {
+            query_type: bound_model.bind(max_tokens=limit) for query_type, limit in max_tokens.items()
+        }
         
         # Custom instructions for India-centric focus
         instructions = """You are a helpful assistant that uses tools to answer questions in detail.
@@ -175,35 +484,64 @@ Never provide misleading or fabricated data.
 Always highlight social good and economic growth impact.
 Whenever possible, recommend automation workflows rather than manual steps.
 Suggest interdisciplinary collaboration if relevant (e.g., healthcare + AI, agriculture + IoT)."""
+        self.instructions = instructions
 
         # Use "prompt" instead of "state_modifier" as per the working notebook
-        agent = create_react_agent(chat_model, tools=tools, checkpointer=memory, prompt=instructions)
+        agent = create_react_agent(
+            self.select_agent_model,
+            tools=tools,
+            checkpointer=self.memory,
+            prompt=instructions,
+            pre_model_hook=self.context_window,
+            state_schema=ContextState,
+        )
         return agent
 
+    def select_agent_model(self, state, runtime):
+        """Pick the agent's model for a call, limited to the completion size the question needs"""
+        from langchain_core.messages import HumanMessage
+        from autosphere_models import classify_query
+        
+        question = next(
+            (m.content for m in reversed(state["messages"]) if isinstance(m, HumanMessage)), ""
+        )
+        return self.agent_models[classify_query(question if isinstance(question, str) else str(question))]
+
     def convert_messages(self, messages):
         """Convert messages to LangChain format"""
+        from langchain_core.messages import AIMessage, HumanMessage
+        
         converted_messages = []
         for message in messages:
             if message["role"] == "user":
                 converted_messages.append(HumanMessage(content=message["content"]))
-            elif message["role"] == "assistant":
+            elif message["role"] in ("assistant", "bot"):
                 converted_messages.append(AIMessage(content=message["content"]))
         return converted_messages
 
+    def load_dependencies(self):
+        """Import the heavy AI libraries used by the agent"""
+        import ibm_watsonx_ai
+        import langchain_core.messages
+        import langchain_core.tools
+        import langchain_ibm
+        import langgraph.prebuilt
+
+    @contextmanager
+    def startup_phase(self, name):
+        """Record how long one initialization phase takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.startup_phases[name] = time.perf_counter() - start
+
     def initialize(self):
         """Initialize the AI agent"""
         try:
             # Get credentials
             credentials = self.get_credentials()
             
-            # Validate API key
-            is_valid, token = self.validate_api_key(credentials["apikey"])
-            if not is_valid:
-                print("❌ Invalid API Key. Please check and try again.")
-                return False
-            
-            print("✅ API Key is valid. Token generated successfully.")
-            
             # Get project ID
             project_id = self.get_project_id()
             if not project_id.strip():
@@ -212,11 +550,31 @@ Suggest interdisciplinary collaboration if relevant (e.g., healthcare + AI, agri
             
             print("✅ Project ID set successfully")
             
-            # Create API client
-            self.client = APIClient(credentials=credentials, project_id=project_id)
+            # Load the AI libraries while the process is still warming up
+            with self.startup_phase("imports"):
+                self.load_dependencies()
+            from ibm_watsonx_ai import APIClient
+            
+            # Validate API key; the token manager keeps this token fresh
+            with self.startup_phase("iam_token"):
+                is_valid, token = self.validate_api_key(credentials["apikey"])
+            if not is_valid:
+                print("❌ Invalid API Key. Please check and try again.")
+                return False
+            
+            print("✅ API Key is valid. Token generated successfully.")
+            
+            # Create API client with the shared token instead of authenticating again
+            with self.startup_phase("api_client"):
+                self.client = APIClient(
+                    credentials={"url": credentials["url"], "token": token},
+                    project_id=project_id
+                )
+            self.token_manager.add_listener(self.client.set_token)
             
             # Create agent
-            self.agent = self.create_agent(credentials, project_id, self.client)
+            with self.startup_phase("agent"):
+                self.agent = self.create_agent(credentials, project_id, self.client)
             
             print("✅ AutoSphere AI Agent created successfully!")
             self.initialized = True
@@ -226,34 +584,481 @@ Suggest interdisciplinary collaboration if relevant (e.g., healthcare + AI, agri
             print(f"❌ Failed to initialize AutoSphere AI: {str(e)}")
             return False
 
-    def process_message(self, message, conversation_history=None):
+    def process_message(self, message, conversation_history=None, session_id=None):
         """Process a message and return AI response"""
         if not self.initialized:
-            return "Sorry, the AI service is not initialized. Please check your configuration."
+            return NOT_INITIALIZED_REPLY
+        
+        start = time.perf_counter()
         
         try:
-            # Convert conversation history to LangChain format
-            if conversation_history:
-                messages = self.convert_messages(conversation_history)
+            routed = self.route_message(message, conversation_history, session_id)
+            if routed is not None:
+                return routed
+            
+            lookup = self.lookup_response(message, conversation_history, session_id)
+            if lookup is not None and lookup.response is not None:
+                return lookup.response
+            
+            key = self.first_turn_key(message, conversation_history, session_id)
+            if key is None:
+                result = self.invoke_agent(message, conversation_history, session_id, lookup)
             else:
-                messages = [HumanMessage(content=message)]
+                # Identical opening questions asked at the same time share one agent run
+                result, shared = self.chat_flight.do(
+                    key, lambda: self.invoke_agent(message, conversation_history, session_id, lookup)
+                )
+                if shared:
+                    self.remember_exchange(message, result, conversation_history, session_id)
             
+            self.record_agent_answer(start)
+            return result
+            
+        except Exception as e:
+            print(f"❌ Error processing message: {str(e)}")
+            metrics.errors_total.inc(source="agent")
+            return ERROR_REPLY
+
+    def invoke_agent(self, message, conversation_history=None, session_id=None, lookup=None):
+        """Answer a message with a cascade model if one is good enough, else run the agent
+
+        The answer is added to the response cache under ``lookup``.
+        """
+        cascaded = self.cascade_message(message, conversation_history, session_id)
+        if cascaded is not None:
+            self.store_response(lookup, cascaded)
+            return cascaded
+        
+        messages, thread_id, ephemeral = self.build_agent_input(
+            message, conversation_history, session_id
+        )
+        
+        try:
             # Generate response
-            generated_response = self.agent.invoke(
-                {"messages": messages},
-                {"configurable": {"thread_id": "42"}}
-            )
+            start = time.perf_counter()
+            with metrics.stage_seconds.time(stage="agent"), tracing.span("agent"):
+                generated_response = self.agent.invoke(
+                    {"messages": messages},
+                    self.agent_config(thread_id, message)
+                )
+            self.record_agent_run(start)
             
             # Extract agent's reply
-            result = generated_response["messages"][-1].content
+            response = generated_response["messages"][-1].content
+            self.store_response(lookup, response, self.turn_tools(generated_response["messages"]))
+            return response
+        finally:
+            if ephemeral:
+                self.clear_session(thread_id)
+
+    def first_turn_key(self, message, conversation_history=None, session_id=None):
+        """Coalescing key for a conversation's opening message, or None for later turns"""
+        if self.chat_flight is None:
+            return None
+        if conversation_history:
+            if len(conversation_history) != 1 or conversation_history[0].get("role") != "user":
+                return None
+        elif not session_id or self.has_session(session_id):
+            return None
+        return self.normalize_message(message)
+
+    async def aprocess_message(self, message, conversation_history=None, session_id=None):
+        """Process a message through the agent's async API and return AI response"""
+        if not self.initialized:
+            return NOT_INITIALIZED_REPLY
+        
+        start = time.perf_counter()
+        
+        try:
+            routed = await asyncio.to_thread(self.route_message, message, conversation_history, session_id)
+            if routed is not None:
+                return routed
+            
+            lookup = await asyncio.to_thread(self.lookup_response, message, conversation_history, session_id)
+            if lookup is not None and lookup.response is not None:
+                return lookup.response
+            
+            key = self.first_turn_key(message, conversation_history, session_id)
+            if key is None:
+                result = await self.ainvoke_agent(message, conversation_history, session_id, lookup)
+            else:
+                # Shares runs with process_message and the stream, whichever started first
+                result, shared = await self.chat_flight.ado(
+                    key, lambda: self.ainvoke_agent(message, conversation_history, session_id, lookup)
+                )
+                if shared:
+                    await asyncio.to_thread(
+                        self.remember_exchange, message, result, conversation_history, session_id
+                    )
+            
+            self.record_agent_answer(start)
             return result
             
         except Exception as e:
             print(f"❌ Error processing message: {str(e)}")
-            return "Sorry, I encountered an error while processing your message. Please try again."
+            metrics.errors_total.inc(source="agent")
+            return ERROR_REPLY
+
+    async def ainvoke_agent(self, message, conversation_history=None, session_id=None, lookup=None):
+        """Async invoke_agent: waits on the agent without holding a thread"""
+        cascaded = await asyncio.to_thread(self.cascade_message, message, conversation_history, session_id)
+        if cascaded is not None:
+            self.store_response(lookup, cascaded)
+            return cascaded
+        
+        messages, thread_id, ephemeral = self.build_agent_input(
+            message, conversation_history, session_id
+        )
+        
+        try:
+            start = time.perf_counter()
+            with metrics.stage_seconds.time(stage="agent"), tracing.span("agent"):
+                generated_response = await self.agent.ainvoke(
+                    {"messages": messages},
+                    self.agent_config(thread_id, message)
+                )
+            self.record_agent_run(start)
+            
+            response = generated_response["messages"][-1].content
+            self.store_response(lookup, response, self.turn_tools(generated_response["messages"]))
+            return response
+        finally:
+            if ephemeral:
+                self.clear_session(thread_id)
+
+    def route_message(self, message, conversation_history=None, session_id=None):
+        """Answer a message without the agent if the router recognizes it, else return None"""
+        if self.router is None:
+            return None
+        
+        from autosphere_router import GREETING_RESPONSE
+        
+        start = time.perf_counter()
+        route = self.router.match(message)
+        if route is None:
+            return None
+        
+        with metrics.stage_seconds.time(stage="router"), \
+                tracing.span("router", intent=route.intent, source=route.source):
+            if route.tool is None:
+                response = GREETING_RESPONSE
+            else:
+                response = self.answer_with_tool(route, message)
+                if response is None:
+                    return None
+            self.remember_exchange(message, response, conversation_history, session_id)
+        
+        self.router.record_hit(route.intent, time.perf_counter() - start)
+        return response
+
+    def answer_with_tool(self, route, message):
+        """Run the routed tool and have the model write up its result in one call"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        from autosphere_router import FORMAT_PROMPT, tool_arguments
+        
+        tool = self.tools.get(route.tool)
+        arguments = tool_arguments(tool, route.query) if tool is not None else None
+        if arguments is None:
+            return None
+        
+        config = self.agent_config(None, message)
+        try:
+            result = tool.invoke(arguments, config)
+            reply = self.chat_model.invoke([
+                SystemMessage(content=FORMAT_PROMPT),
+                HumanMessage(content=f"Question: {message}\n\n{route.tool} result:\n{result}"),
+            ], config)
+        except Exception as e:
+            # Let the agent have a go instead
+            print(f"⚠️ Direct {route.tool} answer failed: {str(e)}")
+            return None
+        return reply.content
+
+    def remember_exchange(self, message, response, conversation_history=None, session_id=None):
+        """Store a directly answered turn in the session, as if the agent had answered it"""
+        from langchain_core.messages import AIMessage, HumanMessage
+        
+        if conversation_history:
+            if not session_id:
+                return
+            self.clear_session(session_id)
+            messages = self.convert_messages(conversation_history)
+        else:
+            messages = [HumanMessage(content=message)]
+            session_id = session_id or self.default_session_id
+        
+        self.agent.update_state(
+            {"configurable": {"thread_id": session_id}},
+            {"messages": messages + [AIMessage(content=response)]},
+            as_node="agent",
+        )
+
+    def lookup_response(self, message, conversation_history=None, session_id=None):
+        """Look a message up in the response cache, storing the turn on a hit; None when disabled"""
+        if self.response_cache is None:
+            return None
+        
+        with metrics.stage_seconds.time(stage="response_cache"), tracing.span("response_cache"):
+            lookup = self.response_cache.lookup(
+                self.earlier_turns(message, conversation_history, session_id), message
+            )
+            if lookup.response is not None:
+                self.remember_exchange(message, lookup.response, conversation_history, session_id)
+        return lookup
+
+    def store_response(self, lookup, response, tools=()):
+        """Add an answer to the response cache under the key found when it missed"""
+        if lookup is not None and self.response_cache is not None:
+            self.response_cache.store(lookup, response, tools)
+
+    def invalidate_responses(self, question=None, tool=None, contains=None):
+        """Drop cached answers and indexed pages matching the criteria (all without any); return how many
+
+        ``question`` matches answers only; pages are matched on ``tool`` and
+        on ``contains`` against the query they were fetched with.
+        """
+        removed = 0
+        if self.response_cache is not None:
+            removed += self.response_cache.invalidate(question, tool, contains)
+        if self.retriever is not None and question is None:
+            removed += self.retriever.invalidate(tool, contains)
+        return removed
+
+    def earlier_turns(self, message, conversation_history=None, session_id=None):
+        """The user and assistant texts that came before ``message``, as ``(role, text)`` pairs"""
+        from langchain_core.messages import AIMessage, HumanMessage
+        
+        if conversation_history:
+            turns = [
+                ("user" if turn["role"] == "user" else "assistant", turn["content"])
+                for turn in conversation_history if turn["role"] in ("user", "assistant", "bot")
+            ]
+            return turns[:-1] if turns and turns[-1] == ("user", message) else turns
+        
+        session_id = session_id or self.default_session_id
+        if not self.has_session(session_id):
+            return []
+        state = self.agent.get_state({"configurable": {"thread_id": session_id}})
+        turns = []
+        for m in state.values.get("messages", []):
+            # Tool calls and results are how an answer was found, not part of the conversation
+            if isinstance(m, HumanMessage) and isinstance(m.content, str):
+                turns.append(("user", m.content))
+            elif isinstance(m, AIMessage) and isinstance(m.content, str) and not m.tool_calls:
+                turns.append(("assistant", m.content))
+        return turns
+
+    def turn_tools(self, messages):
+        """Names of the tools called since the last user message"""
+        from langchain_core.messages import HumanMessage, ToolMessage
+        
+        tools = set()
+        for m in reversed(messages):
+            if isinstance(m, HumanMessage):
+                break
+            if isinstance(m, ToolMessage):
+                tools.add(m.name)
+        return tools
+
+    def cascade_message(self, message, conversation_history=None, session_id=None):
+        """Answer a message with the model cascade and store the turn, or return None for the agent"""
+        if self.cascade is None:
+            return None
+        
+        from autosphere_models import classify_query
+        
+        query_type = classify_query(message)
+        if query_type not in self.cascade.query_types:
+            return None
+        
+        budget = self.cascade.budget_for(query_type)
+        messages = self.cascade_input(message, conversation_history, session_id)
+        if messages is None:
+            return None
+        
+        with metrics.stage_seconds.time(stage="cascade"), tracing.span("cascade", query_type=query_type):
+            answer = self.cascade.answer(messages, query_type, budget, self.agent_config(None, message))
+            if answer is None:
+                return None
+            response, _ = answer
+            self.remember_exchange(message, response, conversation_history, session_id)
+        return response
+
+    def cascade_input(self, message, conversation_history=None, session_id=None):
+        """Prompt for answering a message outside the agent, or None if the conversation needs summarizing"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+        from autosphere_context import count_tokens
+        
+        summary = ""
+        if conversation_history:
+            messages = self.convert_messages(conversation_history)
+        else:
+            state = self.agent.get_state({"configurable": {"thread_id": session_id or self.default_session_id}})
+            start = state.values.get("summarized_count", 0)
+            messages = state.values.get("messages", [])[start:] + [HumanMessage(content=message)]
+            summary = state.values.get("context_summary", "")
+        
+        # Leave long conversations to the agent, whose context window summarizes them
+        if sum(count_tokens(m) for m in messages) > self.context_window.max_tokens:
+            return None
+        
+        prompt = [SystemMessage(content=self.instructions)]
+        if summary:
+            prompt.append(SystemMessage(content=f"Summary of the earlier conversation:\n{summary}"))
+        return prompt + messages
+
+    def record_agent_run(self, start):
+        """Report how long the agent took, so the cascade knows how much time escalating costs"""
+        if self.cascade is not None:
+            self.cascade.record_latency(self.cascade.final_model, time.perf_counter() - start)
+
+    def record_agent_answer(self, start):
+        """Report an agent-answered message to the router's hit rate and savings estimate"""
+        if self.router is not None:
+            self.router.record_miss(time.perf_counter() - start)
+
+    def build_agent_input(self, message, conversation_history=None, session_id=None):
+        """Return the messages to send, the thread to run on and whether it is throwaway"""
+        from langchain_core.messages import HumanMessage
+        
+        if conversation_history:
+            # Full-history mode: convert the whole conversation and either
+            # reseed the session thread or run on a throwaway thread
+            with metrics.stage_seconds.time(stage="convert_messages"), \
+                    tracing.span("convert_messages", messages=len(conversation_history)):
+                messages = self.convert_messages(conversation_history)
+            if session_id:
+                self.clear_session(session_id)
+                return messages, session_id, False
+            return messages, uuid.uuid4().hex, True
+        
+        # Delta mode: the checkpointer already holds earlier turns
+        return [HumanMessage(content=message)], session_id or self.default_session_id, False
+
+    def agent_config(self, thread_id, question=None):
+        """Run config for one agent call, with metrics and trace callbacks attached
+
+        ``question`` is passed on to tools so page results can be cut down
+        to the parts relevant to it.
+        """
+        from autosphere_callbacks import MetricsCallbackHandler, TraceCallbackHandler
+        
+        callbacks = [MetricsCallbackHandler()]
+        trace = tracing.current_trace.get()
+        if trace is not None:
+            callbacks.append(TraceCallbackHandler(trace, tracing.active_span.get()))
+        return {"configurable": {"thread_id": thread_id, "question": question}, "callbacks": callbacks}
+
+    def process_message_stream(self, message, conversation_history=None, session_id=None):
+        """Process a message and yield response events as they are produced
+
+        Yields dicts with a ``type`` of ``token`` (a piece of answer text),
+        ``tool_start`` / ``tool_end`` (tool-call progress), and finally
+        ``done`` with the full response or ``error``.
+        """
+        if not self.initialized:
+            yield {"type": "error", "error": NOT_INITIALIZED_REPLY}
+            return
+        
+        start = time.perf_counter()
+        
+        try:
+            routed = self.route_message(message, conversation_history, session_id)
+            if routed is not None:
+                yield {"type": "token", "content": routed}
+                yield {"type": "done", "response": routed}
+                return
+            
+            lookup = self.lookup_response(message, conversation_history, session_id)
+            if lookup is not None and lookup.response is not None:
+                yield {"type": "token", "content": lookup.response}
+                yield {"type": "done", "response": lookup.response}
+                return
+            
+            key = self.first_turn_key(message, conversation_history, session_id)
+            if key is None:
+                response = yield from self.stream_agent(message, conversation_history, session_id, lookup)
+            else:
+                # Requests that join a run in flight get its answer in one piece
+                response, shared = yield from self.chat_flight.stream(
+                    key, lambda: self.stream_agent(message, conversation_history, session_id, lookup)
+                )
+                if shared:
+                    self.remember_exchange(message, response, conversation_history, session_id)
+                    yield {"type": "token", "content": response}
+            
+            self.record_agent_answer(start)
+            yield {"type": "done", "response": response}
+            
+        except Exception as e:
+            print(f"❌ Error processing message: {str(e)}")
+            metrics.errors_total.inc(source="agent")
+            yield {"type": "error", "error": ERROR_REPLY}
 
-    def run_interactive(self):
-        """Run interactive command-line interface"""
+    def stream_agent(self, message, conversation_history=None, session_id=None, lookup=None):
+        """Streaming invoke_agent: yields token and tool events and returns the full response"""
+        from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+        
+        # A cascade answer is only known to be good once complete, so it arrives in one piece
+        cascaded = self.cascade_message(message, conversation_history, session_id)
+        if cascaded is not None:
+            self.store_response(lookup, cascaded)
+            yield {"type": "token", "content": cascaded}
+            return cascaded
+        
+        messages, thread_id, ephemeral = self.build_agent_input(
+            message, conversation_history, session_id
+        )
+        
+        try:
+            # Text of the current model turn; reset after each tool round so
+            # only the final answer ends up in the response
+            response = ""
+            started_tools = set()
+            used_tools = set()
+            start = time.perf_counter()
+            with tracing.span("agent"):
+                for chunk, metadata in self.agent.stream(
+                    {"messages": messages},
+                    self.agent_config(thread_id, message),
+                    stream_mode="messages"
+                ):
+                    if isinstance(chunk, ToolMessage):
+                        response = ""
+                        used_tools.add(chunk.name)
+                        yield {"type": "tool_end", "name": chunk.name, "id": chunk.tool_call_id}
+                    elif isinstance(chunk, (AIMessage, AIMessageChunk)):
+                        for tool_call in getattr(chunk, "tool_call_chunks", None) or chunk.tool_calls:
+                            if tool_call.get("name") and tool_call.get("id") not in started_tools:
+                                started_tools.add(tool_call.get("id"))
+                                yield {"type": "tool_start", "name": tool_call["name"], "id": tool_call.get("id")}
+                        if isinstance(chunk.content, str) and chunk.content:
+                            response += chunk.content
+                            yield {"type": "token", "content": chunk.content}
+            
+            metrics.stage_seconds.observe(time.perf_counter() - start, stage="agent")
+            self.record_agent_run(start)
+            self.store_response(lookup, response, used_tools)
+            return response
+        finally:
+            if ephemeral:
+                self.clear_session(thread_id)
+
+    def has_session(self, session_id):
+        """Check whether a session still has stored conversation state"""
+        return self.memory is not None and self.memory.has_thread(session_id)
+
+    def clear_session(self, session_id):
+        """Drop the stored conversation state for a session"""
+        if self.memory is not None:
+            self.memory.delete_thread(session_id)
+
+    def run_interactive(self, trace=False, profile=False):
+        """Run interactive command-line interface
+
+        With ``trace``, each answer is followed by its span tree, which is
+        also saved under TRACE_DIR; ``profile`` adds CPU hotspots.
+        """
         if not self.initialized:
             if not self.initialize():
                 return
@@ -265,8 +1070,6 @@ Suggest interdisciplinary collaboration if relevant (e.g., healthcare + AI, agri
         print("Hi, I am AutoSphere AI. How can I help you?")
         print("(Type 'exit' or 'end' to quit)\n")
         
-        conversation_history = []  # store conversation context
-        
         while True:
             try:
                 question = input("Question: ")
@@ -279,15 +1082,26 @@ Suggest interdisciplinary collaboration if relevant (e.g., healthcare + AI, agri
                 if not question.strip():
                     continue
                 
-                # Add user message
-                conversation_history.append({"role": "user", "content": question})
-                
-                # Generate response
-                response = self.process_message(question, conversation_history)
-                print(f"\nAutoSphere AI: {response}\n")
+                # Stream the response; earlier turns live in the session checkpoint
+                needs_prefix = True
+                request_trace = tracing.Trace("interactive", profile=profile) if trace or profile else None
+                with tracing.activate(request_trace):
+                    for event in self.process_message_stream(question):
+                        if event["type"] == "token":
+                            if needs_prefix:
+                                print("\nAutoSphere AI: ", end="", flush=True)
+                                needs_prefix = False
+                            print(event["content"], end="", flush=True)
+                        elif event["type"] == "tool_start":
+                            print(f"\n🔧 Using {event['name']}...", flush=True)
+                            needs_prefix = True
+                        elif event["type"] == "error":
+                            print(f"\nAutoSphere AI: {event['error']}", end="")
+                print("\n")
                 
-                # Add assistant message to history
-                conversation_history.append({"role": "assistant", "content": response})
+                if request_trace is not None:
+                    print(tracing.format_tree(request_trace))
+                    print(f"📄 Trace saved to {request_trace.save(os.getenv('TRACE_DIR', 'traces'))}\n")
                 
             except KeyboardInterrupt:
                 print("\n👋 Thank you for using AutoSphere AI!")
@@ -298,6 +1112,17 @@ Suggest interdisciplinary collaboration if relevant (e.g., healthcare + AI, agri
 
 def main():
     """Main function to run AutoSphere AI"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="AutoSphere AI interactive assistant")
+    parser.add_argument("--trace", action="store_true", help="print and save a span tree for each answer")
+    parser.add_argument("--profile", action="store_true", help="also sample CPU hotspots (implies --trace)")
+    parser.add_argument("--batch", metavar="INPUT", help="answer the prompts in a JSONL file instead of chatting")
+    parser.add_argument("--output", metavar="PATH", help="JSONL file for batch results (default: INPUT.results.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv('BATCH_CONCURRENCY', 8)),
+                        help="prompts answered at once in batch mode")
+    args = parser.parse_args()
+    
     print("🚀 AutoSphere AI: Automate, Assist, Achieve")
     print("=" * 50)
     print("India-Centric AI Automation Platform")
@@ -307,10 +1132,21 @@ def main():
     # Create AI instance
     ai = AutoSphereAI()
     
+    if args.batch:
+        from autosphere_batch import run_file
+        
+        if not ai.initialize():
+            return 1
+        output = args.output or f"{os.path.splitext(args.batch)[0]}.results.jsonl"
+        print(f"📦 Answering {args.batch} -> {output} ({args.concurrency} at a time)")
+        answered, failed, skipped = run_file(ai, args.batch, output, args.concurrency)
+        print(f"✅ {answered} answered, {failed} failed, {skipped} already done")
+        return 1 if failed else 0
+    
     # Run interactive mode
-    ai.run_interactive()
+    ai.run_interactive(trace=args.trace, profile=args.profile)
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
 
 
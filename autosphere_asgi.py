@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Async Server
+ASGI serving mode sharing the threaded server's admission control
+"""
+
+import os
+import logging
+from datetime import datetime
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Mount, Route
+from autosphere_admission import Overloaded
+import autosphere_server as server
+import autosphere_metrics as metrics
+import autosphere_tracing as tracing
+
+logger = logging.getLogger(__name__)
+
+async def chat(request):
+    """Handle chat requests through the agent's async API"""
+    started = metrics.request_started()
+    response = await answer_chat(request)
+    metrics.request_finished('chat', started, response.status_code)
+    return response
+
+async def answer_chat(request):
+    try:
+        flags = server.trace_flags(request.headers.get('X-Trace') or request.query_params.get('trace'))
+        trace = server.start_trace(flags)
+        with tracing.activate(trace):
+            with metrics.stage_seconds.time(stage="parse_request"), tracing.span("parse_request"):
+                data = await request.json()
+                message, conversation_history, session_id, error = server.validate_chat_request(data)
+            if error:
+                payload, status = error
+                return JSONResponse(payload, status_code=status)
+
+            client = server.client_id(request.headers, request.client.host if request.client else None)
+            limited = server.rate_limit_error(client, server.limit_class())
+            if limited:
+                payload, status, headers = limited
+                return JSONResponse(payload, status_code=status, headers=headers)
+
+            # The same gate as the Flask routes, so both share MAX_IN_FLIGHT
+            slot = await server.admission.acquire_async(server.request_priority(request.headers))
+            try:
+                response = await server.ai_instance.aprocess_message(
+                    message, conversation_history, session_id
+                )
+            finally:
+                slot.release()
+
+            payload = {
+                'success': True,
+                'response': response,
+                'session_id': session_id,
+                'timestamp': datetime.now().isoformat()
+            }
+            with tracing.span('serialize_response'):
+                result = JSONResponse(payload)
+
+        if trace is not None:
+            payload.update(tracing.export(trace, flags, os.getenv('TRACE_DIR', 'traces')))
+            result = JSONResponse(payload)
+        return result
+
+    except Overloaded as e:
+        return JSONResponse({
+            'success': False,
+            'error': 'Server busy, please retry later'
+        }, status_code=e.status, headers={'Retry-After': str(e.retry_after)})
+    except Exception as e:
+        logger.error(f"Chat error: {str(e)}")
+        metrics.errors_total.inc(source="server")
+        return JSONResponse({
+            'success': False,
+            'error': 'Internal server error'
+        }, status_code=500)
+
+async def health_check(request):
+    """Health check endpoint"""
+    return JSONResponse(server.health_status())
+
+async def clear_conversation(request):
+    """Clear conversation history"""
+    try:
+        data = await request.json() if await request.body() else {}
+        session_id = data.get('session_id')
+
+        if session_id and server.ai_instance:
+            server.ai_instance.clear_session(session_id)
+
+        return JSONResponse({
+            'success': True,
+            'message': 'Conversation cleared'
+        })
+    except Exception as e:
+        logger.error(f"Clear conversation error: {str(e)}")
+        return JSONResponse({
+            'success': False,
+            'error': 'Failed to clear conversation'
+        }, status_code=500)
+
+# Async API routes; everything else (frontend, streaming) falls through to Flask
+app = Starlette(routes=[
+    Route('/api/chat', chat, methods=['POST']),
+    Route('/api/health', health_check, methods=['GET']),
+    Route('/api/clear', clear_conversation, methods=['POST']),
+    Mount('/', app=WSGIMiddleware(server.app)),
+])
+
+def main():
+    """Main function to run the async server"""
+    import uvicorn
+
+    # Initialize AI in the background; /api/health reports 'warming' until done
+    server.start_ai_initialization()
+
+    host = os.getenv('HOST', 'localhost')
+    port = int(os.getenv('PORT', 8000))
+
+    logger.info(f"Starting AutoSphere AI async server on {host}:{port}")
+    logger.info(f"Max in-flight requests: {server.admission.max_in_flight}, wait queue: {server.admission.max_queue}")
+
+    uvicorn.run(app, host=host, port=port, log_level='info')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - IAM Token Manager
+Shares one IBM Cloud bearer token across the app and refreshes it before expiry
+"""
+
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+IAM_TOKEN_URL = "https://iam.cloud.ibm.com/identity/token"
+
+class IAMTokenManager:
+    """Caches an IAM bearer token and keeps it fresh.
+
+    Token requests go through a pooled keep-alive session. Refreshes are
+    single-flight: concurrent callers that find the token stale wait for the
+    one in-progress request instead of each calling IAM. Once a token is
+    obtained, a background timer renews it ``refresh_margin`` seconds before
+    it expires (or halfway through its life, for tokens shorter than twice
+    the margin) and passes the new token to every registered listener.
+    """
+
+    def __init__(self, apikey, url=IAM_TOKEN_URL, refresh_margin=300, pool_size=4, timeout=30):
+        self.apikey = apikey
+        self.url = url
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self.refreshes = 0
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._token = None
+        self._expires_at = 0
+        self._issued_at = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._timer = None
+
+    def request_token(self):
+        """Ask IAM for a new token; return ``(token, expires_at)`` or None if rejected"""
+        response = self.session.post(
+            self.url,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+            data={
+                "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
+                "apikey": self.apikey,
+            },
+            timeout=self.timeout,
+        )
+        if response.status_code != 200:
+            return None
+
+        body = response.json()
+        token = body.get("access_token")
+        if not token:
+            return None
+        expires_at = body.get("expiration") or time.time() + body.get("expires_in", 3600)
+        return token, expires_at
+
+    def _margin(self):
+        """Seconds before expiry to renew; never more than half the token's lifetime"""
+        return min(self.refresh_margin, (self._expires_at - self._issued_at) / 2)
+
+    def _is_fresh(self):
+        return self._token is not None and time.time() < self._expires_at - self._margin()
+
+    def get_token(self, force=False):
+        """Return a valid bearer token, fetching one only when needed"""
+        if not force and self._is_fresh():
+            return self._token
+
+        with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            if not force and self._is_fresh():
+                return self._token
+
+            result = self.request_token()
+            if result is None:
+                return None
+            self._token, self._expires_at = result
+            self._issued_at = time.time()
+            self.refreshes += 1
+            token = self._token
+
+        for listener in list(self._listeners):
+            listener(token)
+        self._schedule_refresh()
+        return token
+
+    def validate(self):
+        """Check the API key by fetching a token; return ``(is_valid, token)``"""
+        token = self.get_token()
+        return token is not None, token
+
+    def add_listener(self, callback):
+        """Call ``callback(token)`` whenever the token is renewed"""
+        self._listeners.append(callback)
+
+    def _schedule_refresh(self, delay=None):
+        """Arm the background timer that renews the token before expiry"""
+        if delay is None:
+            delay = max(self._expires_at - self._margin() - time.time(), 1)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self):
+        try:
+            if self.get_token(force=True) is not None:
+                return
+        except requests.RequestException:
+            pass
+        # Keep the current token and retry shortly
+        self._schedule_refresh(delay=30)
+
+    def close(self):
+        """Stop background refreshes and release pooled connections"""
+        if self._timer is not None:
+            self._timer.cancel()
+        self.session.close()
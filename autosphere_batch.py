@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Batch Runner
+Answers many independent prompts concurrently, from a JSONL file or the batch API
+"""
+
+import os
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from autosphere_admission import Overloaded
+from autosphere_ai import ErrorReply
+
+def item_id(item, index):
+    """ID of a batch item; items without one are numbered by position"""
+    return str(item.get('id', index))
+
+def read_items(path):
+    """Yield ``(index, item)`` for each prompt in a JSONL file"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for index, line in enumerate(f):
+            line = line.strip()
+            if line:
+                yield index, json.loads(line)
+
+def completed_ids(path):
+    """IDs answered successfully in an output file, so a rerun can skip them"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except ValueError:
+                # A line cut short by an interrupted run is simply redone
+                continue
+            if result.get('success'):
+                done.add(str(result['id']))
+    return done
+
+def ends_with_newline(path):
+    """Whether a file is empty or its last line is complete"""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+def answer_item(ai, index, item, admit=None):
+    """Answer one batch item on its own throwaway conversation.
+
+    ``admit``, if given, is called for a slot (with a ``release()`` method)
+    before the item runs; an item it rejects with Overloaded fails.
+    """
+    message = (item.get('message') or '').strip()
+    result = {'id': item_id(item, index)}
+    if not message:
+        result.update(success=False, error='Message is required')
+        return result
+
+    try:
+        slot = admit() if admit else None
+    except Overloaded:
+        result.update(success=False, error='Server busy, please retry later')
+        return result
+    # Full-history mode without a session keeps items independent of each other
+    history = item.get('conversation_history') or [{'role': 'user', 'content': message}]
+    start = time.perf_counter()
+    try:
+        response = ai.process_message(message, history)
+    finally:
+        if slot is not None:
+            slot.release()
+    result['elapsed'] = round(time.perf_counter() - start, 3)
+    if isinstance(response, ErrorReply):
+        result.update(success=False, error=response)
+    else:
+        result.update(success=True, response=response)
+    return result
+
+def run_batch(ai, items, concurrency=8, skip=(), admit=None):
+    """Answer ``(index, item)`` pairs ``concurrency`` at a time.
+
+    Yields each result as soon as it is ready, in completion order. Items
+    are pulled from ``items`` only as slots free up, so a large file is
+    never held in memory. Items whose ID is in ``skip`` are not run, and
+    each item waits for ``admit()`` as in ``answer_item``.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as pool:
+        pending = set()
+        for index, item in items:
+            if not isinstance(item, dict):
+                item = {'message': str(item)}
+            if item_id(item, index) in skip:
+                continue
+            # Keep a few items queued so no worker waits on the next one
+            if len(pending) >= concurrency * 2:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(pool.submit(answer_item, ai, index, item, admit))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def run_file(ai, input_path, output_path, concurrency=8):
+    """Answer every prompt in ``input_path``, appending results to ``output_path``.
+
+    Results already in the output file are skipped, so an interrupted run
+    resumes where it stopped; failed items are retried and their new
+    result appended. Returns ``(answered, failed, skipped)``.
+    """
+    skip = completed_ids(output_path)
+    answered = failed = 0
+    start = time.perf_counter()
+
+    with open(output_path, 'a', encoding='utf-8') as out:
+        if not ends_with_newline(output_path):
+            # Start on a fresh line if the last run stopped mid-write
+            out.write('\n')
+        for result in run_batch(ai, read_items(input_path), concurrency, skip):
+            out.write(json.dumps(result, ensure_ascii=False) + '\n')
+            out.flush()
+            answered += 1
+            failed += not result['success']
+            if answered % 100 == 0:
+                rate = answered / (time.perf_counter() - start)
+                print(f"📦 {answered} answered ({failed} failed), {rate:.1f} prompts/s", flush=True)
+
+    return answered, failed, len(skip)
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Benchmark
+Measures chat latency, throughput and memory offline against the fake backends
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from autosphere_ai import ErrorReply
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+QUERIES = [
+    "What is the weather in {city} today?",
+    "How can IoT sensors help farmers in {city} save water?",
+    "Summarize telemedicine options for rural clinics near {city}.",
+    "Which education technology projects are running in {city}?",
+    "Suggest an automation workflow for crop insurance claims in {city}.",
+]
+CITIES = ["Chennai", "Pune", "Jaipur", "Lucknow", "Guwahati", "Kochi", "Indore", "Patna", "Mysuru", "Nagpur"]
+
+# Results compared against a baseline, and whether higher values are better
+COMPARED = [("p50", False), ("p95", False), ("p99", False), ("rps", True), ("peak_rss_mb", False)]
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where unsupported"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def make_query(index, pool_size):
+    """The ``index``-th benchmark question, cycling through ``pool_size`` variants"""
+    index %= pool_size
+    return QUERIES[index % len(QUERIES)].format(city=CITIES[index // len(QUERIES) % len(CITIES)])
+
+class AIDriver:
+    """Calls AutoSphereAI.process_message directly"""
+
+    def __init__(self, ai):
+        self.ai = ai
+
+    def chat(self, message, session_id):
+        session_id = session_id or os.urandom(8).hex()
+        response = self.ai.process_message(message, session_id=session_id)
+        return not isinstance(response, ErrorReply), session_id
+
+    def close(self):
+        pass
+
+class FlaskDriver:
+    """Posts to /api/chat through the Flask app without opening a socket"""
+
+    def __init__(self, ai):
+        import autosphere_server as server
+        server.ai_instance, server.ai_state = ai, 'ready'
+        # Every benchmark request comes from one client, so per-client limits would reject most of them
+        self.server_module, self.rate_limiter = server, server.rate_limiter
+        server.rate_limiter = None
+        self.app = server.app
+        self.local = threading.local()
+
+    def client(self):
+        if getattr(self.local, "client", None) is None:
+            self.local.client = self.app.test_client()
+        return self.local.client
+
+    def chat(self, message, session_id):
+        response = self.client().post('/api/chat', json={'message': message, 'session_id': session_id})
+        data = response.get_json() or {}
+        return response.status_code == 200 and data.get('success', False), data.get('session_id', session_id)
+
+    def close(self):
+        self.server_module.rate_limiter = self.rate_limiter
+
+class HttpDriver(FlaskDriver):
+    """Posts to /api/chat over HTTP on a local threaded server"""
+
+    def __init__(self, ai):
+        import requests
+        from werkzeug.serving import make_server
+        super().__init__(ai)
+        self.requests = requests
+        # Per-request access logs would dominate the output
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        self.server = make_server('127.0.0.1', 0, self.app, threaded=True)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/chat"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def client(self):
+        if getattr(self.local, "client", None) is None:
+            self.local.client = self.requests.Session()
+        return self.local.client
+
+    def chat(self, message, session_id):
+        response = self.client().post(self.url, json={'message': message, 'session_id': session_id})
+        data = response.json() if response.headers.get('Content-Type', '').startswith('application/json') else {}
+        return response.status_code == 200 and data.get('success', False), data.get('session_id', session_id)
+
+    def close(self):
+        self.server.shutdown()
+        super().close()
+
+DRIVERS = {"ai": AIDriver, "flask": FlaskDriver, "http": HttpDriver}
+
+def run_benchmark(driver, concurrency=4, conversations=16, turns=4, query_pool=50):
+    """Run ``conversations`` multi-turn conversations, ``concurrency`` at a time"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+
+    def converse(index):
+        session_id = None
+        for turn in range(turns):
+            message = make_query(index * turns + turn, query_pool)
+            start = time.perf_counter()
+            try:
+                ok, session_id = driver.chat(message, session_id)
+            except Exception as e:
+                ok = False
+                print(f"❌ Request failed: {str(e)}")
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors.append(elapsed)
+
+    # One untimed turn so lazy imports and first-call setup are not measured
+    driver.chat(make_query(0, query_pool), None)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(converse, range(conversations)))
+    wall = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "wall_seconds": round(wall, 3),
+        "rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "p50": round(percentile(latencies, 50), 4),
+        "p95": round(percentile(latencies, 95), 4),
+        "p99": round(percentile(latencies, 99), 4),
+        "mean": round(sum(latencies) / len(latencies), 4) if latencies else 0.0,
+        "max": round(max(latencies), 4) if latencies else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+# Session memory settings compared by the memory benchmark
+MEMORY_SETTINGS = [
+    ("msgpack, every checkpoint", {"CHECKPOINT_FORMAT": "msgpack", "SESSION_KEEP_HISTORY": "True"}),
+    ("msgpack, latest checkpoint", {"CHECKPOINT_FORMAT": "msgpack", "SESSION_KEEP_HISTORY": "False"}),
+    ("compact, latest checkpoint", {"CHECKPOINT_FORMAT": "compact", "SESSION_KEEP_HISTORY": "False"}),
+]
+
+@contextmanager
+def environment(values):
+    """Set environment variables for the duration of a block"""
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+def allocated(build):
+    """Bytes allocated by ``build()`` and still held by what it returns"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+def run_memory_benchmark(make_ai, conversations=16, turns=4, query_pool=50):
+    """Bytes per turn of session state, with the settings in MEMORY_SETTINGS"""
+    from autosphere_turns import Transcript, encode_turns
+
+    result, transcripts = {"checkpoints": {}}, []
+    for label, settings in MEMORY_SETTINGS:
+        # Cached answers and a memory cap would hide part of the sessions
+        with environment(dict(settings, RESPONSE_CACHE_ENABLED="False", SESSION_MAX_MEMORY_MB="0")):
+            ai = make_ai()
+        collect = not transcripts
+        for index in range(conversations):
+            session_id, history = os.urandom(8).hex(), []
+            for turn in range(turns):
+                message = make_query(index * turns + turn, query_pool)
+                response = ai.process_message(message, session_id=session_id)
+                history += [{"role": "user", "content": message}, {"role": "assistant", "content": response}]
+            if collect:
+                transcripts.append(history)
+        result["checkpoints"][label] = round(ai.memory.total_bytes / (conversations * turns))
+
+    total = conversations * turns
+    encoded = [json.dumps(history) for history in transcripts]
+    packed = [encode_turns(history) for history in transcripts]
+    # Session state as it arrives over JSON, as LangChain messages and as packed transcripts
+    result["dicts"] = round(allocated(lambda: [json.loads(data) for data in encoded]) / total)
+    result["messages"] = round(allocated(lambda: [ai.convert_messages(json.loads(data)) for data in encoded]) / total)
+    result["transcript"] = round(allocated(lambda: [Transcript.from_bytes(data) for data in packed]) / total)
+    result["json"] = round(sum(len(data.encode("utf-8")) for data in encoded) / total)
+    result["packed"] = round(sum(len(data) for data in packed) / total)
+    return result
+
+def print_memory_result(result):
+    """Print one memory benchmark result"""
+    print("   Bytes per turn (one question and answer):")
+    checkpoints = list(result["checkpoints"].items())
+    for label, size in checkpoints:
+        print(f"   Checkpoints, {label + ':':<27} {size:>8} ({size / checkpoints[0][1] - 1:+.1%})")
+    print(f"   Session store:  {result['json']:>8} -> {result['packed']:>8} "
+          f"({result['packed'] / result['json'] - 1:+.1%})")
+    print(f"   Heap (dicts):   {result['dicts']:>8} -> {result['transcript']:>8} "
+          f"({result['transcript'] / result['dicts'] - 1:+.1%})")
+    print(f"   Heap (messages): {result['messages']:>7} -> {result['transcript']:>8} "
+          f"({result['transcript'] / result['messages'] - 1:+.1%})")
+
+def compare(result, baseline, threshold=0.10):
+    """Return ``(lines, regressed)`` comparing a run against a saved baseline"""
+    lines, regressed = [], False
+    for key, higher_is_better in COMPARED:
+        new, old = result.get(key), baseline.get(key)
+        if new is None or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > threshold:
+            flag, regressed = "  ⚠️ regression", True
+        lines.append(f"{key:>12}: {old:>10} -> {new:>10} ({change:+.1%}){flag}")
+    return lines, regressed
+
+def print_result(result):
+    """Print one benchmark result"""
+    print(f"   Requests:   {result['requests']} ({result['errors']} errors) in {result['wall_seconds']}s")
+    print(f"   Throughput: {result['rps']} req/s")
+    print(f"   Latency:    p50 {result['p50']*1000:.1f}ms, p95 {result['p95']*1000:.1f}ms, "
+          f"p99 {result['p99']*1000:.1f}ms, max {result['max']*1000:.1f}ms")
+    if result['peak_rss_mb'] is not None:
+        print(f"   Peak RSS:   {result['peak_rss_mb']} MB")
+
+def main(argv=None):
+    """Run the offline benchmark from the command line"""
+    parser = argparse.ArgumentParser(description="Offline AutoSphere AI benchmark")
+    parser.add_argument("--target", choices=sorted(DRIVERS), default="ai",
+                        help="ai calls process_message; flask and http go through /api/chat")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--conversations", type=int, default=16)
+    parser.add_argument("--turns", type=int, default=4, help="messages per conversation")
+    parser.add_argument("--query-pool", type=int, default=50, help="distinct questions to cycle through")
+    parser.add_argument("--answer-tokens", type=int, default=200)
+    parser.add_argument("--token-latency", type=float, default=0.002, help="seconds per generated token")
+    parser.add_argument("--first-token-latency", type=float, default=0.2)
+    parser.add_argument("--tool-calls", type=int, default=1, help="tool calls per turn")
+    parser.add_argument("--parallel-tools", action="store_true", help="make each turn's tool calls at once")
+    parser.add_argument("--tool-latency", type=float, default=0.3)
+    parser.add_argument("--payload-size", type=int, default=2000, help="characters returned by each tool")
+    parser.add_argument("--save", metavar="PATH", help="write the result as a baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed regression before failing")
+    parser.add_argument("--memory", action="store_true",
+                        help="report session bytes per turn before and after the compact turn store")
+    args = parser.parse_args(argv)
+
+    from autosphere_offline import OfflineAutoSphereAI
+
+    def make_ai():
+        return OfflineAutoSphereAI(
+            model_options={
+                "answer_tokens": args.answer_tokens,
+                "token_latency": args.token_latency,
+                "first_token_latency": args.first_token_latency,
+                "tool_calls": args.tool_calls,
+                "parallel_tools": args.parallel_tools,
+            },
+            tool_latency=args.tool_latency,
+            payload_size=args.payload_size,
+        )
+
+    if args.memory:
+        print(f"🧠 Measuring session memory: {args.conversations} conversations x {args.turns} turns")
+        print_memory_result(run_memory_benchmark(make_ai, args.conversations, args.turns, args.query_pool))
+        return 0
+
+    ai = make_ai()
+    driver = DRIVERS[args.target](ai)
+
+    print(f"⏱️ Benchmarking {args.target}: {args.conversations} conversations x {args.turns} turns, "
+          f"concurrency {args.concurrency}")
+    try:
+        result = run_benchmark(driver, args.concurrency, args.conversations, args.turns, args.query_pool)
+    finally:
+        driver.close()
+    print_result(result)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("save", "compare", "threshold")}
+    record = dict(result, config=config, timestamp=datetime.now().isoformat())
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        print(f"💾 Baseline saved to {args.save}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != config:
+            print("⚠️ Baseline was recorded with different settings")
+        lines, regressed = compare(result, baseline, args.threshold)
+        print(f"📊 Compared with {args.compare}:")
+        for line in lines:
+            print(line)
+        if regressed:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
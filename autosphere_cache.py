@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Tool Caches
+Caches utility tool outputs with per-tool TTLs and tool metadata across restarts
+"""
+
+import os
+import json
+import hashlib
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+# Default time-to-live in seconds for each tool's results
+DEFAULT_TOOL_TTLS = {
+    "Weather": 10 * 60,
+    "GoogleSearch": 60 * 60,
+    "DuckDuckGo": 60 * 60,
+    "Wikipedia": 6 * 60 * 60,
+    "WebCrawler": 6 * 60 * 60,
+}
+
+def parse_ttls(spec):
+    """Parse ``"Weather=600,Wikipedia=21600"`` into a TTL mapping"""
+    ttls = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, ttl = item.split("=", 1)
+            ttls[name.strip()] = float(ttl)
+    return ttls
+
+# Tools whose inputs are case-sensitive (URLs)
+CASE_SENSITIVE_TOOLS = {"WebCrawler"}
+
+def normalize(value, fold_case=True):
+    """Normalize a tool input so trivially different queries share a key"""
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value.casefold() if fold_case else value
+    if isinstance(value, dict):
+        return {str(k): normalize(v, fold_case) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [normalize(v, fold_case) for v in value]
+    return value
+
+class MemoryCacheBackend:
+    """In-process LRU store of ``key -> (expires_at, value)``"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def items(self):
+        """Snapshot of every entry as ``(key, expires_at, value)``"""
+        with self._lock:
+            return [(key, expires_at, value) for key, (expires_at, value) in self._entries.items()]
+
+    def __len__(self):
+        return len(self._entries)
+
+class SQLiteCacheBackend:
+    """On-disk LRU store so cached results survive restarts.
+
+    Each cache keeps its entries in its own ``table``, so several caches
+    can share one file.
+    """
+
+    def __init__(self, path, max_entries=10000, table="tool_cache"):
+        self.max_entries = max_entries
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT, expires_at REAL, accessed_at REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT expires_at, value FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0], json.loads(row[1])
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, time.time()),
+            )
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN (SELECT key FROM {self.table} "
+                "ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def items(self):
+        """Snapshot of every entry as ``(key, expires_at, value)``"""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT key, expires_at, value FROM {self.table}").fetchall()
+        return [(key, expires_at, json.loads(value)) for key, expires_at, value in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+class ToolCache:
+    """Cache of tool outputs keyed on tool name, normalized input and config.
+
+    Each tool has its own TTL; a TTL of 0 disables caching for that tool.
+    Hit and miss counts are kept per tool.
+    """
+
+    def __init__(self, backend=None, ttls=None, default_ttl=60 * 60):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttls = dict(DEFAULT_TOOL_TTLS)
+        self.ttls.update(ttls or {})
+        self.default_ttl = default_ttl
+        self.hits = defaultdict(int)
+        self.misses = defaultdict(int)
+
+    def ttl_for(self, tool_name):
+        """TTL in seconds for a tool's results"""
+        return self.ttls.get(tool_name, self.default_ttl)
+
+    def make_key(self, tool_name, tool_input, config):
+        """Stable cache key for one tool invocation"""
+        fold_case = tool_name not in CASE_SENSITIVE_TOOLS
+        payload = json.dumps(
+            [tool_name, normalize(tool_input, fold_case), normalize(config)],
+            sort_keys=True, default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_or_run(self, tool_name, tool_input, config, run):
+        """Return the cached output for this invocation, or call ``run()`` and cache it"""
+        ttl = self.ttl_for(tool_name)
+        if not ttl:
+            return run()
+
+        key = self.make_key(tool_name, tool_input, config)
+        entry = self.backend.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                self.hits[tool_name] += 1
+                return value
+            self.backend.delete(key)
+
+        self.misses[tool_name] += 1
+        value = run()
+        # Empty outputs usually mean a failed lookup, so they are not kept
+        if value:
+            self.backend.set(key, value, time.time() + ttl)
+        return value
+
+    def clear(self):
+        """Drop every cached result"""
+        self.backend.clear()
+
+    def stats(self):
+        """Return hit/miss counters per tool for health reporting"""
+        tools = sorted(set(self.hits) | set(self.misses))
+        return {
+            "entries": len(self.backend),
+            "hits": sum(self.hits.values()),
+            "misses": sum(self.misses.values()),
+            "tools": {
+                name: {"hits": self.hits[name], "misses": self.misses[name]}
+                for name in tools
+            },
+        }
+
+class ToolMetadataCache:
+    """Versioned on-disk copy of utility tool descriptors.
+
+    Lets a restart build the agent's tools without asking watsonx.ai for
+    their descriptions and input schemas; the file is rewritten whenever
+    fresh metadata is fetched.
+    """
+
+    # Bump when the stored descriptor layout changes
+    VERSION = 1
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self, tool_names, url=None):
+        """Return ``{name: descriptor}`` for all ``tool_names``, or None if not cached"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if data.get("version") != self.VERSION or data.get("url") != url:
+            return None
+        tools = data.get("tools", {})
+        if any(name not in tools for name in tool_names):
+            return None
+        return {name: tools[name] for name in tool_names}
+
+    def save(self, tools, url=None):
+        """Persist ``{name: descriptor}`` atomically; return whether it was written"""
+        tmp_path = None
+        try:
+            # A temp file of its own per writer, as worker processes may save at once
+            fd, tmp_path = tempfile.mkstemp(
+                prefix=f".{os.path.basename(self.path)}.", suffix=".tmp",
+                dir=os.path.dirname(os.path.abspath(self.path)),
+            )
+            with self._lock:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump({"version": self.VERSION, "url": url, "tools": tools}, f, indent=2)
+                os.replace(tmp_path, self.path)
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            print(f"⚠️ Failed to save tool metadata: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return False
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Agent Callbacks
+LangChain callback handlers that record metrics and traces of model and tool calls
+"""
+
+import time
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.constants import TAG_NOSTREAM
+import autosphere_metrics as metrics
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Records LLM and tool latencies, errors and ReAct iterations for one request"""
+
+    def __init__(self):
+        self.iterations = 0
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, name):
+        with self._lock:
+            self._started[run_id] = (time.perf_counter(), name)
+
+    def _finish(self, run_id):
+        with self._lock:
+            start, name = self._started.pop(run_id, (None, None))
+        return (time.perf_counter() - start, name) if start is not None else (None, None)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, metadata=None, **kwargs):
+        # Summarizer calls are tagged nostream and are not agent iterations
+        if (metadata or {}).get("langgraph_node") == "agent" and TAG_NOSTREAM not in (tags or []):
+            self.iterations += 1
+        self._start(run_id, "llm")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        elapsed, _ = self._finish(run_id)
+        if elapsed is not None:
+            metrics.stage_seconds.observe(elapsed, stage="llm")
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+        metrics.errors_total.inc(source="llm")
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        self._start(run_id, (serialized or {}).get("name") or kwargs.get("name", "unknown"))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        elapsed, name = self._finish(run_id)
+        if elapsed is not None:
+            metrics.tool_seconds.observe(elapsed, tool=name)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+        metrics.errors_total.inc(source="tool")
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        # The graph itself is the only chain without a parent
+        if parent_run_id is None:
+            metrics.react_iterations.observe(self.iterations)
+
+def message_chars(messages):
+    """Total characters of message content in a (nested) list of messages"""
+    total = 0
+    for message in messages:
+        if isinstance(message, list):
+            total += message_chars(message)
+        else:
+            content = message.content
+            total += len(content) if isinstance(content, str) else len(str(content))
+    return total
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Adds a span per graph node, model call and tool run to a request trace"""
+
+    def __init__(self, trace, parent):
+        self.trace = trace
+        self.parent = parent
+        self._spans = {}
+        self._parents = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, parent_run_id, name, kind, **attributes):
+        with self._lock:
+            self._parents[run_id] = parent_run_id
+            # Attach to the nearest traced ancestor; untraced runs are skipped
+            ancestor = parent_run_id
+            while ancestor is not None and ancestor not in self._spans:
+                ancestor = self._parents.get(ancestor)
+            parent = self._spans.get(ancestor, self.parent)
+        span = self.trace.start_span(name, kind, parent, **attributes)
+        with self._lock:
+            self._spans[run_id] = span
+
+    def _end(self, run_id, **attributes):
+        with self._lock:
+            span = self._spans.get(run_id)
+        if span is not None:
+            self.trace.end_span(span, **attributes)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, name=None, **kwargs):
+        # Only the graph and its nodes; the runnables inside them are noise
+        if parent_run_id is None or any(tag.startswith("graph:step:") for tag in tags or []):
+            self._start(run_id, parent_run_id, name or (serialized or {}).get("name", "chain"), "chain")
+        else:
+            with self._lock:
+                self._parents[run_id] = parent_run_id
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=str(error))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, **kwargs):
+        name = "summarize" if TAG_NOSTREAM in (tags or []) else "llm"
+        self._start(run_id, parent_run_id, name, "llm", input_chars=message_chars(messages))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        attributes = {}
+        generations = [g for batch in response.generations for g in batch]
+        if generations:
+            message = getattr(generations[0], "message", None)
+            attributes["output_chars"] = len(generations[0].text or "")
+            if message is not None and getattr(message, "tool_calls", None):
+                attributes["tool_calls"] = [call["name"] for call in message.tool_calls]
+            usage = getattr(message, "usage_metadata", None) or (response.llm_output or {}).get("token_usage")
+            if usage:
+                attributes["input_tokens"] = usage.get("input_tokens", usage.get("prompt_tokens"))
+                attributes["output_tokens"] = usage.get("output_tokens", usage.get("completion_tokens"))
+        self._end(run_id, **attributes)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=str(error))
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = (serialized or {}).get("name") or kwargs.get("name", "tool")
+        self._start(run_id, parent_run_id, name, "tool", input_chars=len(input_str or ""))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        content = getattr(output, "content", output)
+        self._end(run_id, output_chars=len(content if isinstance(content, str) else str(content)))
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=str(error))
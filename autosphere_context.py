@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Context Window
+Keeps the prompt within a token budget by summarizing older turns
+"""
+
+import json
+from typing_extensions import NotRequired
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langgraph.constants import TAG_NOSTREAM
+from langgraph.prebuilt.chat_agent_executor import AgentState
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+Update the existing summary with the new messages. Keep facts, names, numbers, user preferences,
+decisions and open questions; drop greetings and repetition. Reply with the updated summary only,
+in at most {max_words} words."""
+
+class ContextState(AgentState):
+    """Agent state plus the running summary of turns no longer sent verbatim"""
+    context_summary: NotRequired[str]
+    # Number of leading messages already folded into the summary
+    summarized_count: NotRequired[int]
+
+def count_tokens(message):
+    """Approximate token count of a message (about four characters per token)"""
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, default=str)
+    size = len(content)
+    for tool_call in getattr(message, "tool_calls", None) or []:
+        size += len(tool_call.get("name", "")) + len(json.dumps(tool_call.get("args", {}), default=str))
+    return size // 4 + 4
+
+class ContextWindow:
+    """Pre-model hook that bounds what the model sees on each call.
+
+    Messages after the last summarized one are sent verbatim until they
+    exceed ``max_tokens``; the oldest turns are then folded into the running
+    summary until about ``window_tokens`` remain. The summary lives in the
+    agent state, so each session's checkpoint caches it and only newly
+    evicted turns are summarized. Tool outputs longer than
+    ``tool_output_tokens`` are cut before they re-enter the prompt.
+    """
+
+    def __init__(self, model, window_tokens=2000, max_tokens=4000,
+                 summary_tokens=400, tool_output_tokens=1000):
+        self.model = model
+        self.window_tokens = window_tokens
+        self.max_tokens = max(max_tokens, window_tokens)
+        self.summary_tokens = summary_tokens
+        self.tool_output_tokens = tool_output_tokens
+        self.summaries = 0
+
+    def __call__(self, state):
+        messages = [self.trim_tool_output(m) for m in state["messages"]]
+        summary = state.get("context_summary", "")
+        start = state.get("summarized_count", 0)
+        update = {}
+
+        if sum(count_tokens(m) for m in messages[start:]) > self.max_tokens:
+            split = self.split_point(messages, start)
+            if split > start:
+                summary = self.summarize(summary, messages[start:split])
+                start = split
+                update = {"context_summary": summary, "summarized_count": start}
+
+        llm_input = messages[start:]
+        if summary:
+            llm_input = [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + llm_input
+        update["llm_input_messages"] = llm_input
+        return update
+
+    def split_point(self, messages, start):
+        """Index where the verbatim window begins.
+
+        The window always starts on a user message so tool calls stay with
+        their results, and it always includes the latest user message.
+        """
+        last_user = start
+        for index in range(len(messages) - 1, start - 1, -1):
+            if isinstance(messages[index], HumanMessage):
+                last_user = index
+                break
+
+        split, total = last_user, 0
+        for index in range(len(messages) - 1, start - 1, -1):
+            total += count_tokens(messages[index])
+            if total > self.window_tokens:
+                break
+            if isinstance(messages[index], HumanMessage):
+                split = index
+        return split
+
+    def trim_tool_output(self, message):
+        """Cut a tool result down to the tool output budget"""
+        if not isinstance(message, ToolMessage) or not isinstance(message.content, str):
+            return message
+        limit = self.tool_output_tokens * 4
+        if not self.tool_output_tokens or len(message.content) <= limit:
+            return message
+        return message.model_copy(update={"content": message.content[:limit] + "\n[... output truncated]"})
+
+    def summarize(self, summary, messages):
+        """Fold ``messages`` into the running summary"""
+        lines = []
+        for message in messages:
+            if isinstance(message, ToolMessage):
+                lines.append(f"Tool {message.name}: {message.content}")
+            elif message.content:
+                role = "User" if isinstance(message, HumanMessage) else "Assistant"
+                lines.append(f"{role}: {message.content}")
+        prompt = f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n" + "\n".join(lines)
+
+        try:
+            # Tagged so streamed responses do not include the summary text
+            result = self.model.invoke(
+                [
+                    SystemMessage(content=SUMMARY_PROMPT.format(max_words=self.summary_tokens * 3 // 4)),
+                    HumanMessage(content=prompt),
+                ],
+                config={"tags": [TAG_NOSTREAM]},
+            )
+        except Exception as e:
+            # Keep the prompt bounded even when the summary cannot be updated
+            print(f"⚠️ Could not update conversation summary: {str(e)}")
+            return summary
+
+        self.summaries += 1
+        return result.content if isinstance(result.content, str) else summary
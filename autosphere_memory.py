@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Conversation Memory
+Checkpointers that keep per-session agent state under control, in memory or on disk
+"""
+
+import atexit
+import sqlite3
+import struct
+import threading
+import time
+from collections import OrderedDict
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from autosphere_turns import pack_messages, unpack_messages
+import autosphere_tracing as tracing
+
+# Lengths of the inner type name and payload in a "checkpoint+turns" value
+FRAME = struct.Struct("<HI")
+
+class CompactSerializer(JsonPlusSerializer):
+    """JsonPlusSerializer that writes message lists as packed transcripts.
+
+    A list of plain LangChain messages, whether a channel value, a pending
+    write or the ``messages`` channel inside a whole checkpoint, is stored
+    in the ``autosphere_turns`` format instead of one msgpack object per
+    message. Everything else, and values written by the default serializer,
+    go through JsonPlusSerializer as before.
+    """
+
+    def dumps_typed(self, obj):
+        packed = pack_messages(obj)
+        if packed is not None:
+            return "turns", packed
+        values = obj.get("channel_values") if isinstance(obj, dict) else None
+        if isinstance(values, dict):
+            packed = pack_messages(values.get("messages"))
+            if packed is not None:
+                rest = {key: value for key, value in values.items() if key != "messages"}
+                type_, data = super().dumps_typed(dict(obj, channel_values=rest))
+                type_ = type_.encode("utf-8")
+                return "checkpoint+turns", FRAME.pack(len(type_), len(data)) + type_ + data + packed
+        return super().dumps_typed(obj)
+
+    def loads_typed(self, data):
+        type_, payload = data
+        if type_ == "turns":
+            return unpack_messages(payload)
+        if type_ == "checkpoint+turns":
+            type_size, data_size = FRAME.unpack_from(payload)
+            start = FRAME.size + type_size
+            obj = super().loads_typed((
+                payload[FRAME.size:start].decode("utf-8"),
+                payload[start:start + data_size],
+            ))
+            obj["channel_values"]["messages"] = unpack_messages(payload[start + data_size:])
+            return obj
+        return super().loads_typed(data)
+
+class BoundedMemorySaver(MemorySaver):
+    """MemorySaver with LRU, idle-TTL and memory-cap eviction of whole threads.
+
+    Each conversation session maps to one checkpoint thread. Threads are kept
+    in least-recently-used order; a thread is dropped when it has been idle
+    for longer than ``idle_ttl`` seconds, or when the number of threads or
+    the approximate serialized size of all threads exceeds its cap.
+    Unless ``keep_history`` is set, only the latest checkpoint of a thread
+    is kept, as in SQLiteCheckpointSaver, so the conversation is not held
+    again in every earlier snapshot.
+    """
+
+    def __init__(self, max_threads=1000, idle_ttl=3600, max_bytes=256 * 1024 * 1024, keep_history=False, **kwargs):
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        self.keep_history = keep_history
+        self.evictions = 0
+        self._lock = threading.RLock()
+        # thread ID -> last access time, least recently used first
+        self._last_access = OrderedDict()
+        # thread ID -> approximate serialized bytes held for that thread
+        self._thread_bytes = {}
+        self._total_bytes = 0
+        # thread ID -> checkpoint namespace -> channel -> version of its stored value
+        self._versions = {}
+
+    @property
+    def total_bytes(self):
+        """Approximate serialized size of all stored threads"""
+        return self._total_bytes
+
+    @property
+    def thread_count(self):
+        """Number of threads currently held"""
+        return len(self._last_access)
+
+    def has_thread(self, thread_id):
+        """Check whether a thread is currently stored"""
+        with self._lock:
+            self._expire(thread_id)
+            return thread_id in self._last_access
+
+    def _touch(self, thread_id):
+        """Mark a thread as most recently used"""
+        self._last_access[thread_id] = time.monotonic()
+        self._last_access.move_to_end(thread_id)
+
+    def _account(self, thread_id, size):
+        """Add ``size`` bytes to a thread's usage"""
+        self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + size
+        self._total_bytes += size
+
+    def _forget(self, thread_id):
+        """Drop bookkeeping for a thread"""
+        self._last_access.pop(thread_id, None)
+        self._versions.pop(thread_id, None)
+        self._total_bytes -= self._thread_bytes.pop(thread_id, 0)
+
+    def _expire(self, thread_id):
+        """Drop a thread that has been idle too long, so it cannot be continued before the next sweep"""
+        last_access = self._last_access.get(thread_id)
+        if last_access is not None and self.idle_ttl and time.monotonic() - last_access > self.idle_ttl:
+            self._delete(thread_id)
+            self.evictions += 1
+
+    def _evict(self, keep=None):
+        """Evict idle threads, then least recently used threads over the caps"""
+        now = time.monotonic()
+        while self._last_access:
+            thread_id, last_access = next(iter(self._last_access.items()))
+            if thread_id == keep:
+                break
+            expired = self.idle_ttl and now - last_access > self.idle_ttl
+            over_count = self.max_threads and len(self._last_access) > self.max_threads
+            over_bytes = self.max_bytes and self._total_bytes > self.max_bytes
+            if not (expired or over_count or over_bytes):
+                break
+            self._delete(thread_id)
+            self.evictions += 1
+
+    def _delete(self, thread_id):
+        """Remove all stored state for a thread"""
+        super().delete_thread(thread_id)
+        self._forget(thread_id)
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            self._expire(thread_id)
+            self._evict(keep=thread_id)
+            if thread_id in self._last_access:
+                self._touch(thread_id)
+            return super().get_tuple(config)
+
+    def list(self, config, **kwargs):
+        with self._lock:
+            if config is not None:
+                self._expire(config["configurable"]["thread_id"])
+            return iter(list(super().list(config, **kwargs)))
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock, tracing.span("checkpoint_put") as span:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            size = sum(
+                len(self.blobs[(thread_id, checkpoint_ns, k, v)][1])
+                for k, v in new_versions.items()
+            )
+            stored = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            size += len(stored[0][1]) + len(stored[1][1])
+            if not self.keep_history:
+                size -= self._prune(thread_id, checkpoint_ns, checkpoint["id"], new_versions)
+            self._account(thread_id, size)
+            self._touch(thread_id)
+            self._evict(keep=thread_id)
+            if span is not None:
+                span.attributes["bytes"] = size
+            return result
+
+    def _prune(self, thread_id, checkpoint_ns, checkpoint_id, new_versions):
+        """Drop a thread's superseded checkpoints, their writes and channel values; return bytes freed"""
+        freed = 0
+        saved = self.storage[thread_id][checkpoint_ns]
+        for old_id in [old_id for old_id in saved if old_id != checkpoint_id]:
+            stored = saved.pop(old_id)
+            freed += len(stored[0][1]) + len(stored[1][1])
+            outer_key = (thread_id, checkpoint_ns, old_id)
+            freed += self._writes_size(outer_key)
+            self.writes.pop(outer_key, None)
+        current = self._versions.setdefault(thread_id, {}).setdefault(checkpoint_ns, {})
+        for channel, version in new_versions.items():
+            old = current.get(channel)
+            if old is not None and old != version:
+                blob = self.blobs.pop((thread_id, checkpoint_ns, channel, old), None)
+                if blob is not None:
+                    freed += len(blob[1])
+            current[channel] = version
+        return freed
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+        )
+        with self._lock:
+            before = self._writes_size(outer_key)
+            super().put_writes(config, writes, task_id, task_path)
+            self._account(thread_id, self._writes_size(outer_key) - before)
+            self._touch(thread_id)
+
+    def _writes_size(self, outer_key):
+        """Serialized size of the pending writes stored for one checkpoint"""
+        return sum(len(entry[2][1]) for entry in self.writes.get(outer_key, {}).values())
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            self._delete(thread_id)
+
+    def stats(self):
+        """Return a snapshot of memory usage for health reporting"""
+        with self._lock:
+            return {
+                "threads": self.thread_count,
+                "bytes": self._total_bytes,
+                "evictions": self.evictions,
+            }
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """Durable checkpointer keeping only the latest checkpoint of each thread.
+
+    Checkpoints are buffered in memory and written in batches every
+    ``flush_interval`` seconds, so the many intermediate checkpoints of one
+    agent run collapse into a single serialized write. Threads are read
+    from SQLite (WAL mode) only when resumed and are not kept in RAM once
+    flushed. Every ``compact_interval`` seconds threads idle for longer than
+    ``retention`` are deleted and the WAL and free pages are reclaimed.
+    Several processes can share one database file.
+    """
+
+    def __init__(self, path, flush_interval=1.0, compact_interval=300, retention=7 * 24 * 3600, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self.retention = retention
+        self.evictions = 0
+        self.flushes = 0
+        self._lock = threading.RLock()
+        # (thread_id, checkpoint_ns) -> latest checkpoint not yet written
+        self._pending = {}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # Must be set before the first table is created to take effect
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "thread_id TEXT, checkpoint_ns TEXT, checkpoint_id TEXT, parent_id TEXT, "
+            "checkpoint_type TEXT, checkpoint BLOB, metadata_type TEXT, metadata BLOB, "
+            "writes_type TEXT, writes BLOB, updated_at REAL, "
+            "PRIMARY KEY (thread_id, checkpoint_ns))"
+        )
+        self._conn.commit()
+        self._stop = threading.Event()
+        self._last_compaction = time.monotonic()
+        self._worker = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._worker.start()
+        # Buffered checkpoints would otherwise be lost when the process exits
+        atexit.register(self.close)
+
+    def get_next_version(self, current, channel=None):
+        return MemorySaver.get_next_version(self, current, channel)
+
+    def _load(self, thread_id, checkpoint_ns):
+        """Latest checkpoint entry of a thread, from the write buffer or disk"""
+        entry = self._pending.get((thread_id, checkpoint_ns))
+        if entry is not None:
+            return entry
+        row = self._conn.execute(
+            "SELECT checkpoint_id, parent_id, checkpoint_type, checkpoint, metadata_type, metadata, "
+            "writes_type, writes FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?",
+            (thread_id, checkpoint_ns),
+        ).fetchone()
+        if row is None:
+            return None
+        writes = self.serde.loads_typed((row[6], row[7])) if row[7] is not None else []
+        return {
+            "checkpoint_id": row[0],
+            "parent_id": row[1],
+            "checkpoint": self.serde.loads_typed((row[2], row[3])),
+            "metadata": self.serde.loads_typed((row[4], row[5])),
+            "writes": {(w[0], w[4]): tuple(w) for w in writes},
+        }
+
+    def get_tuple(self, config):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            entry = self._load(thread_id, checkpoint_ns)
+        checkpoint_id = get_checkpoint_id(config)
+        if entry is None or (checkpoint_id and checkpoint_id != entry["checkpoint_id"]):
+            return None
+
+        writes = sorted(entry["writes"].values(), key=lambda w: (w[3], w[0], w[4]))
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": entry["checkpoint_id"],
+                }
+            },
+            checkpoint=entry["checkpoint"],
+            metadata=entry["metadata"],
+            pending_writes=[(task_id, channel, value) for task_id, channel, value, _, _ in writes],
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": entry["parent_id"],
+                    }
+                }
+                if entry["parent_id"]
+                else None
+            ),
+        )
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        """Only the latest checkpoint of each thread is kept, so at most one per namespace"""
+        if config is None:
+            return iter([])
+        tuples = []
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            namespaces = {ns for (tid, ns) in self._pending if tid == thread_id}
+            namespaces.update(row[0] for row in self._conn.execute(
+                "SELECT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            ))
+        for checkpoint_ns in sorted(namespaces):
+            if "checkpoint_ns" in config["configurable"] and config["configurable"]["checkpoint_ns"] != checkpoint_ns:
+                continue
+            found = self.get_tuple({"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}})
+            if found is None:
+                continue
+            if filter and any(found.metadata.get(k) != v for k, v in filter.items()):
+                continue
+            if before and found.config["configurable"]["checkpoint_id"] >= get_checkpoint_id(before):
+                continue
+            tuples.append(found)
+        return iter(tuples[:limit] if limit else tuples)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        with self._lock, tracing.span("checkpoint_put"):
+            # Replaces any unwritten older checkpoint of the thread
+            self._pending[(thread_id, checkpoint_ns)] = {
+                "checkpoint_id": checkpoint["id"],
+                "parent_id": config["configurable"].get("checkpoint_id"),
+                "checkpoint": checkpoint,
+                "metadata": get_checkpoint_metadata(config, metadata),
+                "writes": {},
+            }
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            entry = self._load(thread_id, checkpoint_ns)
+            if entry is None or entry["checkpoint_id"] != config["configurable"]["checkpoint_id"]:
+                # Writes for a superseded checkpoint are never read again
+                return
+            for idx, (channel, value) in enumerate(writes):
+                inner_key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+                if inner_key[1] >= 0 and inner_key in entry["writes"]:
+                    continue
+                entry["writes"][inner_key] = (task_id, channel, value, task_path, inner_key[1])
+            self._pending[(thread_id, checkpoint_ns)] = entry
+
+    def delete_thread(self, thread_id):
+        with self._lock:
+            for key in [key for key in self._pending if key[0] == thread_id]:
+                del self._pending[key]
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    def has_thread(self, thread_id):
+        """Check whether a thread is stored, in the buffer or on disk"""
+        with self._lock:
+            if any(key[0] == thread_id for key in self._pending):
+                return True
+            return self._conn.execute(
+                "SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1", (thread_id,)
+            ).fetchone() is not None
+
+    def flush(self):
+        """Write all buffered checkpoints in one transaction"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            rows = []
+            for (thread_id, checkpoint_ns), entry in pending.items():
+                checkpoint = self.serde.dumps_typed(entry["checkpoint"])
+                metadata = self.serde.dumps_typed(entry["metadata"])
+                writes = self.serde.dumps_typed([list(w) for w in entry["writes"].values()])
+                rows.append((
+                    thread_id, checkpoint_ns, entry["checkpoint_id"], entry["parent_id"],
+                    checkpoint[0], checkpoint[1], metadata[0], metadata[1],
+                    writes[0], writes[1], time.time(),
+                ))
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+            self.flushes += 1
+
+    def compact(self):
+        """Drop threads past the retention period and reclaim disk space"""
+        with self._lock:
+            if self.retention:
+                with self._conn:
+                    cursor = self._conn.execute(
+                        "DELETE FROM checkpoints WHERE updated_at < ?", (time.time() - self.retention,)
+                    )
+                self.evictions += cursor.rowcount
+            self._conn.execute("PRAGMA incremental_vacuum")
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+                if self.compact_interval and time.monotonic() - self._last_compaction >= self.compact_interval:
+                    self._last_compaction = time.monotonic()
+                    self.compact()
+            except sqlite3.Error as e:
+                print(f"⚠️ Failed to write checkpoints: {str(e)}")
+
+    def close(self):
+        """Write outstanding checkpoints and stop the background writer"""
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        self._worker.join()
+        self.flush()
+        self._conn.close()
+
+    def stats(self):
+        """Return a snapshot of stored sessions for health reporting"""
+        with self._lock:
+            threads = self._conn.execute("SELECT COUNT(DISTINCT thread_id) FROM checkpoints").fetchone()[0]
+            # Threads whose first checkpoint is still waiting to be written
+            threads += sum(
+                self._conn.execute("SELECT 1 FROM checkpoints WHERE thread_id = ? LIMIT 1", (thread_id,)).fetchone() is None
+                for thread_id in {key[0] for key in self._pending}
+            )
+            page_count = self._conn.execute("PRAGMA page_count").fetchone()[0]
+            page_size = self._conn.execute("PRAGMA page_size").fetchone()[0]
+            return {
+                "threads": threads,
+                "bytes": page_count * page_size,
+                "evictions": self.evictions,
+                "pending": len(self._pending),
+            }
+
+    async def aget_tuple(self, config):
+        return self.get_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        return self.put_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id):
+        return self.delete_thread(thread_id)
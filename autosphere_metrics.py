@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Metrics
+Counters, gauges and latency histograms exported in Prometheus text format
+"""
+
+import math
+import time
+import threading
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from cache hits up to slow model answers
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+def escape_label(value):
+    """Escape a label value for the text exposition format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    """Render ``{"a": "b"}`` as ``{a="b"}``"""
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label(value)}"' for name, value in labels.items()) + "}"
+
+def format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metric:
+    """Base for labelled metrics; values are keyed by label values"""
+
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(dict(zip(self.labelnames, key)))} {format_value(value)}"
+            for key, value in items
+        ]
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the block takes"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = dict(labels, le=format_value(bound))
+                lines.append(f"{self.name}_bucket{format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(labels)} {cumulative}")
+        return lines
+
+class Registry:
+    """Set of metrics rendered together for a scrape.
+
+    Collectors are callables run at scrape time that return extra metrics,
+    for values read from elsewhere such as cache and session statistics.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        """Return all metrics in Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for metric in collector():
+                lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+request_seconds = registry.register(Histogram(
+    "autosphere_request_duration_seconds", "Time to answer an API request", ["endpoint"]))
+requests_total = registry.register(Counter(
+    "autosphere_requests_total", "API requests answered", ["endpoint", "status"]))
+in_flight = registry.register(Gauge(
+    "autosphere_in_flight_requests", "API requests currently being handled"))
+in_flight.set(0)
+admission_wait_seconds = registry.register(Histogram(
+    "autosphere_admission_wait_seconds", "Time chat requests waited for an in-flight slot", ["priority"]))
+admission_rejected_total = registry.register(Counter(
+    "autosphere_admission_rejected_total",
+    "Requests turned away by admission control (rate_limit, queue_full, timeout, shed)", ["priority", "reason"]))
+stage_seconds = registry.register(Histogram(
+    "autosphere_stage_duration_seconds",
+    "Time spent in each stage of answering a chat message (parse_request, router, response_cache, cascade, convert_messages, agent, llm)",
+    ["stage"]))
+tool_seconds = registry.register(Histogram(
+    "autosphere_tool_duration_seconds", "Time spent in each tool call", ["tool"]))
+tool_timeouts_total = registry.register(Counter(
+    "autosphere_tool_timeouts_total", "Tool calls answered with a timeout message", ["tool"]))
+router_requests_total = registry.register(Counter(
+    "autosphere_router_requests_total", "Chat messages by route (an intent answered directly, or agent)", ["route"]))
+router_saved_seconds = registry.register(Counter(
+    "autosphere_router_saved_seconds_total", "Estimated agent time saved by answering messages directly"))
+singleflight_shared_total = registry.register(Counter(
+    "autosphere_singleflight_shared_total", "Calls answered by an identical call already in flight", ["level"]))
+response_cache_requests_total = registry.register(Counter(
+    "autosphere_response_cache_requests_total",
+    "Response cache lookups and stores by result (exact, near, miss, skipped)", ["result"]))
+cascade_requests_total = registry.register(Counter(
+    "autosphere_cascade_requests_total",
+    "Cascade model attempts by outcome (accepted, or why the message went on)", ["model", "outcome"]))
+react_iterations = registry.register(Histogram(
+    "autosphere_react_iterations", "Model calls made by the agent per chat request", (),
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 25)))
+errors_total = registry.register(Counter(
+    "autosphere_errors_total", "Errors by where they happened (server, agent, llm, tool)", ["source"]))
+
+def request_started():
+    """Count a request as in flight; return its start time"""
+    in_flight.inc()
+    return time.perf_counter()
+
+def request_finished(endpoint, started, status):
+    """Record a finished request started with ``request_started``"""
+    in_flight.dec()
+    request_seconds.observe(time.perf_counter() - started, endpoint=endpoint)
+    requests_total.inc(endpoint=endpoint, status=str(status))
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Model Cascade
+Tries smaller models first and escalates to the agent's model only when their answer falls short
+"""
+
+import re
+import time
+import threading
+from collections import Counter
+import autosphere_metrics as metrics
+
+QUERY_TYPES = ("short", "standard", "detailed")
+
+# Words that ask for a long, structured answer
+DETAIL_WORDS = re.compile(
+    r"\b(explain|details?|detailed|steps?|plan|compare|comparison|differences?|guide|strategy|workflows?"
+    r"|pros and cons|in depth|essay|report|outline|roadmap|elaborate)\b",
+    re.IGNORECASE,
+)
+
+# Phrases that show a model is not confident in its answer
+UNSURE_PHRASES = re.compile(
+    r"\b(i don'?t know|i'?m not sure|i am not sure|i don'?t have (that|enough|the)|i do not have"
+    r"|i cannot|i can'?t|i'?m unable|i am unable|as an ai)\b",
+    re.IGNORECASE,
+)
+
+# Tool calls written out as text instead of made
+TOOL_CALL_TEXT = re.compile(r"^\s*(\[\s*)?(\{\s*\"(name|function|tool)\"|<tool_call>)", re.IGNORECASE)
+
+# Finish reasons that mean the answer was cut off (by its token or time limit)
+TRUNCATED = {"length", "max_tokens", "time_limit"}
+
+def classify_query(message, short_words=8, detailed_words=40):
+    """Sort a message into ``short``, ``standard`` or ``detailed`` by length and wording"""
+    words = len(message.split())
+    if words > detailed_words or DETAIL_WORDS.search(message):
+        return "detailed"
+    if words <= short_words:
+        return "short"
+    return "standard"
+
+def query_max_tokens(limits, ceiling):
+    """Completion limit for every query type: ``limits[type]``, never above ``ceiling``"""
+    return {query_type: int(min(limits.get(query_type, ceiling), ceiling)) for query_type in QUERY_TYPES}
+
+def check_answer(reply):
+    """Return why a model reply cannot be used as the final answer, or None if it can"""
+    if getattr(reply, "tool_calls", None):
+        return "tool_plan"
+    content = reply.content if isinstance(reply.content, str) else ""
+    if not content.strip():
+        return "empty"
+    metadata = getattr(reply, "response_metadata", None) or {}
+    if metadata.get("finish_reason") in TRUNCATED:
+        return "truncated"
+    if TOOL_CALL_TEXT.match(content):
+        return "format"
+    if UNSURE_PHRASES.search(content):
+        return "unsure"
+    return None
+
+class Budget:
+    """The time a request may take, counted from when it was created"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.start = time.perf_counter()
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        return self.seconds - self.elapsed()
+
+class ModelCascade:
+    """Ordered smaller models tried before the agent's own model.
+
+    Each tier answers the conversation with the agent's tools bound; its
+    answer is kept unless it plans a tool call or fails ``check_answer``,
+    in which case the next tier (and finally the agent) gets the message.
+    A tier is skipped when its average latency plus the agent's would not
+    fit in what is left of the request's latency budget, and each tier call
+    is given a time limit that leaves the agent its average latency.
+    """
+
+    def __init__(self, tiers, final_model, query_types=("short", "standard"),
+                 max_tokens=None, budgets=None, default_budget=30):
+        # (model name, chat model with tools bound), smallest first
+        self.tiers = tiers
+        self.final_model = final_model
+        self.query_types = set(query_types)
+        # Completion limit per query type, from query_max_tokens()
+        self.max_tokens = max_tokens or {}
+        self.budgets = budgets or {}
+        self.default_budget = default_budget
+        self.latency = {}
+        self.outcomes = {name: Counter() for name, _ in tiers}
+        self._lock = threading.Lock()
+
+    def budget_for(self, query_type):
+        return Budget(self.budgets.get(query_type, self.default_budget))
+
+    def estimate(self, name):
+        """Average latency of a model so far, or 0 before its first answer"""
+        with self._lock:
+            return self.latency.get(name, 0.0)
+
+    def record_latency(self, name, elapsed):
+        with self._lock:
+            average = self.latency.get(name)
+            self.latency[name] = elapsed if average is None else 0.9 * average + 0.1 * elapsed
+
+    def record(self, name, outcome):
+        with self._lock:
+            self.outcomes[name][outcome] += 1
+        metrics.cascade_requests_total.inc(model=name, outcome=outcome)
+
+    def answer(self, messages, query_type, budget=None, config=None):
+        """Return ``(text, model name)`` from the first tier with a usable answer, or None"""
+        if query_type not in self.query_types:
+            return None
+        budget = budget or self.budget_for(query_type)
+        limits = {"max_tokens": self.max_tokens[query_type]} if query_type in self.max_tokens else {}
+        for name, model in self.tiers:
+            # Time this tier may take and still leave the agent enough if it falls short
+            available = budget.remaining() - self.estimate(self.final_model)
+            if available <= 0 or self.estimate(name) > available:
+                self.record(name, "over_budget")
+                continue
+            start = time.perf_counter()
+            try:
+                reply = model.invoke(messages, config, time_limit=int(available * 1000), **limits)
+            except Exception as e:
+                print(f"⚠️ Cascade model {name} failed: {str(e)}")
+                self.record(name, "error")
+                continue
+            self.record_latency(name, time.perf_counter() - start)
+            problem = check_answer(reply)
+            if problem is None:
+                self.record(name, "accepted")
+                return reply.content, name
+            self.record(name, problem)
+        return None
+
+    def stats(self):
+        """Return a snapshot of cascade outcomes for health reporting"""
+        with self._lock:
+            return {
+                "tiers": {
+                    name: {
+                        "outcomes": dict(self.outcomes[name]),
+                        "latency": round(self.latency[name], 3) if name in self.latency else None,
+                    }
+                    for name, _ in self.tiers
+                },
+                "final_model": self.final_model,
+                "final_latency": round(self.latency[self.final_model], 3)
+                if self.final_model in self.latency else None,
+            }
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Offline Backends
+Local stand-ins for watsonx.ai chat and Toolkit tools, for benchmarks without network access
+"""
+
+import time
+import asyncio
+import itertools
+from typing import Any, List, Optional
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from autosphere_ai import AutoSphereAI, TOOL_PARAMS
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model with watsonx-like timing.
+
+    When tools are bound, each user turn first makes ``tool_calls`` tool
+    calls (cycling through ``tool_names``; all at once when
+    ``parallel_tools`` is set), then answers with ``answer_tokens`` tokens.
+    A reply takes ``first_token_latency`` plus ``token_latency`` per token,
+    and is cut short (as a real model would) at a ``max_tokens`` call option.
+    """
+
+    answer_tokens: int = 200
+    token_latency: float = 0.0
+    first_token_latency: float = 0.0
+    tool_calls: int = 1
+    tool_names: List[str] = list(TOOL_PARAMS)
+    parallel_tools: bool = False
+    bound_tools: Optional[List[str]] = None
+    calls: Any = None
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        if self.calls is None:
+            self.calls = itertools.count()
+
+    @property
+    def _llm_type(self):
+        return "autosphere-fake"
+
+    def bind_tools(self, tools, **kwargs):
+        names = [getattr(tool, "name", None) or tool["name"] for tool in tools]
+        return self.model_copy(update={"bound_tools": names})
+
+    def plan(self, messages, max_tokens=None):
+        """Return ``(tool_calls, text)`` for the next reply"""
+        call_id = next(self.calls)
+        tools = [name for name in self.tool_names if name in (self.bound_tools or [])]
+        turn = []
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                question = message.content if isinstance(message.content, str) else str(message.content)
+                break
+            turn.append(message)
+        else:
+            question = ""
+
+        done = sum(isinstance(message, ToolMessage) for message in turn)
+        if tools and done < self.tool_calls:
+            count = self.tool_calls - done if self.parallel_tools else 1
+            return [
+                {
+                    "name": tools[(done + i) % len(tools)],
+                    "args": {"input": question[:200]},
+                    "id": f"call-{call_id}-{i}",
+                }
+                for i in range(count)
+            ], ""
+
+        words = ("AutoSphere automates agriculture healthcare education workflows "
+                 "to save time and reduce costs").split()
+        count = min(self.answer_tokens, max_tokens or self.answer_tokens)
+        return [], " ".join(words[i % len(words)] for i in range(count))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_calls, text = self.plan(messages, kwargs.get("max_tokens"))
+        time.sleep(self.delay(text))
+        message = AIMessage(content=text, tool_calls=tool_calls, response_metadata=self.finish(text, kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_calls, text = self.plan(messages, kwargs.get("max_tokens"))
+        await asyncio.sleep(self.delay(text))
+        message = AIMessage(content=text, tool_calls=tool_calls, response_metadata=self.finish(text, kwargs))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_calls, text = self.plan(messages, kwargs.get("max_tokens"))
+        time.sleep(self.first_token_latency)
+        if tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_calls=tool_calls))
+            return
+        for i, word in enumerate(text.split(" ")):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=word if i == 0 else " " + word))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def finish(self, text, options):
+        """Response metadata saying whether the reply hit its token limit"""
+        cut = bool(text) and options.get("max_tokens") is not None and options["max_tokens"] < self.answer_tokens
+        return {"finish_reason": "length" if cut else "stop"}
+
+    def delay(self, text):
+        """Seconds a reply with ``text`` takes to generate"""
+        tokens = len(text.split(" ")) if text else 1
+        return self.first_token_latency + self.token_latency * tokens
+
+class FakeUtilityTool:
+    """Stand-in for a watsonx.ai Toolkit tool with fixed latency and output size"""
+
+    def __init__(self, name, latency=0.0, payload_size=2000):
+        self.name = name
+        self.latency = latency
+        self.payload_size = payload_size
+        self.runs = 0
+
+    def get(self, key, default=None):
+        return {
+            "name": self.name,
+            "description": f"Offline stand-in for the {self.name} tool",
+        }.get(key, default)
+
+    def run(self, input=None, config=None):
+        self.runs += 1
+        time.sleep(self.latency)
+        text = f"{self.name} result for {input}. "
+        repeats = self.payload_size // len(text) + 1
+        return {"output": (text * repeats)[:self.payload_size]}
+
+class OfflineAutoSphereAI(AutoSphereAI):
+    """AutoSphereAI wired to the offline backends instead of IBM Cloud.
+
+    Everything else, from tool caching to session memory and the context
+    window, is the regular code path.
+    """
+
+    def __init__(self, model_options=None, tool_latency=0.0, payload_size=2000, cascade_options=None):
+        self.model_options = model_options or {}
+        # Options for the scripted model standing in for each MODEL_CASCADE model
+        self.cascade_options = cascade_options or {}
+        self.fake_tools = {
+            name: FakeUtilityTool(name, latency=tool_latency, payload_size=payload_size)
+            for name in TOOL_PARAMS
+        }
+        super().__init__(api_key="offline", project_id="offline")
+
+    def create_chat_model(self, credentials, project_id, client, model_id=None):
+        """Create the scripted chat model"""
+        if model_id is not None:
+            return FakeChatModel(**self.cascade_options.get(model_id, self.model_options))
+        return FakeChatModel(**self.model_options)
+
+    def create_tools(self, client, url=None):
+        """Create the agent tools on top of the fake utility tools"""
+        return [
+            self.create_utility_agent_tool(
+                name, params, client, utility_agent_tool=self.fake_tools[name]
+            )
+            for name, params in TOOL_PARAMS.items()
+        ]
+
+    def initialize(self):
+        """Build the agent without credentials or network access"""
+        with self.startup_phase("agent"):
+            self.agent = self.create_agent({"url": "offline"}, "offline", None)
+        self.initialized = True
+        return True
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Response Cache
+Serves repeated questions from earlier answers, matched exactly or as near-duplicates
+"""
+
+import re
+import json
+import random
+import hashlib
+import threading
+import time
+from collections import Counter, OrderedDict
+from autosphere_cache import MemoryCacheBackend
+from autosphere_retrieval import tokenize
+import autosphere_metrics as metrics
+
+# Answers that used these tools go stale quickly: seconds they may be kept (0 keeps them out)
+TIME_SENSITIVE_TTLS = {
+    "Weather": 0,
+    "GoogleSearch": 60 * 60,
+    "DuckDuckGo": 60 * 60,
+}
+
+# Modulus for the MinHash permutations (the Mersenne prime 2**61 - 1)
+MERSENNE = (1 << 61) - 1
+NUMBER_RE = re.compile(r"\d+")
+
+def shingles(text, size=4):
+    """Overlapping character n-grams of ``text``"""
+    text = f" {text} "
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def content_words(text):
+    """``text`` without stopwords, so filler like "what is the" does not count towards similarity"""
+    return " ".join(tokenize(text)) or text
+
+def numbers(text):
+    """The numbers in ``text``; questions with different numbers are never near-duplicates"""
+    return tuple(sorted(NUMBER_RE.findall(text)))
+
+class MinHasher:
+    """MinHash signatures, whose agreement estimates the Jaccard similarity of two texts' shingles"""
+
+    def __init__(self, permutations=64, seed=1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, MERSENNE), rng.randrange(MERSENNE)) for _ in range(permutations)]
+
+    def signature(self, text):
+        hashes = [
+            int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in shingles(text)
+        ]
+        return tuple(min((a * h + b) % MERSENNE for h in hashes) for a, b in self.params)
+
+class NearDuplicateIndex:
+    """Locality-sensitive hashing over MinHash signatures of cached questions.
+
+    Signatures are cut into ``bands``; questions asked in the same context
+    whose signatures share a band are candidates, and the most similar
+    candidate at or above ``threshold`` is a match. Holds at most
+    ``max_entries`` questions, dropping the oldest.
+    """
+
+    def __init__(self, threshold=0.8, permutations=64, bands=16, max_entries=1000):
+        self.hasher = MinHasher(permutations)
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = permutations // bands
+        self.max_entries = max_entries
+        # key -> (context, signature, numbers)
+        self.entries = OrderedDict()
+        # (context, band, band values) -> keys
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def band_keys(self, context, signature):
+        return [(context, band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def add(self, key, context, text):
+        signature = self.hasher.signature(content_words(text))
+        with self._lock:
+            self._remove(key)
+            self.entries[key] = (context, signature, numbers(text))
+            for band_key in self.band_keys(context, signature):
+                self.buckets.setdefault(band_key, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        context, signature, _ = entry
+        for band_key in self.band_keys(context, signature):
+            keys = self.buckets.get(band_key)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.buckets[band_key]
+
+    def find(self, context, text):
+        """Key of the most similar question in ``context``, or None if none is similar enough"""
+        signature = self.hasher.signature(content_words(text))
+        wanted = numbers(text)
+        with self._lock:
+            candidates = set()
+            for band_key in self.band_keys(context, signature):
+                candidates |= self.buckets.get(band_key, set())
+            best, best_score = None, self.threshold
+            for key in candidates:
+                _, other, other_numbers = self.entries[key]
+                if other_numbers != wanted:
+                    continue
+                score = sum(a == b for a, b in zip(signature, other)) / len(signature)
+                if score >= best_score:
+                    best, best_score = key, score
+            return best
+
+    def __len__(self):
+        return len(self.entries)
+
+class CacheLookup:
+    """Where a message belongs in the response cache, and the cached answer if there was one"""
+
+    def __init__(self, key, context, question, response=None, result="miss"):
+        self.key = key
+        self.context = context
+        self.question = question
+        self.response = response
+        self.result = result
+
+class ResponseCache:
+    """Answers to earlier questions, keyed on the normalized conversation so far and question.
+
+    A question is looked up exactly first and then, with a near-duplicate
+    index, among similar questions asked after the same earlier turns.
+    Answers are kept for ``ttl`` seconds, or less when they used a tool in
+    ``tool_ttls``; a TTL of 0 keeps such answers out of the cache.
+    """
+
+    def __init__(self, backend=None, ttl=24 * 60 * 60, tool_ttls=None, normalize=None, near_duplicates=None):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttl = ttl
+        self.tool_ttls = dict(TIME_SENSITIVE_TTLS)
+        self.tool_ttls.update(tool_ttls or {})
+        self.normalize = normalize or (lambda text: " ".join(text.split()).casefold())
+        self.index = near_duplicates
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        if self.index is not None:
+            self.rebuild_index()
+
+    def rebuild_index(self):
+        """Index the questions already in a persistent backend"""
+        now = time.time()
+        for key, expires_at, value in self.backend.items():
+            if expires_at > now:
+                self.index.add(key, value["context"], value["question"])
+
+    def context_key(self, turns):
+        """Key for the earlier turns of a conversation, given as ``(role, text)`` pairs"""
+        payload = json.dumps([[role, self.normalize(text)] for role, text in turns])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def count(self, result):
+        with self._lock:
+            self.counts[result] += 1
+        metrics.response_cache_requests_total.inc(result=result)
+
+    def lookup(self, turns, message):
+        """Find the cached answer to ``message`` after ``turns``; the CacheLookup is also used to store one"""
+        context = self.context_key(turns)
+        question = self.normalize(message)
+        key = hashlib.sha256(f"{context}\n{question}".encode("utf-8")).hexdigest()
+        response, result = self.get(key), "exact"
+        if response is None and self.index is not None:
+            similar = self.index.find(context, question)
+            if similar is not None:
+                response, result = self.get(similar), "near"
+        if response is None:
+            result = "miss"
+        self.count(result)
+        return CacheLookup(key, context, question, response, result)
+
+    def get(self, key):
+        entry = self.backend.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.time():
+                return value["response"]
+            self.backend.delete(key)
+        if self.index is not None:
+            self.index.remove(key)
+        return None
+
+    def ttl_for(self, tools):
+        """Seconds an answer that used ``tools`` may be kept"""
+        return min([self.ttl] + [self.tool_ttls[tool] for tool in tools if tool in self.tool_ttls])
+
+    def store(self, lookup, response, tools=()):
+        """Keep an answer for later askers; return whether it was cached"""
+        ttl = self.ttl_for(tools)
+        # Empty replies and answers built on live data are not worth repeating
+        if not ttl or not isinstance(response, str) or not response.strip():
+            self.count("skipped")
+            return False
+        value = {
+            "response": response,
+            "context": lookup.context,
+            "question": lookup.question,
+            "tools": sorted(set(tools)),
+        }
+        self.backend.set(lookup.key, value, time.time() + ttl)
+        if self.index is not None:
+            self.index.add(lookup.key, lookup.context, lookup.question)
+        return True
+
+    def invalidate(self, question=None, tool=None, contains=None):
+        """Drop the answers matching every given criterion (all answers without any); return how many"""
+        question = self.normalize(question) if question else None
+        contains = self.normalize(contains) if contains else None
+        removed = 0
+        for key, _, value in self.backend.items():
+            if question is not None and value["question"] != question:
+                continue
+            if tool is not None and tool not in value["tools"]:
+                continue
+            if contains is not None and contains not in value["question"]:
+                continue
+            self.backend.delete(key)
+            if self.index is not None:
+                self.index.remove(key)
+            removed += 1
+        return removed
+
+    def stats(self):
+        """Return hit counts and size for health reporting"""
+        with self._lock:
+            hits = self.counts["exact"] + self.counts["near"]
+            lookups = hits + self.counts["miss"]
+            return {
+                "entries": len(self.backend),
+                "exact_hits": self.counts["exact"],
+                "near_hits": self.counts["near"],
+                "misses": self.counts["miss"],
+                "skipped": self.counts["skipped"],
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Retrieval
+Turns fetched pages into indexed chunks and returns only the parts relevant to a question
+"""
+
+import re
+import json
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+from html.parser import HTMLParser
+
+# Tools whose output is a whole page or article rather than a short answer
+RETRIEVAL_TOOLS = {"WebCrawler", "Wikipedia"}
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+HTML_RE = re.compile(r"<(html|body|div|p|span|a|head|script|!doctype)\b", re.IGNORECASE)
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in into is it its me my
+of on or our so than that the their them then there these they this to was we what when where
+which who why will with you your
+""".split())
+
+# Elements whose text is never page content, and elements that end a line
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+BLOCK_TAGS = {"p", "div", "br", "li", "tr", "h1", "h2", "h3", "h4", "h5", "h6",
+              "section", "article", "header", "footer", "table", "ul", "ol", "pre", "blockquote"}
+
+def tokenize(text):
+    """Lowercase index terms of ``text``, without stopwords"""
+    return [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def source_key(tool_name, query):
+    """Stable key for the page a tool call fetches"""
+    if not isinstance(query, str):
+        query = json.dumps(query, sort_keys=True, default=str)
+    query = " ".join(query.split())
+    # URLs are case-sensitive; article titles and searches are not
+    return f"{tool_name}:{query if tool_name == 'WebCrawler' else query.lower()}"
+
+class TextExtractor(HTMLParser):
+    """Incremental HTML to text conversion that stops once ``max_chars`` are collected"""
+
+    def __init__(self, max_chars):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.size = 0
+        self.skipping = 0
+
+    @property
+    def full(self):
+        return self.size >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in SKIPPED_TAGS:
+            self.skipping = max(self.skipping - 1, 0)
+        elif tag in BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if self.skipping or self.full:
+            return
+        data = data[:self.max_chars - self.size]
+        self.parts.append(data)
+        self.size += len(data)
+
+    def text(self):
+        return "".join(self.parts)
+
+def clean_lines(text):
+    """Collapse whitespace within lines and drop empty lines"""
+    lines = (" ".join(line.split()) for line in text.splitlines())
+    return "\n".join(line for line in lines if line)
+
+def extract_text(raw, max_chars=200000, block_size=65536):
+    """Plain text of a tool result, reading at most ``max_chars`` of content.
+
+    HTML is parsed block by block and parsing stops as soon as the cap is
+    reached, so a huge page costs no more than its first ``max_chars``.
+    """
+    if not isinstance(raw, str):
+        raw = json.dumps(raw, ensure_ascii=False, default=str)
+    if not HTML_RE.search(raw[:block_size]):
+        return clean_lines(raw[:max_chars])
+
+    extractor = TextExtractor(max_chars)
+    for offset in range(0, len(raw), block_size):
+        extractor.feed(raw[offset:offset + block_size])
+        if extractor.full:
+            break
+    extractor.close()
+    return clean_lines(extractor.text())
+
+def split_long(text, size):
+    """Split one over-long paragraph at sentence ends, or hard at ``size``"""
+    pieces, current = [], ""
+    for sentence in re.split(r"(?<=[.!?])\s+", text):
+        while len(sentence) > size:
+            pieces.append(sentence[:size])
+            sentence = sentence[size:]
+        if current and len(current) + len(sentence) + 1 > size:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        pieces.append(current)
+    return pieces
+
+def chunk_text(text, chunk_chars=1000):
+    """Group lines of ``text`` into chunks of about ``chunk_chars`` characters"""
+    chunks, current = [], ""
+    for line in text.splitlines():
+        for piece in split_long(line, chunk_chars) if len(line) > chunk_chars else [line]:
+            if current and len(current) + len(piece) + 1 > chunk_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current}\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+class ChunkIndex:
+    """In-memory BM25 index over page chunks, grouped by source.
+
+    Whole sources are evicted oldest first once more than ``max_chunks``
+    chunks are held.
+    """
+
+    def __init__(self, max_chunks=20000, k1=1.5, b=0.75):
+        self.max_chunks = max_chunks
+        self.k1 = k1
+        self.b = b
+        self.evictions = 0
+        # chunk ID -> (source, position, text, term frequencies, length)
+        self.chunks = {}
+        # term -> set of chunk IDs containing it
+        self.postings = {}
+        # source -> chunk IDs, least recently added first
+        self.sources = OrderedDict()
+        # source -> time it was indexed
+        self.ingested = {}
+        self.total_length = 0
+        self._next_id = 0
+        self._lock = threading.RLock()
+
+    def has_source(self, source):
+        with self._lock:
+            return source in self.sources
+
+    def ingested_at(self, source):
+        """When a source was indexed, or None if it is not held"""
+        with self._lock:
+            return self.ingested.get(source)
+
+    def source_names(self):
+        with self._lock:
+            return list(self.sources)
+
+    def add(self, source, chunks):
+        """Index the chunks of a source, replacing any earlier copy"""
+        with self._lock:
+            self.remove(source)
+            ids = []
+            for position, text in enumerate(chunks):
+                terms = Counter(tokenize(text))
+                chunk_id = self._next_id
+                self._next_id += 1
+                length = sum(terms.values())
+                self.chunks[chunk_id] = (source, position, text, terms, length)
+                self.total_length += length
+                for term in terms:
+                    self.postings.setdefault(term, set()).add(chunk_id)
+                ids.append(chunk_id)
+            self.sources[source] = ids
+            self.ingested[source] = time.time()
+            while len(self.chunks) > self.max_chunks and len(self.sources) > 1:
+                self.remove(next(iter(self.sources)))
+                self.evictions += 1
+
+    def remove(self, source):
+        with self._lock:
+            self.ingested.pop(source, None)
+            for chunk_id in self.sources.pop(source, []):
+                _, _, _, terms, length = self.chunks.pop(chunk_id)
+                self.total_length -= length
+                for term in terms:
+                    ids = self.postings[term]
+                    ids.discard(chunk_id)
+                    if not ids:
+                        del self.postings[term]
+
+    def search(self, query, k=4, source=None):
+        """Return up to ``k`` ``(score, chunk)`` pairs, best first, optionally from one source"""
+        with self._lock:
+            allowed = set(self.sources.get(source, [])) if source is not None else None
+            count = len(self.chunks)
+            average = self.total_length / count if count else 0
+            scores = Counter()
+            for term in set(tokenize(query)):
+                ids = self.postings.get(term, set())
+                if allowed is not None:
+                    ids = ids & allowed
+                if not ids:
+                    continue
+                idf = math.log(1 + (count - len(self.postings[term]) + 0.5) / (len(self.postings[term]) + 0.5))
+                for chunk_id in ids:
+                    _, _, _, terms, length = self.chunks[chunk_id]
+                    tf = terms[term]
+                    norm = self.k1 * (1 - self.b + self.b * length / average) if average else self.k1
+                    scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            return [(score, self.chunks[chunk_id]) for chunk_id, score in scores.most_common(k)]
+
+    def source_chunks(self, source):
+        """All chunks of a source in page order"""
+        with self._lock:
+            return [self.chunks[chunk_id] for chunk_id in self.sources.get(source, [])]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sources": len(self.sources),
+                "chunks": len(self.chunks),
+                "terms": len(self.postings),
+                "evictions": self.evictions,
+            }
+
+class Retriever:
+    """Indexes page-sized tool results and answers each call with its relevant excerpts.
+
+    The index is shared by all sessions since fetched pages are the same for
+    everyone, so a page read once (in any conversation) is answered from the
+    index for later questions instead of being fetched and processed again,
+    until it is older than its tool's cache TTL.
+    """
+
+    def __init__(self, top_k=4, chunk_chars=1000, max_page_chars=200000, max_chunks=20000):
+        self.top_k = top_k
+        self.chunk_chars = chunk_chars
+        self.max_page_chars = max_page_chars
+        self.index = ChunkIndex(max_chunks=max_chunks)
+
+    def has_source(self, source, max_age=None):
+        """Whether a page is indexed, and indexed less than ``max_age`` seconds ago if given"""
+        ingested = self.index.ingested_at(source)
+        if ingested is None:
+            return False
+        return max_age is None or time.time() - ingested < max_age
+
+    def ingested_at(self, source):
+        return self.index.ingested_at(source)
+
+    def invalidate(self, tool=None, contains=None):
+        """Drop pages fetched by ``tool`` and/or whose query contains a phrase (all without either)"""
+        contains = " ".join(contains.split()).lower() if contains else None
+        removed = 0
+        for source in self.index.source_names():
+            name, _, query = source.partition(":")
+            if tool is not None and name != tool:
+                continue
+            if contains is not None and contains not in query.lower():
+                continue
+            self.index.remove(source)
+            removed += 1
+        return removed
+
+    def ingest(self, source, raw):
+        """Extract, chunk and index a fetched page; return the number of chunks"""
+        chunks = chunk_text(extract_text(raw, self.max_page_chars), self.chunk_chars)
+        if chunks:
+            self.index.add(source, chunks)
+        return len(chunks)
+
+    def excerpts(self, source, question):
+        """The parts of an indexed page most relevant to ``question``, in page order"""
+        chunks = self.index.source_chunks(source)
+        if len(chunks) <= self.top_k:
+            return "\n\n".join(chunk[2] for chunk in chunks)
+        hits = [chunk for _, chunk in self.index.search(question, self.top_k, source=source)]
+        # Nothing matched the question; the start of the page is the best guess
+        selected = sorted(hits, key=lambda chunk: chunk[1]) or chunks[:self.top_k]
+        header = f"[{len(selected)} of {len(chunks)} sections of this page, selected for: {question}]\n\n"
+        return header + "\n\n".join(chunk[2] for chunk in selected)
+
+    def stats(self):
+        return self.index.stats()
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Intent Router
+Answers greetings and obvious single-tool questions without the full agent loop
+"""
+
+import re
+import json
+import math
+import threading
+from collections import Counter
+import autosphere_metrics as metrics
+
+GREETING_RESPONSE = "Hi, I am AutoSphere AI. How can I help you?"
+
+FORMAT_PROMPT = """You are AutoSphere AI. Answer the user's question using the tool result below.
+Be clear, structured and concise. If the result does not answer the question, say so and suggest
+what the user could ask instead. Never invent data that is not in the result."""
+
+# Words that mark a question as needing the agent even when a pattern matches
+PLANNING_WORDS = r"best|should|compare|difference|automate|automation|workflow|plan|my|our|your|there"
+CONTEXT_WORDS = rf"\b({PLANNING_WORDS}|it|this|that|these|those|he|she|they|them|you|how|why)\b"
+
+# Checked in order; the first rule whose pattern matches (and whose exclude
+# pattern does not) wins. ``query`` is the named group passed to the tool.
+DEFAULT_RULES = [
+    {
+        "intent": "greeting",
+        "patterns": [
+            r"^(hi+|hello+|hey+|hiya|namaste|namaskar|vanakkam|greetings|good (morning|afternoon|evening))"
+            r"( there)?( autosphere( ai)?)?[\s!.,]*$",
+        ],
+        "examples": ["hi", "hello there", "hey", "namaste", "good morning", "hello autosphere"],
+    },
+    {
+        "intent": "weather",
+        "tool": "Weather",
+        "patterns": [
+            r"^(what('s| is) the )?(current )?(weather|temperature|forecast)( like| today| now)?"
+            r" (in|at|for) (?P<query>[\w .,'-]{2,60}?)( today| now| right now)?[\s?.!]*$",
+            r"^(?!(what|whats|how|is|tell)\b)(?P<query>[\w .'-]{2,40}?) (weather|temperature)( today| now)?[\s?.!]*$",
+        ],
+        "exclude": rf"\b({PLANNING_WORDS})\b",
+        "examples": ["weather in chennai", "temperature in delhi today", "what is the weather like in pune",
+                     "forecast for jaipur", "will it rain in mumbai", "how hot is it in nagpur"],
+    },
+    {
+        "intent": "wikipedia",
+        "tool": "Wikipedia",
+        "patterns": [
+            r"^(who (is|was)|what (is|are|was|were)|tell me about|wikipedia:?) (an? |the )?"
+            r"(?P<query>[\w .,'()-]{2,60}?)[\s?.!]*$",
+        ],
+        "exclude": CONTEXT_WORDS,
+        "max_words": 6,
+        "examples": ["who is apj abdul kalam", "what is photosynthesis", "tell me about the green revolution",
+                     "who was aryabhata", "what is the indian space research organisation"],
+    },
+]
+
+# Examples of messages the agent must handle, so the classifier has a fallback class
+AGENT_EXAMPLES = [
+    "how can iot sensors help farmers save water",
+    "suggest an automation workflow for crop insurance claims",
+    "compare telemedicine options for rural clinics",
+    "plan a digital literacy program for village schools",
+    "what is the best way to automate invoice processing",
+    "summarize this article for me",
+]
+
+# Words dropped before a classified message's location or topic is taken as the query
+QUERY_PREFIX = re.compile(r"^.*?\b(in|at|for|about|of)\s+", re.IGNORECASE)
+TRAILING_TIME = re.compile(
+    r"(\s+(today|tomorrow|tonight|now|right now|currently|this (morning|afternoon|evening|week)))+$",
+    re.IGNORECASE,
+)
+
+# Words a place or topic name does not start with: pronouns, articles,
+# auxiliaries, and the verbs and adjectives people put in front of "weather"
+NON_ENTITY_WORDS = frozenset("""
+a an the this that these those it its i me my we us our you your he him his she her they them their
+is are was were be been am do does did can could will would should may might must
+want know tell show explain describe check get give find need like let please see
+any some no not bad good nice great terrible awful current local
+what whats which who how why when where today tomorrow tonight now
+""".split())
+
+# Questions that are arithmetic or about the date and time, not an article
+ARITHMETIC = re.compile(
+    r"\d\s*([-+*/x×÷^%=]|\b(plus|minus|times|divided|multiplied|over|mod|squared|cubed|percent)\b)"
+    r"|^[\d\s.,]+$",
+    re.IGNORECASE,
+)
+DATE_TIME_WORDS = frozenset("time date day year month week clock hour".split())
+
+def tokenize(text):
+    return re.findall(r"\w+", text.lower())
+
+def clean_query(query):
+    """A matched query without surrounding punctuation and trailing time words"""
+    return TRAILING_TIME.sub("", query.strip(" .,?!")).strip(" .,?!")
+
+def plausible_query(query):
+    """Whether ``query`` looks like a place or topic name rather than part of a sentence"""
+    words = tokenize(query)
+    if not words or words[0] in NON_ENTITY_WORDS or all(word in NON_ENTITY_WORDS for word in words):
+        return False
+    if ARITHMETIC.search(query):
+        return False
+    return not set(words) <= DATE_TIME_WORDS
+
+class Route:
+    """A decision to answer a message without the agent"""
+
+    def __init__(self, intent, tool=None, query=None, source="rule"):
+        self.intent = intent
+        self.tool = tool
+        self.query = query
+        self.source = source
+
+class NaiveBayesClassifier:
+    """Tiny multinomial naive Bayes over words, trained on the rule examples"""
+
+    def __init__(self, examples):
+        self.word_counts = {}
+        self.class_counts = Counter()
+        self.vocabulary = set()
+        for label, texts in examples.items():
+            counts = self.word_counts.setdefault(label, Counter())
+            for text in texts:
+                words = tokenize(text)
+                counts.update(words)
+                self.vocabulary.update(words)
+                self.class_counts[label] += 1
+
+    def predict(self, text):
+        """Return ``(label, probability)`` for the most likely class"""
+        words = [w for w in tokenize(text) if w in self.vocabulary]
+        total = sum(self.class_counts.values())
+        scores = {}
+        for label, counts in self.word_counts.items():
+            size = sum(counts.values()) + len(self.vocabulary)
+            score = math.log(self.class_counts[label] / total)
+            for word in words:
+                score += math.log((counts[word] + 1) / size)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax over the log scores gives a comparable confidence
+        norm = sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, 1 / norm
+
+class IntentRouter:
+    """Precompiled pattern rules, with an optional classifier, in front of the agent.
+
+    Keeps hit counts per intent and an estimate of the time saved: each hit
+    is credited with the running average agent latency minus its own time.
+    """
+
+    def __init__(self, rules=None, classifier=False, min_confidence=0.8):
+        self.rules = []
+        for rule in rules or DEFAULT_RULES:
+            self.rules.append({
+                "intent": rule["intent"],
+                "tool": rule.get("tool"),
+                "patterns": [re.compile(p, re.IGNORECASE) for p in rule.get("patterns", [])],
+                "exclude": re.compile(rule["exclude"], re.IGNORECASE) if rule.get("exclude") else None,
+                "max_words": rule.get("max_words"),
+            })
+        self.classifier = None
+        if classifier:
+            examples = {rule["intent"]: rule.get("examples", []) for rule in rules or DEFAULT_RULES}
+            examples["agent"] = AGENT_EXAMPLES
+            self.classifier = NaiveBayesClassifier(examples)
+        self.min_confidence = min_confidence
+        self.hits = Counter()
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.agent_latency = None
+        self._lock = threading.Lock()
+
+    def match(self, message):
+        """Return a Route for ``message``, or None to use the agent"""
+        text = " ".join(message.split())
+        for rule in self.rules:
+            if rule["exclude"] is not None and rule["exclude"].search(text):
+                continue
+            for pattern in rule["patterns"]:
+                found = pattern.match(text)
+                if found is None:
+                    continue
+                query = found.groupdict().get("query")
+                if query is not None:
+                    query = clean_query(query)
+                    if not plausible_query(query):
+                        continue
+                    if rule["max_words"] and len(query.split()) > rule["max_words"]:
+                        continue
+                return Route(rule["intent"], rule["tool"], query)
+        return self.classify(text)
+
+    def classify(self, text):
+        """Route with the classifier when it is confident and a query can be found"""
+        if self.classifier is None:
+            return None
+        intent, confidence = self.classifier.predict(text)
+        if intent == "agent" or confidence < self.min_confidence:
+            return None
+        rule = next(rule for rule in self.rules if rule["intent"] == intent)
+        if rule["exclude"] is not None and rule["exclude"].search(text):
+            return None
+        if rule["tool"] is None:
+            # A greeting with anything else in it is a question for the agent
+            return None
+        query = clean_query(QUERY_PREFIX.sub("", text))
+        if query == text.strip(" ?.!,") or not plausible_query(query):
+            return None
+        return Route(intent, rule["tool"], query, source="classifier")
+
+    def record_hit(self, intent, elapsed):
+        """Count a routed message and credit the time it saved"""
+        with self._lock:
+            self.hits[intent] += 1
+            saved = max(self.agent_latency - elapsed, 0.0) if self.agent_latency is not None else 0.0
+            self.saved_seconds += saved
+        metrics.router_requests_total.inc(route=intent)
+        metrics.router_saved_seconds.inc(saved)
+
+    def record_miss(self, elapsed):
+        """Count a message answered by the agent and update its average latency"""
+        with self._lock:
+            self.misses += 1
+            if self.agent_latency is None:
+                self.agent_latency = elapsed
+            else:
+                self.agent_latency = 0.9 * self.agent_latency + 0.1 * elapsed
+        metrics.router_requests_total.inc(route="agent")
+
+    def stats(self):
+        """Return a snapshot of router hits for health reporting"""
+        with self._lock:
+            hits = sum(self.hits.values())
+            total = hits + self.misses
+            return {
+                "hits": dict(self.hits),
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+                "saved_seconds": round(self.saved_seconds, 3),
+                "agent_latency": round(self.agent_latency, 3) if self.agent_latency is not None else None,
+            }
+
+def load_rules(path):
+    """Read routing rules from a JSON file, or the defaults when no path is set"""
+    if not path:
+        return DEFAULT_RULES
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def tool_arguments(tool, query):
+    """Arguments for calling ``tool`` with a single text query, or None if it needs more"""
+    args = tool.args
+    if "input" in args:
+        return {"input": query}
+    if len(args) == 1:
+        return {next(iter(args)): query}
+    return None
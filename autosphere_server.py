@@ -6,12 +6,21 @@ Combines frontend serving with backend AI functionality
 
 import os
 import json
+import hmac
+import math
+import uuid
+import hashlib
 import logging
+import threading
 from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, abort, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 from autosphere_ai import AutoSphereAI
+import autosphere_metrics as metrics
+import autosphere_tracing as tracing
+from autosphere_static import StaticAssets
+from autosphere_admission import Overloaded, PriorityGate, RateLimiter, open_bucket_store, parse_limits
 
 # Load environment variables
 load_dotenv('config.env')
@@ -20,16 +29,34 @@ load_dotenv('config.env')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__, static_folder='.')
+# Initialize Flask app; frontend files are served from memory by the routes below
+app = Flask(__name__, static_folder=None)
 CORS(app, origins=os.getenv('ALLOWED_ORIGINS', 'http://localhost:8000').split(','))
 
+# Admission control for chat requests: per-client rate limits, then a
+# priority queue for in-flight slots (interactive before batch)
+rate_limiter = RateLimiter(
+    parse_limits(os.getenv('RATE_LIMITS', 'interactive=1:20,batch=20:1000')),
+    store=open_bucket_store(os.getenv('RATE_LIMIT_STORE', 'memory')),
+) if os.getenv('RATE_LIMIT_ENABLED', 'True').lower() == 'true' else None
+admission = PriorityGate(
+    max_in_flight=int(os.getenv('MAX_IN_FLIGHT', 32)),
+    max_queue=int(os.getenv('MAX_QUEUE', 64)),
+    queue_timeout=float(os.getenv('QUEUE_TIMEOUT', 30)),
+    retry_after=int(os.getenv('RETRY_AFTER', 5)),
+)
+ADMITTED_ENDPOINTS = {'chat', 'chat_stream', 'chat_batch'}
+
 # Global AI instance
 ai_instance = None
 
+# AI lifecycle: 'pending', 'warming' while initializing, then 'ready' or 'failed'
+ai_state = 'pending'
+
 def initialize_ai():
     """Initialize the AutoSphere AI instance"""
-    global ai_instance
+    global ai_instance, ai_state
+    ai_state = 'warming'
     try:
         # Get credentials from environment variables
         api_key = os.getenv('IBM_API_KEY')
@@ -37,87 +64,454 @@ def initialize_ai():
         
         if not api_key or not project_id:
             logger.error("Missing IBM API credentials in config.env")
+            ai_state = 'failed'
             return False
             
-        # Initialize AI instance
-        ai_instance = AutoSphereAI(api_key, project_id)
+        # Initialize AI instance, or a pool of worker processes each holding one
+        workers = int(os.getenv('WORKERS', 1))
+        if workers > 1:
+            from autosphere_workers import WorkerPool
+            instance = WorkerPool(
+                workers,
+                factory_args=(api_key, project_id),
+                store_spec=os.getenv('SESSION_STORE', 'memory'),
+                timeout=float(os.getenv('WORKER_TIMEOUT', 300)),
+                max_sessions=int(os.getenv('SESSION_MAX_THREADS', 1000)),
+                idle_ttl=float(os.getenv('SESSION_IDLE_TTL', 3600))
+            )
+            instance.start()
+        else:
+            instance = AutoSphereAI(api_key, project_id)
+        ai_instance = instance
+        ai_state = 'ready' if instance.initialized else 'failed'
         logger.info("AutoSphere AI initialized successfully")
+        logger.info("Startup phases: " + ", ".join(
+            f"{name}={seconds:.2f}s" for name, seconds in instance.startup_phases.items()
+        ))
         return True
     except Exception as e:
         logger.error(f"Failed to initialize AI: {str(e)}")
+        ai_state = 'failed'
         return False
 
+def start_ai_initialization():
+    """Initialize the AI on a background thread so the server can bind immediately"""
+    global ai_state
+    ai_state = 'warming'
+    thread = threading.Thread(target=initialize_ai, name='ai-initializer', daemon=True)
+    thread.start()
+    return thread
+
+# Frontend files, loaded and compressed once at startup
+assets = StaticAssets(os.path.dirname(os.path.abspath(__file__)))
+
+def asset_response(path):
+    """Serve one frontend file, honouring Accept-Encoding and If-None-Match"""
+    result = assets.respond(
+        path,
+        accept_encoding=request.headers.get('Accept-Encoding'),
+        if_none_match=request.headers.get('If-None-Match')
+    )
+    if result is None:
+        abort(404)
+    status, headers, body = result
+    return Response(body, status=status, headers=headers)
+
 @app.route('/')
 def index():
     """Serve the main HTML file"""
-    return send_from_directory('.', 'index.html')
+    return asset_response('index.html')
 
 @app.route('/<path:filename>')
 def serve_static(filename):
     """Serve static files (CSS, JS, etc.)"""
-    return send_from_directory('.', filename)
+    return asset_response(filename)
+
+def ai_unavailable():
+    """Error ``(payload, status)`` while the AI cannot answer, otherwise None"""
+    if ai_instance:
+        return None
+    if ai_state == 'warming':
+        return ({
+            'success': False,
+            'error': 'AI service is warming up, please retry shortly',
+            'warming': True
+        }, 503)
+    return ({
+        'success': False,
+        'error': 'AI service not initialized'
+    }, 503)
+
+def validate_chat_request(data):
+    """Validate a decoded chat request body
+
+    Returns ``(message, conversation_history, session_id, None)``, or
+    ``(payload, status)`` describing the error as the last element.
+    """
+    message = data.get('message', '').strip()
+    conversation_history = data.get('conversation_history')
+    session_id = data.get('session_id')
+    
+    if not message:
+        return None, None, None, ({
+            'success': False,
+            'error': 'Message is required'
+        }, 400)
+    
+    unavailable = ai_unavailable()
+    if unavailable:
+        return None, None, None, unavailable
+    
+    if not conversation_history:
+        # Delta mode: only the new message is sent, the session holds the rest
+        if session_id and not ai_instance.has_session(session_id):
+            return None, None, None, ({
+                'success': False,
+                'error': 'Session expired',
+                'session_expired': True
+            }, 409)
+        session_id = session_id or uuid.uuid4().hex
+    
+    return message, conversation_history, session_id, None
+
+def parse_chat_request():
+    """Validate the current Flask chat request, with the error as a response"""
+    with metrics.stage_seconds.time(stage="parse_request"), tracing.span("parse_request"):
+        message, conversation_history, session_id, error = validate_chat_request(request.get_json())
+    if error:
+        payload, status = error
+        return None, None, None, (jsonify(payload), status)
+    return message, conversation_history, session_id, None
+
+def trace_flags(value):
+    """Trace flags requested through the X-Trace header or trace query parameter"""
+    if os.getenv('TRACE_ENABLED', 'True').lower() != 'true':
+        return None
+    return tracing.parse_flags(value)
+
+def start_trace(flags):
+    """Create the trace for a request that asked for one"""
+    if not flags:
+        return None
+    return tracing.Trace('chat', profile='profile' in flags)
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     """Handle chat requests from frontend"""
     try:
-        data = request.get_json()
-        message = data.get('message', '').strip()
-        conversation_history = data.get('conversation_history', [])
+        flags = trace_flags(request.headers.get('X-Trace') or request.args.get('trace'))
+        trace = start_trace(flags)
+        with tracing.activate(trace):
+            message, conversation_history, session_id, error = parse_chat_request()
+            if error:
+                return error
+            
+            # Process the message (full history is only sent by stateless clients)
+            response = ai_instance.process_message(message, conversation_history, session_id)
+            
+            payload = {
+                'success': True,
+                'response': response,
+                'session_id': session_id,
+                'timestamp': datetime.now().isoformat()
+            }
+            with tracing.span('serialize_response'):
+                result = jsonify(payload)
         
-        if not message:
-            return jsonify({
-                'success': False,
-                'error': 'Message is required'
-            }), 400
+        if trace is not None:
+            payload.update(tracing.export(trace, flags, os.getenv('TRACE_DIR', 'traces')))
+            result = jsonify(payload)
+        return result
         
-        if not ai_instance:
-            return jsonify({
-                'success': False,
-                'error': 'AI service not initialized'
-            }), 503
+    except Exception as e:
+        logger.error(f"Chat error: {str(e)}")
+        metrics.errors_total.inc(source="server")
+        return jsonify({
+            'success': False,
+            'error': 'Internal server error'
+        }), 500
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Stream a chat response as Server-Sent Events"""
+    try:
+        message, conversation_history, session_id, error = parse_chat_request()
+        if error:
+            return error
         
-        # Process the message with conversation history
-        response = ai_instance.process_message(message, conversation_history)
+        def generate():
+            yield sse_event('session', {'session_id': session_id})
+            for event in ai_instance.process_message_stream(message, conversation_history, session_id):
+                event_type = event.pop('type')
+                if event_type == 'done':
+                    event['timestamp'] = datetime.now().isoformat()
+                yield sse_event(event_type, event)
         
-        return jsonify({
-            'success': True,
-            'response': response,
-            'timestamp': datetime.now().isoformat()
-        })
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
         
     except Exception as e:
-        logger.error(f"Chat error: {str(e)}")
+        logger.error(f"Chat stream error: {str(e)}")
+        metrics.errors_total.inc(source="server")
         return jsonify({
             'success': False,
             'error': 'Internal server error'
         }), 500
 
+@app.route('/api/chat/batch', methods=['POST'])
+def chat_batch():
+    """Answer a list of independent prompts, streaming one JSON line per result"""
+    from autosphere_batch import run_batch
+    
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    max_items = int(os.getenv('BATCH_MAX_ITEMS', 1000))
+    if not isinstance(items, list) or not items:
+        return jsonify({'success': False, 'error': 'items must be a non-empty list'}), 400
+    if len(items) > max_items:
+        return jsonify({'success': False, 'error': f'At most {max_items} items per batch'}), 413
+    unavailable = ai_unavailable()
+    if unavailable:
+        payload, status = unavailable
+        return jsonify(payload), status
+    
+    max_concurrency = int(os.getenv('BATCH_CONCURRENCY', 8))
+    concurrency = max(1, min(int(data.get('concurrency') or max_concurrency), max_concurrency))
+    
+    # Each item takes its own batch-priority slot, so a batch runs no more
+    # agent calls than MAX_IN_FLIGHT allows and yields to interactive requests
+    def generate():
+        for result in run_batch(ai_instance, enumerate(items), concurrency,
+                                admit=lambda: admission.acquire('batch')):
+            yield json.dumps(result) + '\n'
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def admin_authorized():
+    """Whether the request carries the ADMIN_TOKEN; admin endpoints are off when it is unset"""
+    token = os.getenv('ADMIN_TOKEN')
+    return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+@app.route('/api/admin/cache/invalidate', methods=['POST'])
+def invalidate_cache():
+    """Drop cached answers and indexed pages: all of them, or those matching a question, a tool or a phrase"""
+    if not admin_authorized():
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+    unavailable = ai_unavailable()
+    if unavailable:
+        payload, status = unavailable
+        return jsonify(payload), status
+    
+    data = request.get_json(silent=True) or {}
+    criteria = {name: data[name] for name in ('question', 'tool', 'contains') if data.get(name)}
+    if not criteria and data.get('all') is not True:
+        return jsonify({
+            'success': False,
+            'error': 'Send "all": true, or a "question", "tool" or "contains" to match'
+        }), 400
+    
+    removed = ai_instance.invalidate_responses(**criteria)
+    logger.info(f"Invalidated {removed} cached answers and pages ({criteria or 'all'})")
+    return jsonify({'success': True, 'removed': removed})
+
+def health_status():
+    """Build the health check payload"""
+    return {
+        'status': 'warming' if ai_state == 'warming' else 'healthy',
+        'ai_initialized': ai_instance is not None,
+        'ai_state': ai_state,
+        'sessions': ai_instance.memory.stats() if ai_instance and ai_instance.memory else None,
+        'tool_cache': ai_instance.tool_cache.stats() if ai_instance and ai_instance.tool_cache else None,
+        'response_cache': ai_instance.response_cache.stats() if ai_instance and ai_instance.response_cache else None,
+        'router': ai_instance.router.stats() if ai_instance and ai_instance.router else None,
+        'cascade': ai_instance.cascade.stats() if ai_instance and ai_instance.cascade else None,
+        'admission_control': {
+            'slots': admission.stats(),
+            'rate_limits': rate_limiter.stats() if rate_limiter else None,
+        },
+        'singleflight': {
+            'chat': ai_instance.chat_flight.stats(),
+            'tool': ai_instance.tool_flight.stats(),
+        } if ai_instance and ai_instance.chat_flight else None,
+        'timestamp': datetime.now().isoformat()
+    }
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({
-        'status': 'healthy',
-        'ai_initialized': ai_instance is not None,
-        'timestamp': datetime.now().isoformat()
-    })
+    return jsonify(health_status())
 
 @app.route('/api/clear', methods=['POST'])
 def clear_conversation():
     """Clear conversation history"""
     try:
-        # This could be extended to clear server-side conversation storage
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id')
+        
+        if session_id and ai_instance:
+            ai_instance.clear_session(session_id)
+        
         return jsonify({
             'success': True,
             'message': 'Conversation cleared'
         })
     except Exception as e:
         logger.error(f"Clear conversation error: {str(e)}")
+        metrics.errors_total.inc(source="server")
         return jsonify({
             'success': False,
             'error': 'Failed to clear conversation'
         }), 500
 
+def collect_ai_metrics():
+    """Scrape-time metrics read from the tool cache and session memory"""
+    collected = []
+    tool_cache = ai_instance.tool_cache if ai_instance else None
+    if tool_cache is not None:
+        stats = tool_cache.stats()
+        hits = metrics.Counter('autosphere_tool_cache_hits_total', 'Tool calls answered from the cache', ['tool'])
+        misses = metrics.Counter('autosphere_tool_cache_misses_total', 'Tool calls that ran the tool', ['tool'])
+        for tool, counts in stats['tools'].items():
+            hits.inc(counts['hits'], tool=tool)
+            misses.inc(counts['misses'], tool=tool)
+        ratio = metrics.Gauge('autosphere_tool_cache_hit_ratio', 'Share of tool calls answered from the cache')
+        lookups = stats['hits'] + stats['misses']
+        ratio.set(stats['hits'] / lookups if lookups else 0.0)
+        entries = metrics.Gauge('autosphere_tool_cache_entries', 'Results held in the tool cache')
+        entries.set(stats['entries'])
+        collected += [hits, misses, ratio, entries]
+    
+    memory = ai_instance.memory if ai_instance else None
+    if memory is not None:
+        stats = memory.stats()
+        threads = metrics.Gauge('autosphere_sessions', 'Conversation sessions held by the checkpointer')
+        threads.set(stats['threads'])
+        size = metrics.Gauge('autosphere_checkpointer_bytes', 'Approximate size of stored conversation state')
+        size.set(stats['bytes'])
+        evictions = metrics.Counter('autosphere_session_evictions_total', 'Sessions evicted from memory')
+        evictions.inc(stats['evictions'])
+        collected += [threads, size, evictions]
+    return collected
+
+metrics.registry.add_collector(collect_ai_metrics)
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics endpoint"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+def client_id(headers, remote_addr):
+    """Identify the client a request counts against: its API key, else its address"""
+    api_key = headers.get('X-API-Key')
+    if api_key:
+        return 'key:' + hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:16]
+    if os.getenv('TRUST_PROXY', 'False').lower() == 'true' and headers.get('X-Forwarded-For'):
+        return headers['X-Forwarded-For'].split(',')[0].strip()
+    return remote_addr or 'unknown'
+
+def request_priority(headers, batch=False):
+    """Queue priority of a request; clients may ask to wait behind interactive requests"""
+    if batch or headers.get('X-Priority', '').lower() == 'batch':
+        return 'batch'
+    return 'interactive'
+
+def limit_class(batch=False):
+    """Rate limit class of a request, from its endpoint alone.
+
+    ``X-Priority: batch`` only lowers a request's place in the queue; the
+    looser batch limits are for /api/chat/batch, so a client cannot claim
+    them with a header.
+    """
+    return 'batch' if batch else 'interactive'
+
+def rate_limit_error(client, priority, cost=1):
+    """``(payload, status, headers)`` if the client is over its limit, else None"""
+    if rate_limiter is None:
+        return None
+    wait = rate_limiter.check(client, priority, cost)
+    if not wait:
+        return None
+    return ({
+        'success': False,
+        'error': 'Rate limit exceeded, please slow down',
+        'rate_limited': True
+    }, 429, {'Retry-After': str(math.ceil(wait))})
+
+def overloaded_response(error):
+    return jsonify({
+        'success': False,
+        'error': 'Server busy, please retry later'
+    }), error.status, {'Retry-After': str(error.retry_after)}
+
+@app.before_request
+def start_request_metrics():
+    if request.path.startswith('/api/') and request.path != '/api/metrics':
+        g.metrics_started = metrics.request_started()
+
+@app.after_request
+def finish_request_metrics(response):
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        # Recorded on close so streamed responses count until fully sent
+        endpoint, status = request.endpoint, response.status_code
+        response.call_on_close(lambda: metrics.request_finished(endpoint, started, status))
+    return response
+
+@app.teardown_request
+def abandon_request_metrics(error=None):
+    # Only still set when the request failed before a response was built
+    started = g.pop('metrics_started', None)
+    if started is not None:
+        metrics.request_finished(request.endpoint, started, 500)
+
+@app.before_request
+def admit_request():
+    """Apply rate limits and wait for an in-flight slot before a chat request runs"""
+    if request.endpoint not in ADMITTED_ENDPOINTS:
+        return None
+    batch = request.endpoint == 'chat_batch'
+    priority = request_priority(request.headers, batch)
+    cost = 1
+    if batch:
+        items = (request.get_json(silent=True) or {}).get('items')
+        cost = len(items) if isinstance(items, list) and items else 1
+
+    error = rate_limit_error(client_id(request.headers, request.remote_addr), limit_class(batch), cost)
+    if error:
+        payload, status, headers = error
+        return jsonify(payload), status, headers
+    if batch:
+        # Batch items are admitted one by one as they run
+        return None
+    try:
+        g.admission_slot = admission.acquire(priority)
+    except Overloaded as e:
+        return overloaded_response(e)
+
+@app.after_request
+def release_admission(response):
+    slot = g.pop('admission_slot', None)
+    if slot is not None:
+        if response.is_streamed:
+            # Streamed responses keep their slot until fully sent
+            response.call_on_close(slot.release)
+        else:
+            slot.release()
+    return response
+
+@app.teardown_request
+def abandon_admission(error=None):
+    slot = g.pop('admission_slot', None)
+    if slot is not None:
+        slot.release()
+
 @app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
@@ -136,9 +530,12 @@ def internal_error(error):
 
 def main():
     """Main function to run the server"""
-    # Initialize AI
-    if not initialize_ai():
-        logger.warning("Starting server without AI functionality")
+    if os.getenv('SERVER_MODE', 'threaded').lower() == 'async':
+        from autosphere_asgi import main as run_async_server
+        return run_async_server()
+    
+    # Initialize AI in the background; /api/health reports 'warming' until done
+    start_ai_initialization()
     
     # Get server configuration
     host = os.getenv('HOST', 'localhost')
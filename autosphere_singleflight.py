@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Single Flight
+Coalesces identical requests that are in flight at the same time into one execution
+"""
+
+import re
+import asyncio
+import threading
+import autosphere_metrics as metrics
+
+# Normalization steps that can be combined in SINGLEFLIGHT_NORMALIZE
+NORMALIZERS = {
+    "whitespace": lambda text: " ".join(text.split()),
+    "case": lambda text: text.casefold(),
+    "punctuation": lambda text: " ".join(re.sub(r"[^\w\s]", " ", text).split()),
+}
+
+def make_normalizer(spec):
+    """Build a normalizer from a comma-separated list of step names"""
+    steps = []
+    for name in (spec or "").split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in NORMALIZERS:
+            raise ValueError(f"Unknown normalization step: {name}")
+        steps.append(NORMALIZERS[name])
+
+    def normalize(text):
+        for step in steps:
+            text = step(text)
+        return text
+    return normalize
+
+class Flight:
+    """One execution in progress and the callers waiting on it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.waiters = 0
+        self.result = None
+        self.error = None
+        # Called once the run is over, to wake callers waiting on an event loop
+        self.callbacks = []
+
+class SingleFlight:
+    """Runs one call per key at a time and hands its outcome to every caller.
+
+    Callers asking for a key that is already running wait for that run
+    instead of starting their own, up to ``max_waiters`` per run; later
+    callers run on their own. Errors are shared like results. Threads
+    (``do``), coroutines (``ado``) and streams (``stream``) share one set of
+    runs, so any of them can wait on a run another started.
+    """
+
+    def __init__(self, name, max_waiters=100):
+        self.name = name
+        self.max_waiters = max_waiters
+        self.executions = 0
+        self.shared = 0
+        self.overflows = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key, callback=None):
+        """Return ``(role, flight)``: lead a new run, wait on the one in flight, or run alone"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                self.executions += 1
+                return "leader", flight
+            if flight.waiters < self.max_waiters:
+                flight.waiters += 1
+                self.shared += 1
+                if callback is not None:
+                    flight.callbacks.append(callback)
+                metrics.singleflight_shared_total.inc(level=self.name)
+                return "waiter", flight
+            self.overflows += 1
+            self.executions += 1
+            return "alone", flight
+
+    def _finish(self, key, flight):
+        with self._lock:
+            del self._flights[key]
+        flight.done.set()
+        for callback in flight.callbacks:
+            callback()
+
+    def _gave_up(self, flight):
+        with self._lock:
+            flight.waiters -= 1
+        return TimeoutError(f"Gave up waiting on a {self.name} request in flight")
+
+    def _outcome(self, flight):
+        if flight.error is not None:
+            raise flight.error
+        return flight.result, True
+
+    def do(self, key, run, timeout=None):
+        """Return ``(result, shared)``, where ``shared`` is True if another caller ran it.
+
+        A caller waiting on another's run gives up after ``timeout`` seconds
+        with TimeoutError; the run itself carries on.
+        """
+        role, flight = self._join(key)
+        if role == "waiter":
+            if not flight.done.wait(timeout):
+                raise self._gave_up(flight)
+            return self._outcome(flight)
+        if role == "alone":
+            return run(), False
+
+        try:
+            flight.result = run()
+            return flight.result, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            self._finish(key, flight)
+
+    async def ado(self, key, run, timeout=None):
+        """``do`` for a coroutine function ``run``; waiting does not block the event loop"""
+        loop = asyncio.get_running_loop()
+        woken = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: woken.done() or woken.set_result(None))
+
+        role, flight = self._join(key, wake)
+        if role == "waiter":
+            try:
+                await asyncio.wait_for(woken, timeout)
+            except asyncio.TimeoutError:
+                raise self._gave_up(flight) from None
+            return self._outcome(flight)
+        if role == "alone":
+            return await run(), False
+
+        try:
+            flight.result = await run()
+            return flight.result, False
+        except BaseException as e:
+            # A cancelled leader must not hand its cancellation to the waiters
+            flight.error = e if isinstance(e, Exception) else RuntimeError(f"{self.name} request was cancelled")
+            raise
+        finally:
+            self._finish(key, flight)
+
+    def stream(self, key, run, timeout=None):
+        """``do`` for a generator function ``run`` whose return value is the result.
+
+        Use as ``result, shared = yield from flight.stream(key, run)``: the
+        caller that runs it passes its items on, while callers waiting on it
+        yield nothing and only get the result.
+        """
+        role, flight = self._join(key)
+        if role == "waiter":
+            if not flight.done.wait(timeout):
+                raise self._gave_up(flight)
+            return self._outcome(flight)
+        if role == "alone":
+            return (yield from run()), False
+
+        try:
+            flight.result = yield from run()
+            return flight.result, False
+        except BaseException as e:
+            # Includes the client going away mid-stream (GeneratorExit)
+            flight.error = e if isinstance(e, Exception) else RuntimeError(f"{self.name} request was abandoned")
+            raise
+        finally:
+            self._finish(key, flight)
+
+    def stats(self):
+        """Return a snapshot of coalescing for health reporting"""
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "executions": self.executions,
+                "shared": self.shared,
+                "overflows": self.overflows,
+            }
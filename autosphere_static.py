@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Static Assets
+Serves the frontend from memory with precompressed variants and strong caching
+"""
+
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Only frontend files are served; everything else in the project is private
+STATIC_EXTENSIONS = {'.html', '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.ico', '.webp'}
+SKIPPED_DIRS = {'__pycache__', 'venv', 'node_modules', 'traces'}
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'image/svg+xml')
+# Text assets are rewritten in this order so each sees its dependencies' fingerprints
+REWRITE_ORDER = ['.css', '.js', '.html']
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+class Asset:
+    """One file held in memory with its compressed variants"""
+
+    def __init__(self, path, body):
+        self.path = path
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type == 'application/javascript':
+            self.content_type += '; charset=utf-8'
+        self.set_body(body)
+
+    def set_body(self, body):
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()
+        root, ext = os.path.splitext(self.path)
+        self.fingerprinted_path = f"{root}.{self.digest[:10]}{ext}"
+        self.variants = {}
+        if self.content_type.startswith(COMPRESSIBLE_TYPES):
+            self.add_variant('gzip', gzip.compress(body, compresslevel=9, mtime=0))
+            if brotli is not None:
+                self.add_variant('br', brotli.compress(body, quality=11))
+
+    def add_variant(self, encoding, data):
+        # A compressed copy is only worth keeping if it is smaller
+        if len(data) < len(self.body):
+            self.variants[encoding] = data
+
+    def etag(self, encoding=None):
+        """Strong ETag; each encoding is a different representation"""
+        return f'"{self.digest[:32]}{"-" + encoding if encoding else ""}"'
+
+def accepted_encodings(header):
+    """Encodings a client accepts, from an Accept-Encoding header"""
+    accepted = set()
+    for item in (header or '').split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            quality = float(match.group(1))
+        if name and quality > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+class StaticAssets:
+    """Frontend files loaded once at startup.
+
+    Each file can be fetched by its plain path (revalidated through its
+    ETag) or by a fingerprinted path such as ``styles.<hash>.css`` that is
+    cached as immutable. References between HTML, CSS and JS files are
+    rewritten to the fingerprinted paths, so a changed file gets a new URL.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.assets = {}
+        self.fingerprinted = {}
+        self.load()
+
+    def load(self):
+        for directory, dirs, files in os.walk(self.root):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.') and d not in SKIPPED_DIRS)
+            for name in sorted(files):
+                if os.path.splitext(name)[1].lower() not in STATIC_EXTENSIONS:
+                    continue
+                full_path = os.path.join(directory, name)
+                path = os.path.relpath(full_path, self.root).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    self.assets[path] = Asset(path, f.read())
+
+        for ext in REWRITE_ORDER:
+            for asset in self.assets.values():
+                if asset.path.endswith(ext):
+                    asset.set_body(self.rewrite_references(asset))
+
+        self.fingerprinted = {asset.fingerprinted_path: asset for asset in self.assets.values()}
+
+    def rewrite_references(self, asset):
+        """Point quoted and url() references to other assets at their fingerprinted paths"""
+        text = asset.body.decode('utf-8')
+        for path, other in self.assets.items():
+            if other is asset:
+                continue
+            for left, right in (('"', '"'), ("'", "'"), ('(', ')')):
+                text = text.replace(f"{left}{path}{right}", f"{left}{other.fingerprinted_path}{right}")
+        return text.encode('utf-8')
+
+    def url_for(self, path):
+        """Fingerprinted path of an asset, for templates and links"""
+        return self.assets[path].fingerprinted_path
+
+    def lookup(self, path):
+        """Return ``(asset, immutable)`` for a request path, or ``(None, False)``"""
+        if path in self.fingerprinted:
+            return self.fingerprinted[path], True
+        return self.assets.get(path), False
+
+    def respond(self, path, accept_encoding=None, if_none_match=None):
+        """Build ``(status, headers, body)`` for a request, or None if not an asset"""
+        asset, immutable = self.lookup(path)
+        if asset is None:
+            return None
+
+        accepted = accepted_encodings(accept_encoding)
+        encoding = next((name for name in ('br', 'gzip') if name in asset.variants and name in accepted), None)
+        etag = asset.etag(encoding)
+        headers = {
+            'ETag': etag,
+            'Cache-Control': IMMUTABLE if immutable else REVALIDATE,
+            'Vary': 'Accept-Encoding',
+        }
+
+        if if_none_match and (if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]):
+            return 304, headers, b''
+
+        headers['Content-Type'] = asset.content_type
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return 200, headers, asset.variants.get(encoding, asset.body)
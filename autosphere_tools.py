@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Tool Runner
+Runs tool calls with per-tool deadlines and hedges overlapping search tools
+"""
+
+import time
+import threading
+from contextvars import ContextVar, copy_context
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import autosphere_metrics as metrics
+
+# Tools that answer the same kind of question and can stand in for each other
+SEARCH_TOOLS = ("GoogleSearch", "DuckDuckGo")
+
+# time.monotonic() deadline of the tool call a fetch is running for
+current_deadline = ContextVar("autosphere_tool_deadline", default=None)
+
+def remaining_time():
+    """Seconds left before the current tool call's deadline, or None without one"""
+    deadline = current_deadline.get()
+    return None if deadline is None else max(deadline - time.monotonic(), 0)
+
+def timeout_message(tool_name, timeout):
+    """Result handed to the model when a tool misses its deadline"""
+    return (f"The {tool_name} tool timed out after {timeout:g} seconds. "
+            "Answer with the information you already have, or try a different tool.")
+
+def is_good_result(result):
+    """Whether a tool result is worth returning instead of waiting for another"""
+    return result is not None and bool(str(result).strip())
+
+class ToolRunner:
+    """Runs tool fetches on a shared pool so a slow tool cannot hold a request.
+
+    Each tool gets ``timeouts[name]`` (or ``default_timeout``) seconds; a
+    fetch still running at its deadline is left to finish in the background
+    (so its result can still reach the tool cache) and the model is told the
+    tool timed out. A tool has at most ``max_per_tool`` fetches on the pool,
+    so one that hangs cannot take the threads the other tools need. Tools in
+    a hedge group are raced: if the requested tool has no good answer after
+    ``hedge_delay`` seconds, the other tools in its group are started with
+    the same input and the first good answer wins.
+    """
+
+    def __init__(self, timeouts=None, default_timeout=30, hedge_groups=(), hedge_delay=0.5,
+                 max_workers=32, max_per_tool=8):
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.hedge_delay = hedge_delay
+        self.max_per_tool = max_per_tool
+        self.hedges = {}
+        for group in hedge_groups:
+            for name in group:
+                self.hedges[name] = [other for other in group if other != name]
+        self.fetchers = {}
+        self.slots = {}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    def register(self, tool_name, fetch):
+        """Add ``fetch(query)`` as the way to run ``tool_name``"""
+        self.fetchers[tool_name] = fetch
+        self.slots[tool_name] = threading.BoundedSemaphore(self.max_per_tool)
+
+    def timeout_for(self, tool_name):
+        return self.timeouts.get(tool_name, self.default_timeout)
+
+    def submit(self, tool_name, query, deadline, wait_for_slot=True):
+        """Start a fetch once the tool has a free slot; return its future, or None if none freed up in time"""
+        slot = self.slots[tool_name]
+        if not slot.acquire(timeout=max(deadline - time.monotonic(), 0) if wait_for_slot else 0):
+            return None
+        # The fetch sees the caller's trace and the deadline it is working to
+        context = copy_context()
+        context.run(current_deadline.set, deadline)
+        future = self.pool.submit(context.run, self.fetchers[tool_name], query)
+        future.add_done_callback(lambda _: slot.release())
+        return future
+
+    def run(self, tool_name, query):
+        """Run a tool, racing its hedges, and return the first good result"""
+        timeout = self.timeout_for(tool_name)
+        deadline = time.monotonic() + timeout
+        # Hedges share the input, so only plain text queries can be passed on
+        hedges = [name for name in self.hedges.get(tool_name, []) if name in self.fetchers]
+        if not isinstance(query, str):
+            hedges = []
+
+        first = self.submit(tool_name, query, deadline)
+        if first is None:
+            metrics.tool_timeouts_total.inc(tool=tool_name)
+            return timeout_message(tool_name, timeout)
+        futures = {first}
+        hedge_at = time.monotonic() + self.hedge_delay if hedges else None
+        result, error = None, None
+
+        while futures:
+            wake = min(deadline, hedge_at) if hedge_at is not None else deadline
+            done, _ = wait(futures, timeout=max(wake - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                futures.discard(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if is_good_result(result):
+                    return result
+            if hedge_at is not None and (time.monotonic() >= hedge_at or not futures):
+                # The requested tool is slow or came back empty: start the others
+                for name in hedges:
+                    future = self.submit(name, query, deadline, wait_for_slot=False)
+                    if future is not None:
+                        futures.add(future)
+                hedge_at = None
+            elif not done and time.monotonic() >= deadline:
+                # Fetches that never got a thread are dropped; running ones finish for the cache
+                for future in futures:
+                    future.cancel()
+                metrics.tool_timeouts_total.inc(tool=tool_name)
+                return timeout_message(tool_name, timeout)
+
+        if isinstance(error, TimeoutError) and not is_good_result(result):
+            # Gave up waiting on an identical fetch that is still running
+            metrics.tool_timeouts_total.inc(tool=tool_name)
+            return timeout_message(tool_name, timeout)
+        if error is not None and not is_good_result(result):
+            raise error
+        return result
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
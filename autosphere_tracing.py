@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Request Tracing
+Opt-in span trees and sampling CPU profiles for single chat requests
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Trace of the request being handled in this context, if it asked for one
+current_trace = ContextVar("autosphere_trace", default=None)
+# Innermost open span, so nested spans and worker threads find their parent
+active_span = ContextVar("autosphere_span", default=None)
+
+def parse_flags(value):
+    """Parse a trace request such as ``1``, ``json``, ``file`` or ``json,profile``.
+
+    Returns a set of flags (``json``, ``file``, ``profile``), or None when
+    tracing was not asked for.
+    """
+    value = (value or "").strip().lower()
+    if value in ("", "0", "false", "no", "off"):
+        return None
+    flags = {flag.strip() for flag in value.split(",") if flag.strip()}
+    flags = {"json" if flag in ("1", "true", "yes", "on") else flag for flag in flags}
+    if not flags & {"json", "file"}:
+        flags.add("json")
+    return flags
+
+class Span:
+    """One timed step of a request"""
+
+    def __init__(self, name, kind, parent, attributes):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.attributes = attributes
+        self.children = []
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+
+    def to_dict(self, origin):
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+class Trace:
+    """Span tree for one request, optionally with a sampling CPU profile"""
+
+    def __init__(self, name, profile=False, profile_interval=0.005):
+        self.trace_id = uuid.uuid4().hex
+        self.root = Span(name, "request", None, {})
+        # Open spans per thread; the profiler samples threads with any open
+        self.open_spans = Counter({self.root.thread_id: 1})
+        self.profiler = SamplingProfiler(self.open_spans, profile_interval) if profile else None
+        self._lock = threading.Lock()
+
+    def start_span(self, name, kind="internal", parent=None, **attributes):
+        span = Span(name, kind, parent or self.root, attributes)
+        with self._lock:
+            span.parent.children.append(span)
+            self.open_spans[span.thread_id] += 1
+        return span
+
+    def end_span(self, span, **attributes):
+        span.attributes.update(attributes)
+        with self._lock:
+            if span.end is None:
+                self.open_spans[span.thread_id] -= 1
+            span.end = time.perf_counter()
+
+    def finish(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+        if self.root.end is None:
+            self.end_span(self.root)
+
+    def to_dict(self):
+        with self._lock:
+            data = {"trace_id": self.trace_id, "root": self.root.to_dict(self.root.start)}
+        if self.profiler is not None:
+            data["profile"] = self.profiler.report()
+        return data
+
+    def save(self, directory):
+        """Write the trace as JSON under ``directory``; return the file path"""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.trace_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+@contextmanager
+def activate(trace):
+    """Make ``trace`` the current trace for the block; a None trace is a no-op"""
+    if trace is None:
+        yield None
+        return
+    trace_token = current_trace.set(trace)
+    span_token = active_span.set(trace.root)
+    if trace.profiler is not None:
+        trace.profiler.start()
+    try:
+        yield trace
+    finally:
+        active_span.reset(span_token)
+        current_trace.reset(trace_token)
+        trace.finish()
+
+@contextmanager
+def span(name, kind="internal", **attributes):
+    """Record a span in the current trace; yields None when not tracing"""
+    trace = current_trace.get()
+    if trace is None:
+        yield None
+        return
+    new_span = trace.start_span(name, kind, active_span.get(), **attributes)
+    token = active_span.set(new_span)
+    try:
+        yield new_span
+    finally:
+        active_span.reset(token)
+        trace.end_span(new_span)
+
+def export(trace, flags, directory="traces"):
+    """Response fields for a finished trace: inline JSON and/or a trace file path"""
+    result = {}
+    if "json" in flags:
+        result["trace"] = trace.to_dict()
+    if "file" in flags:
+        result["trace_file"] = trace.save(directory)
+    return result
+
+def format_tree(trace):
+    """Render a trace as an indented text tree for the console"""
+    lines = []
+
+    def walk(node, depth):
+        details = ", ".join(f"{key}={value}" for key, value in node["attributes"].items())
+        lines.append(f"{'  ' * depth}{node['name']} {node['duration_ms']:.1f}ms" + (f" ({details})" if details else ""))
+        for child in node["children"]:
+            walk(child, depth + 1)
+
+    data = trace.to_dict()
+    walk(data["root"], 0)
+    for hotspot in data.get("profile", {}).get("hotspots", [])[:10]:
+        lines.append(f"  🔥 {hotspot['self_pct']:5.1f}% {hotspot['function']}")
+    return "\n".join(lines)
+
+class SamplingProfiler:
+    """Samples the stacks of the threads working on one request.
+
+    Every ``interval`` seconds the innermost frame of each watched thread is
+    counted (self time) along with every function on its stack (total time).
+    A thread is watched while it has an open span for the request.
+    """
+
+    def __init__(self, open_spans, interval=0.005, limit=25):
+        self.open_spans = open_spans
+        self.interval = interval
+        self.limit = limit
+        self.samples = 0
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="trace-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, count in list(self.open_spans.items()):
+                frame = frames.get(thread_id)
+                if count <= 0 or frame is None or thread_id == own:
+                    continue
+                self.samples += 1
+                self.self_counts[self._describe(frame, frame.f_lineno)] += 1
+                seen = set()
+                while frame is not None:
+                    key = self._describe(frame, frame.f_code.co_firstlineno)
+                    if key not in seen:
+                        seen.add(key)
+                        self.total_counts[key] += 1
+                    frame = frame.f_back
+
+    @staticmethod
+    def _describe(frame, line):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{line})"
+
+    def report(self):
+        """Hotspots by self time, with inclusive time for context"""
+        total = self.samples or 1
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "hotspots": [
+                {"function": key, "self": count, "self_pct": round(100 * count / total, 1)}
+                for key, count in self.self_counts.most_common(self.limit)
+            ],
+            "cumulative": [
+                {"function": key, "total": count, "total_pct": round(100 * count / total, 1)}
+                for key, count in self.total_counts.most_common(self.limit)
+            ],
+        }
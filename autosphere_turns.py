@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Turn Store
+Packs conversation turns into shared buffers and a compact binary format
+"""
+
+import sys
+import json
+import math
+import struct
+from array import array
+
+# Interned roles, stored as one byte per turn
+ROLES = ("user", "assistant", "system", "tool", "bot")
+ROLE_CODES = {role: code for code, role in enumerate(ROLES)}
+# Code for any other role, which is then kept with the turn's extra fields
+OTHER_ROLE = 255
+
+MAGIC = b"ATS1"
+# Turn count, text bytes, extra bytes
+HEADER = struct.Struct("<III")
+
+# LangChain message types and the roles they are stored as
+MESSAGE_ROLES = {"human": "user", "ai": "assistant", "system": "system", "tool": "tool"}
+# Message fields kept when they differ from their default
+MESSAGE_FIELDS = (
+    "id", "name", "additional_kwargs", "response_metadata", "tool_calls", "invalid_tool_calls",
+    "usage_metadata", "tool_call_id", "status", "artifact",
+)
+FIELD_DEFAULTS = {"status": "success"}
+EMPTY = (None, "", [], {})
+
+def json_exact(value):
+    """Whether ``value`` comes back from JSON unchanged (no tuples, non-string keys or subclasses)"""
+    kind = type(value)
+    if value is None or kind in (str, int, bool):
+        return True
+    if kind is float:
+        return math.isfinite(value)
+    if kind is list:
+        return all(json_exact(item) for item in value)
+    if kind is dict:
+        return all(type(key) is str and json_exact(item) for key, item in value.items())
+    return False
+
+def pack_ends(ends):
+    """Offsets as little-endian 32-bit integers"""
+    if ends.itemsize == 4 and sys.byteorder == "little":
+        return ends.tobytes()
+    return struct.pack(f"<{len(ends)}I", *ends)
+
+def unpack_ends(data):
+    ends = array("I")
+    if ends.itemsize == 4 and sys.byteorder == "little":
+        ends.frombytes(data)
+    else:
+        ends.extend(struct.unpack(f"<{len(data) // 4}I", data))
+    return ends
+
+class Transcript:
+    """Conversation turns packed into a few shared buffers instead of one dict per turn.
+
+    Roles are interned as one byte each and all turn texts share one UTF-8
+    buffer addressed by end offsets. Anything else a turn carries (another
+    role, non-text content, message fields) is kept as JSON only for the
+    turns that have it.
+    """
+
+    __slots__ = ("roles", "text", "text_ends", "extra", "extra_ends")
+
+    def __init__(self, turns=()):
+        self.roles = bytearray()
+        self.text = bytearray()
+        self.text_ends = array("I")
+        self.extra = bytearray()
+        self.extra_ends = array("I")
+        self.extend(turns)
+
+    def append(self, role, content="", extra=None):
+        """Add one turn; ``extra`` is a JSON-serializable dict of further fields"""
+        code = ROLE_CODES.get(role)
+        if code is None:
+            code, extra = OTHER_ROLE, dict(extra or {}, role=role)
+        if not isinstance(content, str):
+            content, extra = "", dict(extra or {}, content=content)
+        encoded = json.dumps(extra, separators=(",", ":")).encode("utf-8") if extra else b""
+        self.roles.append(code)
+        self.text += content.encode("utf-8")
+        self.text_ends.append(len(self.text))
+        self.extra += encoded
+        self.extra_ends.append(len(self.extra))
+
+    def extend(self, turns):
+        """Add turns given as ``{"role": ..., "content": ...}`` dicts"""
+        for turn in turns:
+            extra = {key: value for key, value in turn.items() if key not in ("role", "content")}
+            self.append(turn.get("role"), turn.get("content", ""), extra)
+
+    def __len__(self):
+        return len(self.roles)
+
+    def _span(self, ends, index):
+        return (ends[index - 1] if index else 0), ends[index]
+
+    def role(self, index):
+        code = self.roles[index]
+        if code == OTHER_ROLE:
+            return self.fields(index)["role"]
+        return ROLES[code]
+
+    def content(self, index):
+        start, end = self._span(self.text_ends, index)
+        if start == end:
+            return self.fields(index).get("content", "")
+        return self.text[start:end].decode("utf-8")
+
+    def fields(self, index):
+        """The extra fields stored with a turn"""
+        start, end = self._span(self.extra_ends, index)
+        return json.loads(self.extra[start:end]) if start != end else {}
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("turn index out of range")
+        turn = self.fields(index)
+        turn["role"] = self.role(index)
+        start, end = self._span(self.text_ends, index)
+        if start != end or "content" not in turn:
+            turn["content"] = self.text[start:end].decode("utf-8")
+        return turn
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+    def turns(self):
+        """All turns as dicts"""
+        return list(self)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the turn buffers"""
+        return (len(self.roles) + len(self.text) + len(self.extra)
+                + (len(self.text_ends) + len(self.extra_ends)) * self.text_ends.itemsize)
+
+    def to_bytes(self):
+        return b"".join((
+            MAGIC,
+            HEADER.pack(len(self.roles), len(self.text), len(self.extra)),
+            bytes(self.roles),
+            pack_ends(self.text_ends),
+            pack_ends(self.extra_ends),
+            bytes(self.text),
+            bytes(self.extra),
+        ))
+
+    @classmethod
+    def from_bytes(cls, data):
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a packed transcript")
+        count, text_size, extra_size = HEADER.unpack_from(data, len(MAGIC))
+        offset = len(MAGIC) + HEADER.size
+        transcript = cls()
+        transcript.roles = bytearray(data[offset:offset + count])
+        offset += count
+        transcript.text_ends = unpack_ends(data[offset:offset + 4 * count])
+        offset += 4 * count
+        transcript.extra_ends = unpack_ends(data[offset:offset + 4 * count])
+        offset += 4 * count
+        transcript.text = bytearray(data[offset:offset + text_size])
+        offset += text_size
+        transcript.extra = bytearray(data[offset:offset + extra_size])
+        if offset + extra_size != len(data):
+            raise ValueError("Truncated packed transcript")
+        return transcript
+
+def encode_turns(turns):
+    """Pack turn dicts into bytes"""
+    return Transcript(turns).to_bytes()
+
+def decode_turns(data):
+    """Turn dicts from ``encode_turns`` bytes"""
+    return Transcript.from_bytes(data).turns()
+
+def append_turns(data, turns):
+    """Add turn dicts to packed bytes without decoding the earlier turns"""
+    transcript = Transcript.from_bytes(data) if data else Transcript()
+    transcript.extend(turns)
+    return transcript.to_bytes()
+
+def message_classes():
+    from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+    return {"human": HumanMessage, "ai": AIMessage, "system": SystemMessage, "tool": ToolMessage}
+
+def pack_messages(messages):
+    """Pack a list of LangChain messages, or return None if it cannot be packed losslessly"""
+    if not isinstance(messages, list) or not messages:
+        return None
+    classes = message_classes()
+    transcript = Transcript()
+    try:
+        for message in messages:
+            message_type = getattr(message, "type", None)
+            # Subclasses such as chunks would come back as their base class
+            if type(message) is not classes.get(message_type):
+                return None
+            extra = {}
+            for field in MESSAGE_FIELDS:
+                value = getattr(message, field, None)
+                if value not in EMPTY and value != FIELD_DEFAULTS.get(field):
+                    extra[field] = value
+            # Values JSON would change, such as tuples or int keys, are left to the regular serializer
+            if not json_exact(message.content) or not json_exact(extra):
+                return None
+            transcript.append(MESSAGE_ROLES[message_type], message.content, extra)
+    except (TypeError, ValueError):
+        # Fields that are not plain JSON are left to the regular serializer
+        return None
+    return transcript.to_bytes()
+
+def unpack_messages(data):
+    """LangChain messages from ``pack_messages`` bytes"""
+    classes = message_classes()
+    types = {role: message_type for message_type, role in MESSAGE_ROLES.items()}
+    return [classes[types[turn.pop("role")]](**turn) for turn in Transcript.from_bytes(data)]
@@ -0,0 +1,506 @@
+#!/usr/bin/env python3
+"""
+AutoSphere AI - Worker Pool
+Runs chat handling across several processes with sticky session routing
+"""
+
+import json
+import time
+import queue
+import sqlite3
+import logging
+import itertools
+import threading
+import zlib
+import multiprocessing
+from multiprocessing.connection import wait
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from autosphere_ai import ERROR_REPLY as ERROR_RESPONSE
+from autosphere_turns import append_turns, decode_turns, encode_turns
+
+logger = logging.getLogger(__name__)
+
+# Writes between sweeps for idle sessions
+SWEEP_EVERY = 100
+
+def load_turns(value):
+    """Turns stored packed, or as JSON by earlier versions"""
+    if isinstance(value, str):
+        return json.loads(value)
+    return decode_turns(value)
+
+class InMemorySessionStore:
+    """Session transcripts held in a mapping, packed with ``autosphere_turns``.
+
+    A plain dict suits tests and single-process use; a
+    ``multiprocessing.Manager().dict()`` lets worker processes share it,
+    passing each transcript as one bytes value. Like the checkpointer,
+    sessions idle for longer than ``idle_ttl`` seconds are dropped, and
+    the least recently written ones once there are over ``max_sessions``.
+    """
+
+    def __init__(self, mapping=None, updated=None, max_sessions=1000, idle_ttl=3600):
+        self._sessions = mapping if mapping is not None else {}
+        # session ID -> last write time, kept apart so sweeps need not copy transcripts
+        self._updated = updated if updated is not None else {}
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._writes = 0
+
+    def _expired(self, session_id):
+        updated_at = self._updated.get(session_id)
+        return updated_at is None or bool(self.idle_ttl and time.time() - updated_at > self.idle_ttl)
+
+    def load(self, session_id):
+        packed = self._sessions.get(session_id)
+        if packed is None or self._expired(session_id):
+            return None
+        return decode_turns(packed)
+
+    def _put(self, session_id, packed):
+        self._sessions[session_id] = packed
+        self._updated[session_id] = time.time()
+        self._writes += 1
+        if self._writes % SWEEP_EVERY == 0 or (self.max_sessions and len(self._updated) > self.max_sessions):
+            self.evict()
+
+    def save(self, session_id, turns):
+        self._put(session_id, encode_turns(turns))
+
+    def append(self, session_id, turns):
+        existing = None if self._expired(session_id) else self._sessions.get(session_id)
+        self._put(session_id, append_turns(existing, turns))
+
+    def evict(self):
+        """Drop idle sessions, then the least recently written over the cap; return how many"""
+        now = time.time()
+        ordered = sorted((updated_at, session_id) for session_id, updated_at in dict(self._updated).items())
+        over = len(ordered) - self.max_sessions if self.max_sessions else 0
+        removed = 0
+        for updated_at, session_id in ordered:
+            if removed >= over and not (self.idle_ttl and now - updated_at > self.idle_ttl):
+                break
+            self.delete(session_id)
+            removed += 1
+        return removed
+
+    def exists(self, session_id):
+        return session_id in self._sessions and not self._expired(session_id)
+
+    def delete(self, session_id):
+        self._sessions.pop(session_id, None)
+        self._updated.pop(session_id, None)
+
+class SQLiteSessionStore:
+    """Session transcripts in an SQLite file shared by processes on one node, packed with ``autosphere_turns``.
+
+    Sessions idle for longer than ``idle_ttl`` seconds, and the least
+    recently written ones over ``max_sessions``, are deleted every
+    ``SWEEP_EVERY`` writes.
+    """
+
+    def __init__(self, path, max_sessions=1000, idle_ttl=3600):
+        self.path = path
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._writes = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, turns TEXT, updated_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+
+    def _connect(self):
+        # One connection per thread; WAL lets readers proceed during writes
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _oldest(self):
+        """Earliest write time of a session that has not gone idle"""
+        return time.time() - self.idle_ttl if self.idle_ttl else 0
+
+    def load(self, session_id):
+        row = self._connect().execute(
+            "SELECT turns FROM sessions WHERE session_id = ? AND updated_at >= ?", (session_id, self._oldest())
+        ).fetchone()
+        return load_turns(row[0]) if row else None
+
+    def _written(self):
+        self._writes += 1
+        if self._writes % SWEEP_EVERY == 0:
+            self.evict()
+
+    def save(self, session_id, turns):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                (session_id, encode_turns(turns), time.time()),
+            )
+        self._written()
+
+    def append(self, session_id, turns):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT turns FROM sessions WHERE session_id = ? AND updated_at >= ?",
+                (session_id, self._oldest()),
+            ).fetchone()
+            existing = row[0] if row else None
+            if isinstance(existing, str):
+                existing = encode_turns(json.loads(existing))
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                (session_id, append_turns(existing, turns), time.time()),
+            )
+        self._written()
+
+    def evict(self):
+        """Delete idle sessions, then the least recently written over the cap; return how many"""
+        with self._connect() as conn:
+            removed = 0
+            if self.idle_ttl:
+                removed += conn.execute("DELETE FROM sessions WHERE updated_at < ?", (self._oldest(),)).rowcount
+            if self.max_sessions:
+                removed += conn.execute(
+                    "DELETE FROM sessions WHERE session_id IN ("
+                    "SELECT session_id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_sessions,),
+                ).rowcount
+        return removed
+
+    def exists(self, session_id):
+        return self._connect().execute(
+            "SELECT 1 FROM sessions WHERE session_id = ? AND updated_at >= ?", (session_id, self._oldest())
+        ).fetchone() is not None
+
+    def delete(self, session_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+def open_session_store(spec, max_sessions=1000, idle_ttl=3600):
+    """Open a session store from ``memory`` or ``sqlite:///path/to/file.db``"""
+    if isinstance(spec, (InMemorySessionStore, SQLiteSessionStore)):
+        return spec
+    if spec.startswith("sqlite:///"):
+        return SQLiteSessionStore(spec[len("sqlite:///"):], max_sessions, idle_ttl)
+    return InMemorySessionStore(max_sessions=max_sessions, idle_ttl=idle_ttl)
+
+def create_ai_instance(api_key, project_id):
+    """Default worker factory: a fully initialized AutoSphereAI"""
+    from autosphere_ai import AutoSphereAI
+    return AutoSphereAI(api_key, project_id)
+
+def worker_main(index, factory, factory_args, store_spec, store_limits, tasks, results):
+    """Worker process loop: own AI instance, shared session store
+
+    Results go back over a pipe owned by this worker alone, so a worker that
+    dies mid-write cannot block the others.
+    """
+    ai = factory(*factory_args)
+    store = open_session_store(store_spec, *store_limits)
+    results.send(("ready", index, bool(ai.initialized)))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, kind, payload = task
+        try:
+            if kind == "chat":
+                results.send((task_id, handle_chat(ai, store, *payload)))
+            elif kind == "stream":
+                send = lambda event: results.send(("event", task_id, event))
+                results.send((task_id, handle_chat_stream(ai, store, send, *payload)))
+            elif kind == "clear":
+                ai.clear_session(payload)
+                results.send((task_id, True))
+            elif kind == "invalidate":
+                results.send((task_id, ai.invalidate_responses(**payload)))
+        except Exception as e:
+            logger.error(f"Worker {index} failed a task: {str(e)}")
+            results.send((task_id, ERROR_RESPONSE))
+
+def session_history(ai, store, message, conversation_history, session_id):
+    """History to answer with; reseeds a session this worker does not hold from the shared store"""
+    if session_id and not conversation_history and not ai.has_session(session_id):
+        # Session moved here (restart or rebalance)
+        stored = store.load(session_id)
+        if stored:
+            return stored + [{"role": "user", "content": message}]
+    return conversation_history
+
+def record_turn(store, message, response, conversation_history, session_id):
+    """Add an answered turn to the session's stored transcript"""
+    if conversation_history:
+        store.save(session_id, conversation_history + [{"role": "assistant", "content": response}])
+    else:
+        store.append(session_id, [
+            {"role": "user", "content": message},
+            {"role": "assistant", "content": response},
+        ])
+
+def handle_chat(ai, store, message, conversation_history, session_id):
+    """Answer one chat request inside a worker and record the turn"""
+    if not session_id:
+        return ai.process_message(message, conversation_history, session_id)
+
+    conversation_history = session_history(ai, store, message, conversation_history, session_id)
+    response = ai.process_message(message, conversation_history, session_id)
+    record_turn(store, message, response, conversation_history, session_id)
+    return response
+
+def handle_chat_stream(ai, store, send, message, conversation_history, session_id):
+    """Answer one chat request inside a worker, passing each stream event to ``send``
+
+    Returns the response, or None if the stream ended in an error.
+    """
+    if session_id:
+        conversation_history = session_history(ai, store, message, conversation_history, session_id)
+    response = None
+    for event in ai.process_message_stream(message, conversation_history, session_id):
+        if event["type"] == "done":
+            response = event["response"]
+            # Recorded before the client hears the answer, so its next turn finds it
+            if session_id:
+                record_turn(store, message, response, conversation_history, session_id)
+        send(event)
+    return response
+
+class WorkerPool:
+    """Pre-started worker processes, each with its own AutoSphereAI.
+
+    Offers the same chat interface as AutoSphereAI so the server can use
+    either. Requests for a session always go to the same worker, whose
+    checkpointer already holds that conversation; the shared session store
+    lets another worker pick the session up after a restart. Workers whose
+    AI failed to initialize are left out of routing.
+    """
+
+    def __init__(self, workers, factory=create_ai_instance, factory_args=(),
+                 store_spec="memory", timeout=300, max_sessions=1000, idle_ttl=3600):
+        self.workers = workers
+        self.factory = factory
+        self.factory_args = factory_args
+        self.timeout = timeout
+        self.memory = None
+        self.tool_cache = None
+        self.response_cache = None
+        self.router = None
+        self.cascade = None
+        self.chat_flight = None
+        self.tool_flight = None
+        self.startup_phases = {}
+        self.initialized = False
+        self._ctx = multiprocessing.get_context("spawn")
+        self._manager = None
+        self.store_limits = (max_sessions, idle_ttl)
+        if store_spec == "memory":
+            # Share the in-memory store across processes through a manager
+            self._manager = self._ctx.Manager()
+            self.store = InMemorySessionStore(
+                self._manager.dict(), self._manager.dict(), max_sessions=max_sessions, idle_ttl=idle_ttl
+            )
+        else:
+            self.store = open_session_store(store_spec, *self.store_limits)
+        self.store_spec = self.store if store_spec == "memory" else store_spec
+        self._processes = [None] * workers
+        self._tasks = [None] * workers
+        self._results = [None] * workers
+        self._closed = False
+        self._ready = [threading.Event() for _ in range(workers)]
+        # Whether each worker's AI initialized; the others get no requests
+        self._healthy = [False] * workers
+        self._pending = {}
+        # task ID -> queue receiving the events of a streamed chat
+        self._streams = {}
+        self._task_ids = itertools.count()
+        self._lock = threading.RLock()
+        self._round_robin = itertools.count()
+
+    def start(self, ready_timeout=300):
+        """Start all workers and wait until each has initialized"""
+        start = time.perf_counter()
+        threading.Thread(target=self._collect_results, name="worker-results", daemon=True).start()
+        for index in range(self.workers):
+            self._spawn(index)
+        for event in self._ready:
+            event.wait(ready_timeout)
+        self.startup_phases["workers"] = time.perf_counter() - start
+        return self.initialized
+
+    def _spawn(self, index):
+        self._ready[index].clear()
+        self._tasks[index] = self._ctx.Queue()
+        reader, writer = self._ctx.Pipe(duplex=False)
+        process = self._ctx.Process(
+            target=worker_main,
+            args=(index, self.factory, self.factory_args, self.store_spec, self.store_limits,
+                  self._tasks[index], writer),
+            name=f"autosphere-worker-{index}",
+            daemon=True,
+        )
+        process.start()
+        # Only the worker keeps the write end, so its exit shows up as EOF
+        writer.close()
+        self._processes[index] = process
+        self._results[index] = reader
+
+    def _collect_results(self):
+        """Resolve futures as results arrive from any worker"""
+        while not self._closed:
+            readers = {conn: index for index, conn in enumerate(self._results) if conn is not None}
+            for conn in wait(list(readers), timeout=1):
+                index = readers[conn]
+                try:
+                    item = conn.recv()
+                except (EOFError, OSError):
+                    if self._results[index] is conn and not self._closed:
+                        self._restart(index)
+                    continue
+                if item[0] == "ready":
+                    _, index, ok = item
+                    self._healthy[index] = ok
+                    self.initialized = any(self._healthy)
+                    if not ok:
+                        logger.error(f"Worker {index} failed to initialize; leaving it out of routing")
+                    self._ready[index].set()
+                    continue
+                if item[0] == "event":
+                    _, task_id, event = item
+                    events = self._streams.get(task_id)
+                    if events is not None:
+                        events.put(event)
+                    continue
+                task_id, result = item
+                with self._lock:
+                    future, _ = self._pending.pop(task_id, (None, None))
+                if future is not None:
+                    future.set_result(result)
+
+    def routable(self):
+        """Indexes of the workers that can take requests"""
+        healthy = [index for index, ok in enumerate(self._healthy) if ok]
+        return healthy or list(range(self.workers))
+
+    def worker_for(self, session_id):
+        """Sticky worker index for a session; stateless requests are spread round-robin"""
+        workers = self.routable()
+        if session_id:
+            return workers[zlib.crc32(session_id.encode("utf-8")) % len(workers)]
+        return workers[next(self._round_robin) % len(workers)]
+
+    def _submit(self, index, kind, payload, events=None):
+        future = Future()
+        task_id = next(self._task_ids)
+        with self._lock:
+            process = self._processes[index]
+            if process is None or not process.is_alive():
+                self._restart(index)
+            self._pending[task_id] = (future, index)
+            if events is not None:
+                self._streams[task_id] = events
+                # Events arrive before the result, so the result marks the end of the stream
+                future.add_done_callback(lambda _: self._end_stream(task_id))
+            self._tasks[index].put((task_id, kind, payload))
+        return future
+
+    def _end_stream(self, task_id):
+        events = self._streams.pop(task_id, None)
+        if events is not None:
+            events.put(None)
+
+    def _restart(self, index):
+        """Replace a dead worker and fail whatever it was holding"""
+        with self._lock:
+            if self._processes[index] is not None and self._processes[index].is_alive():
+                self._processes[index].join(timeout=5)
+            if self._processes[index] is not None and self._processes[index].is_alive():
+                return
+            logger.warning(f"Worker {index} is not running; restarting it")
+            lost = [tid for tid, (_, i) in self._pending.items() if i == index]
+            futures = [self._pending.pop(tid)[0] for tid in lost]
+            self._spawn(index)
+        for future in futures:
+            future.set_result(ERROR_RESPONSE)
+
+    def submit(self, message, conversation_history=None, session_id=None):
+        """Queue a chat request on its worker and return a Future for the reply"""
+        return self._submit(
+            self.worker_for(session_id), "chat", (message, conversation_history, session_id)
+        )
+
+    def process_message(self, message, conversation_history=None, session_id=None):
+        """Process a message on a worker and return AI response"""
+        try:
+            return self.submit(message, conversation_history, session_id).result(self.timeout)
+        except FutureTimeoutError:
+            return ERROR_RESPONSE
+
+    async def aprocess_message(self, message, conversation_history=None, session_id=None):
+        """Async variant of process_message for the ASGI server"""
+        import asyncio
+        future = asyncio.wrap_future(self.submit(message, conversation_history, session_id))
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            return ERROR_RESPONSE
+
+    def process_message_stream(self, message, conversation_history=None, session_id=None):
+        """Process a message on a worker, relaying its response events as they are produced"""
+        events = queue.Queue()
+        self._submit(self.worker_for(session_id), "stream", (message, conversation_history, session_id), events)
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                event = events.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                yield {"type": "error", "error": ERROR_RESPONSE}
+                return
+            if event is None:
+                break
+            yield event
+            if event["type"] in ("done", "error"):
+                return
+        # The worker died or failed before finishing the stream
+        yield {"type": "error", "error": ERROR_RESPONSE}
+
+    def has_session(self, session_id):
+        """Check whether a session has a stored transcript"""
+        return self.store.exists(session_id)
+
+    def clear_session(self, session_id):
+        """Drop a session from the shared store and from its worker"""
+        self.store.delete(session_id)
+        self._submit(self.worker_for(session_id), "clear", session_id)
+
+    def invalidate_responses(self, question=None, tool=None, contains=None):
+        """Drop matching cached answers in every worker; return how many"""
+        criteria = {"question": question, "tool": tool, "contains": contains}
+        futures = [self._submit(index, "invalidate", criteria) for index in self.routable()]
+        removed = 0
+        for future in futures:
+            try:
+                result = future.result(self.timeout)
+            except FutureTimeoutError:
+                continue
+            removed += result if isinstance(result, int) else 0
+        return removed
+
+    def shutdown(self):
+        """Stop all workers"""
+        self._closed = True
+        for tasks in self._tasks:
+            if tasks is not None:
+                tasks.put(None)
+        for process in self._processes:
+            if process is not None:
+                process.join(timeout=5)
+        if self._manager is not None:
+            self._manager.shutdown()
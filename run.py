@@ -6,7 +6,9 @@ Checks dependencies and starts the server
 
 import os
 import sys
+import time
 import subprocess
+import importlib
 import importlib.util
 
 def check_dependency(module_name, package_name=None):
@@ -47,6 +49,8 @@ def check_config():
 IBM_API_KEY=your_ibm_cloud_api_key_here
 IBM_PROJECT_ID=your_project_id_here
 IBM_URL=https://us-south.ml.cloud.ibm.com
+# Seconds before expiry at which the IAM token is renewed in the background
+IAM_REFRESH_MARGIN=300
 
 # Server Configuration
 HOST=localhost
@@ -58,6 +62,111 @@ MODEL_ID=ibm/granite-3-3-8b-instruct
 MAX_TOKENS=2000
 TEMPERATURE=0
 
+# Model Cascade (MODEL_CASCADE lists smaller models to try first, smallest first;
+# QUERY_MAX_TOKENS and LATENCY_BUDGETS are per query type: short, standard, detailed)
+MODEL_CASCADE=
+MODEL_CASCADE_TYPES=short,standard
+QUERY_MAX_TOKENS=short=600,standard=1200
+LATENCY_BUDGETS=short=5,standard=15,detailed=60
+
+# Session Memory Configuration (CHECKPOINT_FORMAT is compact or msgpack;
+# SESSION_KEEP_HISTORY keeps every earlier checkpoint of in-memory sessions)
+SESSION_MAX_THREADS=1000
+SESSION_IDLE_TTL=3600
+SESSION_MAX_MEMORY_MB=256
+SESSION_KEEP_HISTORY=False
+CHECKPOINT_FORMAT=compact
+
+# Durable Checkpoints (CHECKPOINT_PATH keeps conversations in a SQLite file
+# instead of memory; CHECKPOINT_RETENTION=0 keeps idle sessions forever)
+CHECKPOINT_PATH=
+CHECKPOINT_FLUSH_INTERVAL=1
+CHECKPOINT_COMPACT_INTERVAL=300
+CHECKPOINT_RETENTION=604800
+
+# Context Window (history beyond CONTEXT_MAX_TOKENS is summarized down to
+# the most recent CONTEXT_WINDOW_TOKENS; long tool outputs are cut)
+CONTEXT_WINDOW_TOKENS=2000
+CONTEXT_MAX_TOKENS=4000
+CONTEXT_SUMMARY_TOKENS=400
+TOOL_OUTPUT_MAX_TOKENS=1000
+
+# Worker Processes (WORKERS>1 handles chat in separate processes;
+# SESSION_STORE is memory or sqlite:///path/to/sessions.db)
+WORKERS=1
+SESSION_STORE=memory
+WORKER_TIMEOUT=300
+
+# Server Configuration (SERVER_MODE=async serves the API over ASGI)
+SERVER_MODE=threaded
+MAX_IN_FLIGHT=32
+MAX_QUEUE=64
+QUEUE_TIMEOUT=30
+RETRY_AFTER=5
+
+# Rate Limits per client, as class=requests_per_second:burst (RATE_LIMIT_STORE=sqlite:///path shares them)
+RATE_LIMIT_ENABLED=True
+RATE_LIMITS=interactive=1:20,batch=20:1000
+RATE_LIMIT_STORE=memory
+TRUST_PROXY=False
+
+# Tool Result Cache (TOOL_CACHE_PATH enables the on-disk SQLite store)
+TOOL_CACHE_ENABLED=True
+TOOL_CACHE_MAX_ENTRIES=1000
+TOOL_CACHE_PATH=
+TOOL_CACHE_TTLS=Weather=600,GoogleSearch=3600,DuckDuckGo=3600,Wikipedia=21600,WebCrawler=21600
+TOOL_METADATA_CACHE=.tool_metadata.json
+
+# Response Cache (answers to repeated questions; RESPONSE_CACHE_PATH enables the on-disk
+# SQLite store, RESPONSE_CACHE_TOOL_TTLS shortens answers that used live tools, 0 = not cached)
+RESPONSE_CACHE_ENABLED=True
+RESPONSE_CACHE_TTL=86400
+RESPONSE_CACHE_MAX_ENTRIES=1000
+RESPONSE_CACHE_PATH=
+RESPONSE_CACHE_TOOL_TTLS=Weather=0,GoogleSearch=3600,DuckDuckGo=3600
+RESPONSE_CACHE_NORMALIZE=whitespace,case,punctuation
+RESPONSE_CACHE_NEAR_DUPLICATES=False
+RESPONSE_CACHE_SIMILARITY=0.8
+
+# Admin endpoints (/api/admin/...) are disabled unless ADMIN_TOKEN is set
+ADMIN_TOKEN=
+
+# Tool Deadlines (seconds per call, TOOL_TIMEOUT=0 disables; TOOL_HEDGE_SEARCH
+# races GoogleSearch and DuckDuckGo once the first is TOOL_HEDGE_DELAY late)
+TOOL_TIMEOUT=30
+TOOL_TIMEOUTS=WebCrawler=15,Weather=10
+TOOL_HEDGE_SEARCH=False
+TOOL_HEDGE_DELAY=0.5
+
+# Intent Router (greetings and simple Weather/Wikipedia questions skip the
+# agent loop; ROUTER_RULES points to a JSON rules file replacing the defaults)
+ROUTER_ENABLED=True
+ROUTER_RULES=
+ROUTER_CLASSIFIER=False
+ROUTER_MIN_CONFIDENCE=0.8
+
+# Request Coalescing (identical opening questions and tool calls in flight at
+# the same time share one run; SINGLEFLIGHT_NORMALIZE: whitespace,case,punctuation)
+SINGLEFLIGHT_ENABLED=True
+SINGLEFLIGHT_NORMALIZE=whitespace,case
+SINGLEFLIGHT_MAX_WAITERS=100
+
+# Page Retrieval (WebCrawler and Wikipedia results are chunked into a local
+# index and only the RETRIEVAL_TOP_K sections relevant to the question are sent)
+RETRIEVAL_ENABLED=True
+RETRIEVAL_TOP_K=4
+RETRIEVAL_CHUNK_CHARS=1000
+RETRIEVAL_MAX_PAGE_CHARS=200000
+RETRIEVAL_MAX_CHUNKS=20000
+
+# Batch Answering (/api/chat/batch and python autosphere_ai.py --batch)
+BATCH_CONCURRENCY=8
+BATCH_MAX_ITEMS=1000
+
+# Request Tracing (send X-Trace: json|file|profile or ?trace= on /api/chat)
+TRACE_ENABLED=True
+TRACE_DIR=traces
+
 # CORS Configuration (for frontend-backend communication)
 ALLOWED_ORIGINS=http://localhost:8000,http://127.0.0.1:8000
 """)
@@ -75,13 +184,45 @@ ALLOWED_ORIGINS=http://localhost:8000,http://127.0.0.1:8000
     print("✅ Config file is properly configured!")
     return True
 
+def profile_startup(dependency_check_seconds):
+    """Print import and startup-phase timings instead of starting the server"""
+    timings = [("dependency check", dependency_check_seconds)]
+    
+    # Server module first: it should stay light now that the AI libraries load lazily
+    start = time.perf_counter()
+    import autosphere_server
+    timings.append(("import autosphere_server", time.perf_counter() - start))
+    
+    # Heavy libraries in the order the agent loads them (shared deps count once)
+    for module in ['ibm_watsonx_ai', 'langchain_core.messages', 'langchain_core.tools',
+                   'langchain_ibm', 'langgraph.prebuilt']:
+        start = time.perf_counter()
+        importlib.import_module(module)
+        timings.append((f"import {module}", time.perf_counter() - start))
+    
+    # Full agent initialization, broken down by phase
+    start = time.perf_counter()
+    autosphere_server.initialize_ai()
+    timings.append(("initialize_ai", time.perf_counter() - start))
+    if autosphere_server.ai_instance:
+        for name, seconds in autosphere_server.ai_instance.startup_phases.items():
+            timings.append((f"  {name}", seconds))
+    
+    print("\n⏱️  Startup profile")
+    print("=" * 50)
+    for name, seconds in timings:
+        print(f"{name:<40}{seconds * 1000:>9.1f} ms")
+
 def main():
     """Main startup function"""
     print("🚀 AutoSphere AI - Startup Check")
     print("=" * 50)
     
+    startup_profile = '--startup-profile' in sys.argv
+    
     # Check dependencies
     print("🔍 Checking dependencies...")
+    dependency_check_start = time.perf_counter()
     required_deps = [
         ('flask', 'Flask'),
         ('flask_cors', 'Flask-CORS'),
@@ -97,6 +238,7 @@ def main():
     for module, package in required_deps:
         if not check_dependency(module, package):
             missing_deps.append(package)
+    dependency_check_seconds = time.perf_counter() - dependency_check_start
     
     if missing_deps:
         print(f"\n❌ Missing dependencies: {', '.join(missing_deps)}")
@@ -110,6 +252,10 @@ def main():
             print("❌ Cannot start without required dependencies.")
             return
     
+    if startup_profile:
+        profile_startup(dependency_check_seconds)
+        return
+    
     # Check config
     print("\n🔍 Checking configuration...")
     if not check_config():
@@ -3,6 +3,7 @@
 class AutoSphereAI {
     constructor() {
         this.conversationHistory = [];
+        this.sessionId = null;
         this.isConnected = false;
         this.currentTheme = 'light';
         this.apiBaseUrl = window.location.origin; // Use same origin for API calls
@@ -175,6 +176,10 @@ class AutoSphereAI {
                 this.isConnected = true;
                 this.updateStatus('Connected', 'success');
                 console.log('✅ Server is healthy, AI initialized:', data.ai_initialized);
+            } else if (data.status === 'warming') {
+                // The AI is still starting up on the server; check again shortly
+                this.updateStatus('Warming Up', 'warning');
+                setTimeout(() => this.checkServerHealth(), 2000);
             } else {
                 this.updateStatus('Server Error', 'error');
             }
@@ -219,6 +224,12 @@ class AutoSphereAI {
         this.showTypingIndicator();
 
         try {
+            if (this.isConnected) {
+                // Stream the response into a bot message as it is generated
+                await this.streamFromAPI(message);
+                return;
+            }
+
             // Send message to backend API
             const response = await this.sendToAPI(message);
             
@@ -280,11 +291,14 @@ class AutoSphereAI {
         chatMessages.scrollTop = chatMessages.scrollHeight;
         
         // Store in conversation history
-        this.conversationHistory.push({
+        const entry = {
             role: sender,
             content: content,
             timestamp: new Date().toISOString()
-        });
+        };
+        this.conversationHistory.push(entry);
+
+        return { messageText, entry };
     }
 
     showTypingIndicator() {
@@ -324,11 +338,15 @@ class AutoSphereAI {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
-                }
+                },
+                body: JSON.stringify({
+                    session_id: this.sessionId
+                })
             });
         } catch (error) {
             console.warn('Failed to clear conversation on server:', error);
         }
+        this.sessionId = null;
         
         // Clear frontend
         const chatMessages = document.getElementById('chat-messages');
@@ -399,17 +417,21 @@ class AutoSphereAI {
     // API Integration Methods
     async sendToAPI(message) {
         try {
-            const response = await fetch(`${this.apiBaseUrl}/api/chat`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    message: message,
-                    conversation_history: this.conversationHistory
-                })
+            // Only the new message is sent; the server keeps the session history
+            let response = await this.postChat({
+                message: message,
+                session_id: this.sessionId
             });
 
+            // The server dropped our session: resend the full history to reseed it
+            if (response.status === 409) {
+                response = await this.postChat({
+                    message: message,
+                    conversation_history: this.conversationHistory,
+                    session_id: this.sessionId
+                });
+            }
+
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
@@ -417,6 +439,7 @@ class AutoSphereAI {
             const data = await response.json();
             
             if (data.success) {
+                this.sessionId = data.session_id || this.sessionId;
                 return data.response;
             } else {
                 throw new Error(data.error || 'Unknown error');
@@ -433,6 +456,88 @@ class AutoSphereAI {
         }
     }
 
+    async streamFromAPI(message) {
+        // Same session protocol as sendToAPI, answered as Server-Sent Events
+        let response = await this.postChat({
+            message: message,
+            session_id: this.sessionId
+        }, '/api/chat/stream');
+
+        if (response.status === 409) {
+            response = await this.postChat({
+                message: message,
+                conversation_history: this.conversationHistory,
+                session_id: this.sessionId
+            }, '/api/chat/stream');
+        }
+
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let botMessage = null;
+
+        const render = (content) => {
+            if (!botMessage) {
+                this.hideTypingIndicator();
+                botMessage = this.addMessage('bot', '');
+            }
+            text = content;
+            botMessage.entry.content = text;
+            botMessage.messageText.innerHTML = this.formatBotMessage(text);
+            const chatMessages = document.getElementById('chat-messages');
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        };
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            const events = buffer.split('\n\n');
+            buffer = events.pop();
+            for (const raw of events) {
+                const eventLine = raw.match(/^event: (.*)$/m);
+                const dataLine = raw.match(/^data: (.*)$/m);
+                if (!eventLine || !dataLine) continue;
+                const data = JSON.parse(dataLine[1]);
+
+                switch (eventLine[1]) {
+                    case 'session':
+                        this.sessionId = data.session_id || this.sessionId;
+                        break;
+                    case 'token':
+                        render(text + data.content);
+                        break;
+                    case 'tool_start':
+                        // Drop any reasoning text; the final answer follows the tools
+                        render(`_Using ${data.name}..._`);
+                        text = '';
+                        break;
+                    case 'done':
+                        render(data.response);
+                        break;
+                    case 'error':
+                        throw new Error(data.error);
+                }
+            }
+        }
+    }
+
+    postChat(payload, path = '/api/chat') {
+        return fetch(`${this.apiBaseUrl}${path}`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(payload)
+        });
+    }
+
     // Fallback simulated response (for when API is not available)
     async simulateAPIResponse(message) {
         // Simulate network delay
@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from autosphere_admission import Overloaded, PriorityGate, RateLimiter
+
+def wait_for_queue(gate, size):
+    deadline = time.monotonic() + 2
+    while len(gate._queue) < size and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(gate._queue) == size
+
+def start_waiter(gate, priority, results):
+    def run():
+        try:
+            slot = gate.acquire(priority)
+        except Overloaded as error:
+            results.append((priority, error.status, error.reason))
+            return
+        results.append((priority, 200, None))
+        slot.release()
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+def test_no_queue_rejects_with_429():
+    gate = PriorityGate(max_in_flight=1, max_queue=0)
+    slot = gate.acquire()
+    with pytest.raises(Overloaded) as error:
+        gate.acquire()
+    assert error.value.status == 429
+    assert error.value.reason == "queue_full"
+    slot.release()
+    gate.acquire().release()
+    assert gate.stats()["in_flight"] == 0
+
+def test_queue_timeout_returns_503():
+    gate = PriorityGate(max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    slot = gate.acquire()
+    with pytest.raises(Overloaded) as error:
+        gate.acquire()
+    assert (error.value.status, error.value.reason) == (503, "timeout")
+    assert gate.stats()["waiting"] == {}
+    slot.release()
+
+def test_waiters_admitted_by_priority_then_arrival():
+    gate = PriorityGate(max_in_flight=1, max_queue=3, queue_timeout=5)
+    slot = gate.acquire()
+    results = []
+    threads = []
+    for count, priority in enumerate(("batch", "interactive", "interactive"), 1):
+        threads.append(start_waiter(gate, priority, results))
+        wait_for_queue(gate, count)
+    slot.release()
+    for thread in threads:
+        thread.join(5)
+    assert [priority for priority, _, _ in results] == ["interactive", "interactive", "batch"]
+    assert gate.stats()["in_flight"] == 0
+
+def test_interactive_sheds_newest_batch_waiter():
+    gate = PriorityGate(max_in_flight=1, max_queue=2, queue_timeout=5)
+    slot = gate.acquire()
+    results = []
+    threads = [start_waiter(gate, "batch", results)]
+    wait_for_queue(gate, 1)
+    threads.append(start_waiter(gate, "batch", results))
+    wait_for_queue(gate, 2)
+    threads.append(start_waiter(gate, "interactive", results))
+    threads[1].join(5)
+    assert results == [("batch", 503, "shed")]
+    slot.release()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(results) == [("batch", 200, None), ("batch", 503, "shed"), ("interactive", 200, None)]
+    assert gate.stats()["rejected"] == {"shed": 1}
+
+def test_batch_does_not_shed_interactive():
+    gate = PriorityGate(max_in_flight=1, max_queue=1, queue_timeout=5)
+    slot = gate.acquire()
+    results = []
+    thread = start_waiter(gate, "interactive", results)
+    wait_for_queue(gate, 1)
+    with pytest.raises(Overloaded) as error:
+        gate.acquire("batch")
+    assert error.value.status == 429
+    slot.release()
+    thread.join(5)
+    assert results == [("interactive", 200, None)]
+
+def test_async_waiter_shares_slots_with_threads():
+    gate = PriorityGate(max_in_flight=1, max_queue=1, queue_timeout=5)
+    slot = gate.acquire()
+
+    async def run():
+        waiting = asyncio.ensure_future(gate.acquire_async())
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        threading.Timer(0.05, slot.release).start()
+        (await waiting).release()
+
+    asyncio.run(run())
+    assert gate.stats()["in_flight"] == 0
+
+def test_rate_limiter_allows_burst_then_limits():
+    limiter = RateLimiter({"interactive": (1, 3)})
+    assert [limiter.check("client", "interactive") for _ in range(3)] == [0, 0, 0]
+    assert limiter.check("client", "interactive") > 0
+    assert limiter.check("other", "interactive") == 0
+    assert limiter.check("client", "batch") == 0
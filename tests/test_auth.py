@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from autosphere_auth import IAMTokenManager
+
+class ScriptedManager(IAMTokenManager):
+    """IAMTokenManager handing out numbered tokens with a fixed lifetime"""
+
+    def __init__(self, lifetime, **kwargs):
+        super().__init__("apikey", **kwargs)
+        self.lifetime = lifetime
+
+    def request_token(self):
+        return f"token-{self.refreshes + 1}", time.time() + self.lifetime
+
+@pytest.fixture
+def manager(request):
+    manager = ScriptedManager(**request.param)
+    yield manager
+    manager.close()
+
+@pytest.mark.parametrize("manager", [{"lifetime": 3600, "refresh_margin": 300}], indirect=True)
+def test_token_reused_until_margin(manager):
+    assert manager.get_token() == "token-1"
+    assert manager.get_token() == "token-1"
+    assert manager.refreshes == 1
+    delay = manager._timer.interval
+    assert 3290 < delay <= 3300
+
+@pytest.mark.parametrize("manager", [{"lifetime": 60, "refresh_margin": 300}], indirect=True)
+def test_short_lived_token_refreshes_halfway(manager):
+    assert manager.get_token() == "token-1"
+    # The margin exceeds the lifetime: without clamping every call would refresh
+    assert manager.get_token() == "token-1"
+    assert manager.refreshes == 1
+    assert 29 < manager._timer.interval <= 30
+
+@pytest.mark.parametrize("manager", [{"lifetime": 60}], indirect=True)
+def test_listeners_get_renewed_tokens(manager):
+    seen = []
+    manager.add_listener(seen.append)
+    manager.get_token()
+    manager.get_token(force=True)
+    assert seen == ["token-1", "token-2"]
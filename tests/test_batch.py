@@ -0,0 +1,55 @@
+import json
+import pickle
+
+from autosphere_ai import ERROR_REPLY, ErrorReply
+from autosphere_batch import answer_item, run_batch, run_file
+
+class ScriptedAI:
+    """Answers from a dict of message -> reply, recording what it was asked"""
+
+    def __init__(self, replies):
+        self.replies = replies
+        self.asked = []
+
+    def process_message(self, message, conversation_history=None, session_id=None):
+        self.asked.append(message)
+        return self.replies.get(message, f"Answer to {message}")
+
+def test_answer_that_starts_with_sorry_succeeds():
+    ai = ScriptedAI({"Can you book my train?": "Sorry, I can't book tickets, but here is the IRCTC link."})
+    result = answer_item(ai, 0, {"message": "Can you book my train?"})
+    assert result["success"] is True
+    assert result["response"].startswith("Sorry,")
+
+def test_error_reply_fails_item():
+    ai = ScriptedAI({"Break": ERROR_REPLY})
+    result = answer_item(ai, 3, {"message": "Break"})
+    assert result == {"id": "3", "success": False, "error": ERROR_REPLY, "elapsed": result["elapsed"]}
+
+def test_items_without_message_fail_and_others_run():
+    ai = ScriptedAI({})
+    results = {r["id"]: r for r in run_batch(ai, enumerate([{"id": "a", "message": " "}, "plain question"]))}
+    assert results["a"] == {"id": "a", "success": False, "error": "Message is required"}
+    assert results["1"]["response"] == "Answer to plain question"
+    assert ai.asked == ["plain question"]
+
+def test_run_file_resumes_and_retries_failures(tmp_path):
+    source = tmp_path / "prompts.jsonl"
+    output = tmp_path / "results.jsonl"
+    source.write_text("".join(json.dumps({"id": name, "message": name}) + "\n" for name in ("one", "two", "three")))
+    # A previous run answered "one", failed "two" and was cut off mid-line
+    output.write_text(
+        json.dumps({"id": "one", "success": True, "response": "done"}) + "\n"
+        + json.dumps({"id": "two", "success": False, "error": ERROR_REPLY}) + "\n"
+        + '{"id": "three", "succ'
+    )
+    ai = ScriptedAI({})
+    assert run_file(ai, str(source), str(output), concurrency=2) == (2, 0, 1)
+    assert sorted(ai.asked) == ["three", "two"]
+    lines = output.read_text().splitlines()
+    assert lines[2] == '{"id": "three", "succ'
+    assert sorted(json.loads(line)["id"] for line in lines[3:]) == ["three", "two"]
+
+def test_error_reply_type_survives_pickling():
+    # Worker processes send their replies back pickled
+    assert isinstance(pickle.loads(pickle.dumps(ERROR_REPLY)), ErrorReply)
@@ -0,0 +1,30 @@
+import pytest
+
+import autosphere_bench as bench
+import autosphere_server as server
+from autosphere_offline import OfflineAutoSphereAI
+
+@pytest.fixture
+def ai(monkeypatch):
+    monkeypatch.setattr(server, "ai_instance", None)
+    monkeypatch.setattr(server, "ai_state", "pending")
+    return OfflineAutoSphereAI(model_options={"token_latency": 0, "first_token_latency": 0}, tool_latency=0)
+
+@pytest.mark.parametrize("target", ["flask", "http"])
+def test_server_targets_finish_without_errors(ai, target):
+    limiter = server.rate_limiter
+    driver = bench.DRIVERS[target](ai)
+    try:
+        # More requests than the default interactive burst
+        result = bench.run_benchmark(driver, concurrency=4, conversations=8, turns=4)
+    finally:
+        driver.close()
+    assert result["requests"] == 32
+    assert result["errors"] == 0
+    assert server.rate_limiter is limiter
+
+def test_compare_flags_regressions():
+    lines, regressed = bench.compare({"p50": 0.2, "rps": 10}, {"p50": 0.1, "rps": 10})
+    assert regressed
+    assert any("regression" in line for line in lines)
+    assert not bench.compare({"p50": 0.1, "rps": 12}, {"p50": 0.1, "rps": 10})[1]
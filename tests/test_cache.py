@@ -0,0 +1,47 @@
+import json
+import os
+import threading
+
+from autosphere_cache import ToolMetadataCache
+
+TOOLS = {
+    "Weather": {"description": "Current weather", "agent_description": None, "input_schema": None},
+    "Wikipedia": {"description": "Encyclopedia", "agent_description": "Look up topics", "input_schema": {"type": "object"}},
+}
+
+def test_metadata_round_trip(tmp_path):
+    cache = ToolMetadataCache(str(tmp_path / "tools.json"))
+    assert cache.load(TOOLS) is None
+    assert cache.save(TOOLS, "https://eu-de.ml.cloud.ibm.com")
+    assert cache.load(["Weather"], "https://eu-de.ml.cloud.ibm.com") == {"Weather": TOOLS["Weather"]}
+
+def test_stale_metadata_is_not_used(tmp_path):
+    path = tmp_path / "tools.json"
+    cache = ToolMetadataCache(str(path))
+    cache.save(TOOLS, "https://eu-de.ml.cloud.ibm.com")
+    # Another region, a tool added since, or an older file layout
+    assert cache.load(TOOLS, "https://us-south.ml.cloud.ibm.com") is None
+    assert cache.load(list(TOOLS) + ["GoogleSearch"], "https://eu-de.ml.cloud.ibm.com") is None
+    data = json.loads(path.read_text())
+    path.write_text(json.dumps(dict(data, version=ToolMetadataCache.VERSION - 1)))
+    assert cache.load(TOOLS, "https://eu-de.ml.cloud.ibm.com") is None
+    path.write_text("{not json")
+    assert cache.load(TOOLS, "https://eu-de.ml.cloud.ibm.com") is None
+
+def test_failed_save_is_reported_not_raised(tmp_path):
+    cache = ToolMetadataCache(str(tmp_path / "missing" / "tools.json"))
+    assert cache.save(TOOLS) is False
+    cache = ToolMetadataCache(str(tmp_path / "tools.json"))
+    assert cache.save({"Weather": object()}) is False
+    assert os.listdir(tmp_path) == []
+
+def test_concurrent_writers_leave_a_whole_file(tmp_path):
+    path = str(tmp_path / "tools.json")
+    # Separate instances, as each worker process has its own
+    writers = [threading.Thread(target=ToolMetadataCache(path).save, args=(TOOLS,)) for _ in range(8)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    assert ToolMetadataCache(path).load(TOOLS) == TOOLS
+    assert os.listdir(tmp_path) == ["tools.json"]
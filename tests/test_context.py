@@ -0,0 +1,82 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from autosphere_context import ContextWindow, count_tokens
+
+class SummaryModel:
+    """Stands in for the chat model, recording each summary request"""
+
+    def __init__(self, fail=False):
+        self.prompts = []
+        self.fail = fail
+
+    def invoke(self, messages, config=None):
+        self.prompts.append(messages[-1].content)
+        if self.fail:
+            raise RuntimeError("model unavailable")
+        return AIMessage(content=f"summary {len(self.prompts)}")
+
+def conversation(turns, words=50):
+    messages = []
+    for turn in range(turns):
+        messages.append(HumanMessage(content=f"question {turn} " + "word " * words))
+        messages.append(AIMessage(content=f"answer {turn} " + "word " * words))
+    return messages
+
+def test_short_conversation_is_sent_verbatim():
+    window = ContextWindow(SummaryModel(), window_tokens=200, max_tokens=400)
+    messages = conversation(2)
+    update = window({"messages": messages})
+    assert update == {"llm_input_messages": messages}
+
+def test_long_conversation_is_summarized_from_a_user_turn():
+    model = SummaryModel()
+    window = ContextWindow(model, window_tokens=200, max_tokens=400)
+    messages = conversation(6)
+    update = window({"messages": messages})
+    start = update["summarized_count"]
+    assert 0 < start < len(messages)
+    assert isinstance(messages[start], HumanMessage)
+    assert update["context_summary"] == "summary 1"
+    llm_input = update["llm_input_messages"]
+    assert isinstance(llm_input[0], SystemMessage) and "summary 1" in llm_input[0].content
+    assert llm_input[1:] == messages[start:]
+    assert sum(count_tokens(m) for m in llm_input[1:]) <= 200
+    assert "question 0" in model.prompts[0]
+
+def test_only_new_turns_are_summarized():
+    model = SummaryModel()
+    window = ContextWindow(model, window_tokens=200, max_tokens=400)
+    messages = conversation(6)
+    update = window({"messages": messages})
+    state = {"messages": messages + conversation(3)[4:], **update}
+    # Still under the limit after the earlier fold: the cached summary is reused
+    again = window(state)
+    assert len(model.prompts) == 1
+    assert again["llm_input_messages"][0].content.endswith("summary 1")
+    state["messages"] = state["messages"] + conversation(6)
+    window(state)
+    assert model.prompts[1].startswith("Existing summary:\nsummary 1")
+    first_new = model.prompts[1].split("New messages:\n")[1]
+    assert first_new.startswith("User: " + messages[update["summarized_count"]].content[:20])
+
+def test_latest_question_is_always_kept():
+    window = ContextWindow(SummaryModel(), window_tokens=50, max_tokens=60)
+    messages = conversation(3) + [HumanMessage(content="final " + "word " * 300)]
+    update = window({"messages": messages})
+    assert update["llm_input_messages"][-1] is messages[-1]
+    assert update["summarized_count"] == len(messages) - 1
+
+def test_failed_summary_keeps_the_old_one():
+    window = ContextWindow(SummaryModel(fail=True), window_tokens=200, max_tokens=400)
+    update = window({"messages": conversation(6), "context_summary": "earlier"})
+    assert update["context_summary"] == "earlier"
+    assert window.summaries == 0
+
+def test_long_tool_output_is_cut():
+    window = ContextWindow(SummaryModel(), tool_output_tokens=10)
+    call = AIMessage(content="", tool_calls=[{"name": "WebCrawler", "args": {"url": "x"}, "id": "1"}])
+    page = ToolMessage(content="x" * 1000, tool_call_id="1", name="WebCrawler")
+    update = window({"messages": [HumanMessage(content="Read x"), call, page]})
+    trimmed = update["llm_input_messages"][-1]
+    assert trimmed.content == "x" * 40 + "\n[... output truncated]"
+    assert page.content == "x" * 1000
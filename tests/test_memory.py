@@ -0,0 +1,130 @@
+import time
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from autosphere_memory import BoundedMemorySaver, CompactSerializer, SQLiteCheckpointSaver
+
+def config(thread_id):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+def save(saver, thread_id, text):
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": [HumanMessage(content=text), AIMessage(content=f"Re: {text}")]}
+    return saver.put(config(thread_id), checkpoint, {"step": 1}, {})
+
+def messages(saver, thread_id):
+    found = saver.get_tuple(config(thread_id))
+    return None if found is None else [m.content for m in found.checkpoint["channel_values"]["messages"]]
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "checkpoints.db")
+
+def open_saver(path, **kwargs):
+    return SQLiteCheckpointSaver(path, flush_interval=3600, serde=CompactSerializer(), **kwargs)
+
+def test_checkpoints_survive_restart(path):
+    saver = open_saver(path)
+    save(saver, "a", "first")
+    save(saver, "a", "second")
+    saver.flush()
+    # Not flushed, and so lost if the process dies
+    save(saver, "b", "unsaved")
+    restarted = open_saver(path)
+    try:
+        assert messages(restarted, "a") == ["second", "Re: second"]
+        assert restarted.has_thread("a")
+        assert not restarted.has_thread("b")
+    finally:
+        restarted.close()
+        saver.close()
+
+def test_close_flushes_pending_checkpoints(path):
+    saver = open_saver(path)
+    save(saver, "a", "hello")
+    assert saver.stats()["pending"] == 1
+    saver.close()
+    reopened = open_saver(path)
+    try:
+        assert messages(reopened, "a") == ["hello", "Re: hello"]
+    finally:
+        reopened.close()
+
+def test_stats_count_threads_not_yet_flushed(path):
+    saver = open_saver(path)
+    try:
+        save(saver, "a", "one")
+        saver.flush()
+        save(saver, "a", "two")
+        save(saver, "b", "three")
+        stats = saver.stats()
+        assert stats["threads"] == 2
+        assert stats["pending"] == 2
+        saver.flush()
+        assert saver.stats()["threads"] == 2
+    finally:
+        saver.close()
+
+def test_compaction_prunes_threads_past_retention(path):
+    saver = open_saver(path, retention=60)
+    try:
+        save(saver, "old", "stale")
+        save(saver, "new", "fresh")
+        saver.flush()
+        saver._conn.execute("UPDATE checkpoints SET updated_at = updated_at - 120 WHERE thread_id = 'old'")
+        saver._conn.commit()
+        saver.compact()
+        assert messages(saver, "old") is None
+        assert messages(saver, "new") == ["fresh", "Re: fresh"]
+        assert saver.stats()["evictions"] == 1
+    finally:
+        saver.close()
+
+def test_delete_thread_drops_pending_and_stored(path):
+    saver = open_saver(path)
+    try:
+        save(saver, "a", "one")
+        saver.flush()
+        save(saver, "a", "two")
+        saver.delete_thread("a")
+        assert not saver.has_thread("a")
+        saver.flush()
+        assert messages(saver, "a") is None
+    finally:
+        saver.close()
+
+def test_idle_session_expires_on_read(monkeypatch):
+    saver = BoundedMemorySaver(idle_ttl=60, serde=CompactSerializer())
+    save(saver, "a", "hello")
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    # Expired even though nothing has been written or pruned since
+    assert not saver.has_thread("a")
+    assert saver.get_tuple(config("a")) is None
+    assert saver.stats() == {"threads": 0, "bytes": 0, "evictions": 1}
+
+def test_idle_session_expires_on_resume(monkeypatch):
+    saver = BoundedMemorySaver(idle_ttl=60, serde=CompactSerializer())
+    save(saver, "a", "hello")
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 61)
+    assert saver.get_tuple(config("a")) is None
+    assert not saver.has_thread("a")
+
+def test_thread_and_memory_caps_evict_least_recently_used():
+    saver = BoundedMemorySaver(max_threads=2, serde=CompactSerializer())
+    save(saver, "a", "one")
+    save(saver, "b", "two")
+    saver.get_tuple(config("a"))
+    save(saver, "c", "three")
+    assert [saver.has_thread(t) for t in "abc"] == [True, False, True]
+
+    size = saver.total_bytes // 2
+    capped = BoundedMemorySaver(max_bytes=int(size * 2.5), serde=CompactSerializer())
+    for thread_id in "abcd":
+        save(capped, thread_id, "x" * 10)
+    assert capped.total_bytes <= capped.max_bytes
+    assert capped.has_thread("d") and not capped.has_thread("a")
+    assert capped.evictions >= 1
@@ -0,0 +1,91 @@
+import re
+
+import pytest
+
+import autosphere_metrics as metrics
+import autosphere_server as server
+from autosphere_offline import OfflineAutoSphereAI
+
+# One sample line: name, optional labels, value
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="([^"\\]|\\.)*",?)*\})? (-?[0-9.e+-]+|\+Inf|NaN)$')
+
+def test_counter_and_gauge_lines():
+    counter = metrics.Counter("jobs_total", "Jobs run", ["kind"])
+    counter.inc(kind="b")
+    counter.inc(2, kind="a")
+    gauge = metrics.Gauge("depth", "Queue depth")
+    gauge.set(3)
+    gauge.dec()
+    assert counter.render() == [
+        "# HELP jobs_total Jobs run",
+        "# TYPE jobs_total counter",
+        'jobs_total{kind="a"} 2',
+        'jobs_total{kind="b"} 1',
+    ]
+    assert gauge.render()[1:] == ["# TYPE depth gauge", "depth 2"]
+
+def test_label_values_are_escaped():
+    counter = metrics.Counter("odd_total", "Odd labels", ["value"])
+    counter.inc(value='say "hi"\\\n')
+    assert counter.render()[-1] == 'odd_total{value="say \\"hi\\"\\\\\\n"} 1'
+    assert SAMPLE.match(counter.render()[-1])
+
+def test_histogram_buckets_are_cumulative():
+    histogram = metrics.Histogram("wait_seconds", "Wait", ["stage"], buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.5, 5):
+        histogram.observe(value, stage="x")
+    assert histogram.render()[2:] == [
+        'wait_seconds_bucket{stage="x",le="0.1"} 1',
+        'wait_seconds_bucket{stage="x",le="1"} 3',
+        'wait_seconds_bucket{stage="x",le="+Inf"} 4',
+        'wait_seconds_sum{stage="x"} 6.05',
+        'wait_seconds_count{stage="x"} 4',
+    ]
+
+def test_registry_runs_collectors_at_scrape_time():
+    registry = metrics.Registry()
+    registry.register(metrics.Counter("a_total", "A"))
+    scrapes = []
+
+    def collect():
+        scrapes.append(1)
+        gauge = metrics.Gauge("scrapes", "Scrapes so far")
+        gauge.set(len(scrapes))
+        return [gauge]
+
+    registry.add_collector(collect)
+    registry.render()
+    text = registry.render()
+    assert text.endswith("scrapes 2\n")
+    assert "# TYPE a_total counter" in text
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "False")
+    ai = OfflineAutoSphereAI(model_options={"token_latency": 0, "first_token_latency": 0})
+    monkeypatch.setattr(server, "ai_instance", ai)
+    monkeypatch.setattr(server, "ai_state", "ready")
+    return server.app.test_client()
+
+def test_metrics_endpoint_is_valid_exposition_text(client):
+    chat = client.post("/api/chat", json={"message": "How do soil sensors work?"})
+    assert chat.status_code == 200
+    # Requests are recorded when their response is closed
+    chat.close()
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    assert "version=0.0.4" in response.headers["Content-Type"]
+    text = response.get_data(as_text=True)
+    typed = set()
+    for line in text.splitlines():
+        if line.startswith("# TYPE "):
+            name = line.split()[2]
+            assert name not in typed, f"{name} declared twice"
+            typed.add(name)
+        elif not line.startswith("# HELP "):
+            assert SAMPLE.match(line), line
+    assert 'autosphere_requests_total{endpoint="chat",status="200"} ' in text
+    assert "autosphere_sessions " in text
+    # The scrape itself is not counted as an API request
+    assert 'endpoint="metrics_endpoint"' not in text
@@ -0,0 +1,76 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from autosphere_models import ModelCascade, check_answer, classify_query, query_max_tokens
+
+class ScriptedModel:
+    """Returns a fixed reply and records the limits each call was given"""
+
+    def __init__(self, reply=None, error=None):
+        self.reply = reply
+        self.error = error
+        self.calls = []
+
+    def invoke(self, messages, config=None, time_limit=None, **limits):
+        self.calls.append({"time_limit": time_limit, **limits})
+        if self.error:
+            raise self.error
+        return self.reply
+
+MESSAGES = [HumanMessage(content="What is a greenhouse?")]
+
+def test_classify_query():
+    assert classify_query("Hi there") == "short"
+    assert classify_query("What crops grow well in sandy soil near the coast?") == "standard"
+    assert classify_query("Explain drip irrigation") == "detailed"
+    assert classify_query(" ".join(["word"] * 41)) == "detailed"
+
+def test_query_max_tokens_capped_by_ceiling():
+    assert query_max_tokens({"short": 200, "detailed": 5000}, 1000) == {
+        "short": 200, "standard": 1000, "detailed": 1000}
+
+def test_check_answer_reasons():
+    tool_call = {"name": "WebSearch", "args": {"query": "x"}, "id": "1"}
+    assert check_answer(AIMessage(content="", tool_calls=[tool_call])) == "tool_plan"
+    assert check_answer(AIMessage(content="  ")) == "empty"
+    assert check_answer(AIMessage(content="Half", response_metadata={"finish_reason": "length"})) == "truncated"
+    assert check_answer(AIMessage(content='{"name": "WebSearch"}')) == "format"
+    assert check_answer(AIMessage(content="I'm not sure about that.")) == "unsure"
+    assert check_answer(AIMessage(content="A greenhouse is a glass building.")) is None
+
+def test_first_usable_tier_answers():
+    unsure = ScriptedModel(AIMessage(content="I don't know."))
+    good = ScriptedModel(AIMessage(content="A glass building for plants."))
+    cascade = ModelCascade([("tiny", unsure), ("small", good)], "large", max_tokens={"short": 64})
+    assert cascade.answer(MESSAGES, "short") == ("A glass building for plants.", "small")
+    assert good.calls[0]["max_tokens"] == 64
+    assert good.calls[0]["time_limit"] > 0
+    outcomes = cascade.stats()["tiers"]
+    assert outcomes["tiny"]["outcomes"] == {"unsure": 1}
+    assert outcomes["small"]["outcomes"] == {"accepted": 1}
+
+def test_escalates_when_every_tier_falls_short():
+    failing = ScriptedModel(error=RuntimeError("down"))
+    planning = ScriptedModel(AIMessage(content="", tool_calls=[{"name": "WebSearch", "args": {}, "id": "1"}]))
+    cascade = ModelCascade([("tiny", failing), ("small", planning)], "large")
+    assert cascade.answer(MESSAGES, "standard") is None
+    assert cascade.stats()["tiers"]["tiny"]["outcomes"] == {"error": 1}
+    assert cascade.stats()["tiers"]["small"]["outcomes"] == {"tool_plan": 1}
+
+def test_detailed_queries_skip_the_cascade():
+    model = ScriptedModel(AIMessage(content="Fine."))
+    cascade = ModelCascade([("tiny", model)], "large")
+    assert cascade.answer(MESSAGES, "detailed") is None
+    assert model.calls == []
+
+def test_tier_skipped_when_it_would_not_leave_the_agent_time():
+    model = ScriptedModel(AIMessage(content="Fine."))
+    cascade = ModelCascade([("tiny", model)], "large", budgets={"short": 5})
+    cascade.record_latency("large", 3)
+    cascade.record_latency("tiny", 2.5)
+    assert cascade.answer(MESSAGES, "short") is None
+    assert model.calls == []
+    assert cascade.stats()["tiers"]["tiny"]["outcomes"] == {"over_budget": 1}
+    # A faster tier fits, with a time limit that leaves the agent its average
+    cascade.latency["tiny"] = 1
+    assert cascade.answer(MESSAGES, "short") == ("Fine.", "tiny")
+    assert 1000 < model.calls[0]["time_limit"] <= 2000
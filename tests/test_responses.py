@@ -0,0 +1,27 @@
+from autosphere_responses import NearDuplicateIndex, ResponseCache
+
+def test_answer_starting_with_sorry_is_cached():
+    cache = ResponseCache()
+    lookup = cache.lookup([], "Can you book my train?")
+    assert cache.store(lookup, "Sorry, I can't book tickets, but here is the IRCTC link.")
+    assert cache.lookup([], "can you book my  train?").response.startswith("Sorry,")
+
+def test_live_tool_answers_and_empty_replies_are_skipped():
+    cache = ResponseCache(tool_ttls={"Weather": 0})
+    lookup = cache.lookup([], "Weather in Pune?")
+    assert not cache.store(lookup, "Sunny, 31°C", tools=["Weather"])
+    assert not cache.store(lookup, "  ")
+    assert cache.lookup([], "Weather in Pune?").response is None
+
+def test_answers_depend_on_earlier_turns():
+    cache = ResponseCache()
+    cache.store(cache.lookup([("user", "Tell me about Pune")], "What is the population?"), "About 7 million")
+    assert cache.lookup([("user", "Tell me about Jaipur")], "What is the population?").response is None
+    assert cache.lookup([("user", "tell me about pune")], "What is the population?").response == "About 7 million"
+
+def test_near_duplicate_questions_match():
+    cache = ResponseCache(near_duplicates=NearDuplicateIndex(threshold=0.6))
+    cache.store(cache.lookup([], "How can IoT sensors help farmers save water?"), "Soil moisture sensors...")
+    found = cache.lookup([], "How can IoT sensors help farmers to save water")
+    assert found.result == "near"
+    assert found.response == "Soil moisture sensors..."
@@ -0,0 +1,23 @@
+from autosphere_retrieval import Retriever, source_key
+
+PAGE = "\n".join(f"Section {i} about irrigation and monsoon rice farming." for i in range(50))
+
+def test_pages_expire_after_max_age():
+    retriever = Retriever(chunk_chars=200)
+    source = source_key("Wikipedia", "Green Revolution")
+    retriever.ingest(source, PAGE)
+    assert retriever.has_source(source, max_age=3600)
+    retriever.index.ingested[source] -= 7200
+    assert retriever.has_source(source)
+    assert not retriever.has_source(source, max_age=3600)
+    assert not retriever.has_source(source, max_age=0)
+
+def test_invalidate_matches_tool_and_query():
+    retriever = Retriever(chunk_chars=200)
+    retriever.ingest(source_key("Wikipedia", "Green Revolution"), PAGE)
+    retriever.ingest(source_key("Wikipedia", "Monsoon"), PAGE)
+    retriever.ingest(source_key("WebCrawler", "https://example.org/Green"), PAGE)
+    assert retriever.invalidate(tool="Wikipedia", contains="green") == 1
+    assert retriever.invalidate(contains="GREEN") == 1
+    assert retriever.invalidate() == 1
+    assert retriever.stats()["sources"] == 0
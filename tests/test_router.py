@@ -0,0 +1,47 @@
+import pytest
+
+from autosphere_router import DEFAULT_RULES, IntentRouter
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter()
+
+@pytest.mark.parametrize("message, intent, query", [
+    ("hello there", "greeting", None),
+    ("weather in chennai", "weather", "chennai"),
+    ("weather in chennai tomorrow", "weather", "chennai"),
+    ("What is the weather like in Pune today?", "weather", "Pune"),
+    ("new delhi weather", "weather", "new delhi"),
+    ("forecast for jaipur", "weather", "jaipur"),
+    ("who was aryabhata", "wikipedia", "aryabhata"),
+    ("what is photosynthesis", "wikipedia", "photosynthesis"),
+    ("tell me about the green revolution", "wikipedia", "green revolution"),
+])
+def test_routes(router, message, intent, query):
+    route = router.match(message)
+    assert route is not None
+    assert (route.intent, route.query) == (intent, query)
+
+@pytest.mark.parametrize("message", [
+    "i want to know the weather",
+    "Explain the weather",
+    "bad weather",
+    "no weather",
+    "what is 5 plus 7",
+    "what is 12 * 3",
+    "what is the time",
+    "what is the date today",
+    "how can iot sensors help farmers save water",
+])
+def test_leaves_to_agent(router, message):
+    assert router.match(message) is None
+
+@pytest.mark.parametrize("message", ["i want to know the weather", "what is the time", "bad weather"])
+def test_classifier_leaves_to_agent(message):
+    assert IntentRouter(classifier=True).match(message) is None
+
+def test_pattern_examples_still_route(router):
+    for rule in DEFAULT_RULES:
+        for example in rule["examples"][:3]:
+            route = router.match(example)
+            assert route is not None and route.intent == rule["intent"], example
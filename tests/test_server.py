@@ -0,0 +1,144 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import autosphere_server as server
+from autosphere_admission import PriorityGate
+from autosphere_offline import OfflineAutoSphereAI
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "False")
+    ai = OfflineAutoSphereAI(model_options={"token_latency": 0, "first_token_latency": 0})
+    monkeypatch.setattr(server, "ai_instance", ai)
+    monkeypatch.setattr(server, "ai_state", "ready")
+    return server.app.test_client()
+
+def test_clear_drops_session(client):
+    response = client.post("/api/chat", json={"message": "How can IoT sensors help farmers save water?"})
+    session_id = response.get_json()["session_id"]
+    assert server.ai_instance.has_session(session_id)
+
+    response = client.post("/api/clear", json={"session_id": session_id})
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
+    assert not server.ai_instance.has_session(session_id)
+
+    response = client.post("/api/chat", json={"message": "And in Pune?", "session_id": session_id})
+    assert response.status_code == 409
+
+def test_clear_without_session(client):
+    response = client.post("/api/clear", json={})
+    assert response.status_code == 200
+    assert response.get_json()["success"] is True
+
+def test_batch_items_share_the_admission_gate(client, monkeypatch):
+    gate = PriorityGate(max_in_flight=2, max_queue=8)
+    monkeypatch.setattr(server, "admission", gate)
+    monkeypatch.setattr(server, "rate_limiter", None)
+    running, peak = [0], [0]
+    lock = threading.Lock()
+    answer = server.ai_instance.process_message
+
+    def process_message(*args, **kwargs):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        try:
+            time.sleep(0.02)
+            return answer(*args, **kwargs)
+        finally:
+            with lock:
+                running[0] -= 1
+
+    monkeypatch.setattr(server.ai_instance, "process_message", process_message)
+    items = [{"id": str(index), "message": f"Tell me about farm number {index}"} for index in range(6)]
+    response = client.post("/api/chat/batch", json={"items": items, "concurrency": 6})
+    results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert sorted(result["id"] for result in results) == [str(index) for index in range(6)]
+    assert all(result["success"] for result in results)
+    assert peak[0] == 2
+    assert gate.stats()["in_flight"] == 0
+
+def test_batch_item_rejected_by_gate_fails_alone(client, monkeypatch):
+    gate = PriorityGate(max_in_flight=1, max_queue=0)
+    monkeypatch.setattr(server, "admission", gate)
+    monkeypatch.setattr(server, "rate_limiter", None)
+    slot = gate.acquire()
+    try:
+        response = client.post("/api/chat/batch", json={"items": ["Hello there"]})
+    finally:
+        slot.release()
+    assert response.status_code == 200
+    (result,) = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert result == {"id": "0", "success": False, "error": "Server busy, please retry later"}
+
+@pytest.mark.parametrize("body", [{}, {"items": []}, {"items": "Hello there"}])
+def test_batch_rejects_bad_items(client, body):
+    response = client.post("/api/chat/batch", json=body)
+    assert response.status_code == 400
+    assert response.get_json() == {"success": False, "error": "items must be a non-empty list"}
+
+def test_batch_limits_item_count(client, monkeypatch):
+    monkeypatch.setenv("BATCH_MAX_ITEMS", "2")
+    response = client.post("/api/chat/batch", json={"items": ["a", "b", "c"]})
+    assert response.status_code == 413
+    assert response.get_json()["error"] == "At most 2 items per batch"
+
+def test_batch_streams_one_line_per_item(client, monkeypatch):
+    monkeypatch.setattr(server, "rate_limiter", None)
+    items = [{"id": "ok", "message": "Hello there"}, {"id": "empty", "message": "  "}, {"conversation_history": []}, "Hi there"]
+    response = client.post("/api/chat/batch", json={"items": items})
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    results = {result["id"]: result for result in map(json.loads, response.get_data(as_text=True).splitlines())}
+    assert set(results) == {"ok", "empty", "2", "3"}
+    assert results["ok"]["success"] is True and results["ok"]["response"]
+    assert results["empty"]["success"] is False
+    assert results["2"] == {"id": "2", "success": False, "error": "Message is required"}
+    # Bare strings are taken as the message
+    assert results["3"]["success"] is True
+
+def test_chat_waits_for_warm_up(monkeypatch):
+    monkeypatch.setattr(server, "ai_instance", None)
+    monkeypatch.setattr(server, "ai_state", "warming")
+    client = server.app.test_client()
+    response = client.post("/api/chat", json={"message": "Hello there"})
+    assert response.status_code == 503
+    assert response.get_json()["warming"] is True
+    assert client.get("/api/health").get_json()["status"] == "warming"
+
+def test_background_initialization(monkeypatch):
+    monkeypatch.setenv("IBM_API_KEY", "offline")
+    monkeypatch.setenv("IBM_PROJECT_ID", "offline")
+    monkeypatch.setenv("WORKERS", "1")
+    monkeypatch.setattr(server, "ai_instance", None)
+    monkeypatch.setattr(server, "ai_state", "pending")
+    monkeypatch.setattr(server, "AutoSphereAI", lambda api_key, project_id: OfflineAutoSphereAI())
+    thread = server.start_ai_initialization()
+    assert server.ai_state == "warming"
+    thread.join(30)
+    assert server.ai_state == "ready"
+    assert isinstance(server.ai_instance, OfflineAutoSphereAI)
+
+def test_initialization_without_credentials_fails(monkeypatch):
+    monkeypatch.delenv("IBM_API_KEY", raising=False)
+    monkeypatch.setattr(server, "ai_instance", None)
+    monkeypatch.setattr(server, "ai_state", "pending")
+    server.start_ai_initialization().join(5)
+    assert server.ai_state == "failed"
+    response = server.app.test_client().post("/api/chat", json={"message": "Hello there"})
+    assert response.status_code == 503
+    assert "warming" not in response.get_json()
+
+def test_server_import_leaves_ai_libraries_unloaded():
+    code = ("import sys, autosphere_server; "
+            "print(sorted(m for m in ('langchain_core', 'langgraph', 'ibm_watsonx_ai') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert output.stdout.strip() == "[]"
@@ -0,0 +1,113 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from autosphere_offline import OfflineAutoSphereAI
+from autosphere_singleflight import SingleFlight, make_normalizer
+
+QUESTION = "How can IoT sensors help farmers save water?"
+
+@pytest.fixture
+def ai(monkeypatch):
+    monkeypatch.setenv("RESPONSE_CACHE_ENABLED", "False")
+    return OfflineAutoSphereAI(model_options={"token_latency": 0.001, "first_token_latency": 0.2})
+
+def test_normalizer_steps():
+    normalize = make_normalizer("whitespace,case,punctuation")
+    assert normalize("  What's the  WEATHER?") == "what s the weather"
+    with pytest.raises(ValueError):
+        make_normalizer("stemming")
+
+def test_async_callers_share_one_run():
+    flight = SingleFlight("chat")
+    runs = []
+
+    async def run():
+        runs.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def main():
+        return await asyncio.gather(*[flight.ado("key", run) for _ in range(3)])
+
+    assert asyncio.run(main()) == [("answer", False), ("answer", True), ("answer", True)]
+    assert len(runs) == 1
+
+def test_async_waiter_joins_thread_run_and_times_out():
+    flight = SingleFlight("chat")
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=("key", lambda: release.wait() and "answer"))
+    leader.start()
+    time.sleep(0.02)
+
+    async def main():
+        with pytest.raises(TimeoutError):
+            await flight.ado("key", None, timeout=0.02)
+        waiting = asyncio.ensure_future(flight.ado("key", None))
+        await asyncio.sleep(0.02)
+        release.set()
+        return await waiting
+
+    assert asyncio.run(main()) == ("answer", True)
+    leader.join(1)
+
+def test_abandoned_stream_fails_its_waiters():
+    flight = SingleFlight("chat")
+
+    def run():
+        yield "token"
+        yield "token"
+        return "answer"
+
+    def consume():
+        result = yield from flight.stream("key", run)
+        return result
+
+    stream = consume()
+    assert next(stream) == "token"
+    errors = []
+
+    def wait():
+        try:
+            flight.do("key", None, timeout=2)
+        except RuntimeError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    time.sleep(0.02)
+    stream.close()
+    waiter.join(1)
+    assert len(errors) == 1
+    assert flight.stats()["in_flight"] == 0
+
+def test_aprocess_message_coalesces_opening_questions(ai):
+    async def main():
+        return await asyncio.gather(*[ai.aprocess_message(QUESTION, None, f"async-{index}") for index in range(3)])
+
+    responses = asyncio.run(main())
+    assert len(set(responses)) == 1
+    assert ai.chat_flight.stats()["shared"] == 2
+    assert all(ai.has_session(f"async-{index}") for index in range(3))
+
+def test_streams_coalesce_opening_questions(ai):
+    results = {}
+
+    def stream(session_id):
+        results[session_id] = list(ai.process_message_stream(QUESTION, None, session_id))
+
+    threads = [threading.Thread(target=stream, args=(f"stream-{index}",)) for index in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert ai.chat_flight.stats() == {"in_flight": 0, "executions": 1, "shared": 2, "overflows": 0}
+    responses = {events[-1]["response"] for events in results.values()}
+    assert len(responses) == 1
+    token_counts = sorted(sum(event["type"] == "token" for event in events) for events in results.values())
+    # Two joined the leader's run and got its answer in one piece
+    assert token_counts[:2] == [1, 1] and token_counts[2] > 1
+    assert all(ai.has_session(session_id) for session_id in results)
@@ -0,0 +1,72 @@
+import gzip
+
+import autosphere_server as server
+from autosphere_static import StaticAssets, accepted_encodings
+
+def make_site(root):
+    (root / "index.html").write_text('<link href="styles.css"><script src="script.js"></script>' + "<p>hi</p>" * 50)
+    (root / "styles.css").write_text('body { background: url("logo.png"); }' + " " * 500)
+    (root / "script.js").write_text("console.log('ready');\n" * 40)
+    (root / "logo.png").write_bytes(b"\x89PNG" + bytes(64))
+    (root / "secret.py").write_text("TOKEN = 'x'")
+    return StaticAssets(str(root))
+
+def test_references_point_at_fingerprinted_paths(tmp_path):
+    assets = make_site(tmp_path)
+    html = assets.assets["index.html"].body.decode()
+    assert f'href="{assets.url_for("styles.css")}"' in html
+    assert f'src="{assets.url_for("script.js")}"' in html
+    assert assets.url_for("logo.png") in assets.assets["styles.css"].body.decode()
+    assert "secret.py" not in assets.assets
+
+def test_gzip_variant_and_etag_per_encoding(tmp_path):
+    assets = make_site(tmp_path)
+    status, headers, body = assets.respond("script.js", accept_encoding="gzip, deflate")
+    assert status == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(body) == assets.assets["script.js"].body
+    status, plain, body = assets.respond("script.js", accept_encoding="gzip;q=0")
+    assert "Content-Encoding" not in plain
+    assert body == assets.assets["script.js"].body
+    assert plain["ETag"] != headers["ETag"]
+
+def test_small_binaries_are_not_compressed(tmp_path):
+    assets = make_site(tmp_path)
+    status, headers, _ = assets.respond("logo.png", accept_encoding="gzip, br")
+    assert status == 200 and "Content-Encoding" not in headers
+    assert headers["Content-Type"] == "image/png"
+
+def test_if_none_match_returns_304(tmp_path):
+    assets = make_site(tmp_path)
+    _, headers, _ = assets.respond("styles.css", accept_encoding="gzip")
+    etag = headers["ETag"]
+    assert assets.respond("styles.css", "gzip", f'"stale", {etag}')[0] == 304
+    assert assets.respond("styles.css", "gzip", "*")[0] == 304
+    status, headers, body = assets.respond("styles.css", "gzip", etag)
+    assert body == b"" and headers["ETag"] == etag
+    # The identity representation has its own tag
+    assert assets.respond("styles.css", None, etag)[0] == 200
+
+def test_cache_control_by_path(tmp_path):
+    assets = make_site(tmp_path)
+    assert assets.respond("styles.css")[1]["Cache-Control"] == "no-cache"
+    immutable = assets.respond(assets.url_for("styles.css"))[1]["Cache-Control"]
+    assert "immutable" in immutable
+    assert assets.respond("secret.py") is None
+
+def test_accepted_encodings_ignores_zero_quality():
+    assert accepted_encodings("br;q=0, GZIP;q=0.5, identity") == {"gzip", "identity"}
+    assert accepted_encodings(None) == set()
+
+def test_flask_serves_assets_with_conditional_requests():
+    client = server.app.test_client()
+    response = client.get("/", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/html")
+    etag = response.headers["ETag"]
+    response = client.get("/", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.get("/autosphere_server.py").status_code == 404
+    assert client.get("/config.env").status_code == 404
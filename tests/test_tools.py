@@ -0,0 +1,80 @@
+import threading
+import time
+from contextvars import ContextVar
+
+import pytest
+
+from autosphere_singleflight import SingleFlight
+from autosphere_tools import ToolRunner, remaining_time
+
+@pytest.fixture
+def runner():
+    runner = ToolRunner(default_timeout=0.3, max_workers=4, max_per_tool=2)
+    yield runner
+    runner.shutdown()
+
+def test_hung_tool_does_not_starve_others(runner):
+    hang = threading.Event()
+    flight = SingleFlight("tool")
+    runner.register("WebCrawler", lambda query: flight.do(query, hang.wait, timeout=remaining_time())[0])
+    runner.register("Weather", lambda query: f"Sunny in {query}")
+    callers = [threading.Thread(target=runner.run, args=("WebCrawler", "https://slow.example")) for _ in range(20)]
+    for caller in callers:
+        caller.start()
+    time.sleep(0.05)
+    try:
+        assert runner.run("Weather", "Chennai") == "Sunny in Chennai"
+        for caller in callers:
+            caller.join(2)
+        # Joiners gave their threads back at the deadline
+        assert "timed out" in runner.run("WebCrawler", "https://slow.example")
+        assert runner.run("Weather", "Pune") == "Sunny in Pune"
+    finally:
+        hang.set()
+
+def test_timeout_counts_time_waiting_for_a_slot(runner):
+    hang = threading.Event()
+    runner.register("WebCrawler", lambda query: hang.wait())
+    try:
+        start = time.monotonic()
+        results = []
+        callers = [threading.Thread(target=lambda: results.append(runner.run("WebCrawler", "x"))) for _ in range(3)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join(2)
+        assert len(results) == 3 and all("timed out" in result for result in results)
+        assert time.monotonic() - start < 1
+    finally:
+        hang.set()
+
+def test_fetch_sees_caller_context_and_deadline(runner):
+    request_id = ContextVar("request_id", default=None)
+    runner.register("Weather", lambda query: (request_id.get(), remaining_time()))
+    request_id.set("abc")
+    seen, remaining = runner.run("Weather", "Chennai")
+    assert seen == "abc"
+    assert 0 < remaining <= 0.3
+
+def test_slow_search_is_hedged():
+    runner = ToolRunner(default_timeout=2, hedge_groups=[("GoogleSearch", "DuckDuckGo")], hedge_delay=0.05)
+    release = threading.Event()
+    runner.register("GoogleSearch", lambda query: release.wait(1) and "google")
+    runner.register("DuckDuckGo", lambda query: f"duck: {query}")
+    try:
+        assert runner.run("GoogleSearch", "millets") == "duck: millets"
+    finally:
+        release.set()
+        runner.shutdown()
+
+def test_single_flight_waiter_times_out():
+    flight = SingleFlight("tool")
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=("key", lambda: release.wait() and "done"))
+    leader.start()
+    time.sleep(0.02)
+    with pytest.raises(TimeoutError):
+        flight.do("key", lambda: "mine", timeout=0.05)
+    release.set()
+    leader.join(1)
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "shared": 1, "overflows": 0}
@@ -0,0 +1,72 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from autosphere_memory import CompactSerializer
+from autosphere_turns import Transcript, decode_turns, encode_turns, pack_messages
+
+def conversation():
+    return [
+        SystemMessage(content="You are AutoSphere AI."),
+        HumanMessage(content="चेन्नई में मौसम कैसा है? 🌧️", id="m1"),
+        AIMessage(
+            content="",
+            id="m2",
+            tool_calls=[{"name": "Weather", "args": {"location": "Chennai"}, "id": "call_1", "type": "tool_call"}],
+            additional_kwargs={"refusal": None, "extra": {"nested": [1, 2.5, True]}},
+            response_metadata={"model_name": "ibm/granite", "finish_reason": "tool_calls"},
+            usage_metadata={"input_tokens": 12, "output_tokens": 3, "total_tokens": 15},
+        ),
+        ToolMessage(content="Rain, 27°C", tool_call_id="call_1", name="Weather"),
+        AIMessage(content=[{"type": "text", "text": "Expect rain — carry an umbrella."}], id="m3"),
+    ]
+
+def test_messages_round_trip():
+    serde = CompactSerializer()
+    messages = conversation()
+    type_, data = serde.dumps_typed(messages)
+    assert type_ == "turns"
+    assert serde.loads_typed((type_, data)) == messages
+
+def test_checkpoint_round_trip_keeps_other_channels():
+    serde = CompactSerializer()
+    checkpoint = {
+        "v": 1,
+        "id": "checkpoint-1",
+        "channel_values": {"messages": conversation(), "remaining_steps": 24, "summary": "Nothing yet"},
+        "channel_versions": {"messages": 3, "remaining_steps": 1},
+    }
+    type_, data = serde.dumps_typed(checkpoint)
+    assert type_ == "checkpoint+turns"
+    assert serde.loads_typed((type_, data)) == checkpoint
+
+def test_reads_values_written_by_default_serializer():
+    messages = conversation()
+    assert CompactSerializer().loads_typed(JsonPlusSerializer().dumps_typed(messages)) == messages
+
+@pytest.mark.parametrize("kwargs", [
+    {"additional_kwargs": {"scores": {1: "high", 2: "low"}}},
+    {"additional_kwargs": {"span": (3, 7)}},
+    {"response_metadata": {"ratio": float("nan")}},
+])
+def test_values_json_would_change_fall_back(kwargs):
+    serde = CompactSerializer()
+    messages = [HumanMessage(content="Hello"), AIMessage(content="Hi", **kwargs)]
+    assert pack_messages(messages) is None
+    type_, data = serde.dumps_typed(messages)
+    assert type_ != "turns"
+    # Stored exactly as the default serializer would store it
+    expected = JsonPlusSerializer().loads_typed(JsonPlusSerializer().dumps_typed(messages))
+    assert repr(serde.loads_typed((type_, data))) == repr(expected)
+
+def test_turn_dicts_round_trip():
+    turns = [
+        {"role": "user", "content": "Namaste 🙏"},
+        {"role": "assistant", "content": "Hello! How can I help?"},
+        {"role": "narrator", "content": [{"type": "image"}], "name": "scene"},
+    ]
+    data = encode_turns(turns)
+    assert decode_turns(data) == turns
+    assert Transcript.from_bytes(data)[-1]["role"] == "narrator"
+    with pytest.raises(ValueError):
+        Transcript.from_bytes(data[:-1])
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+from autosphere_ai import ErrorReply
+from autosphere_offline import OfflineAutoSphereAI
+from autosphere_workers import InMemorySessionStore, SQLiteSessionStore, WorkerPool
+
+def offline_ai():
+    return OfflineAutoSphereAI(model_options={"token_latency": 0, "first_token_latency": 0})
+
+@pytest.fixture(scope="module")
+def pool():
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("RESPONSE_CACHE_ENABLED", "False")
+        patch.setenv("SINGLEFLIGHT_ENABLED", "False")
+        pool = WorkerPool(2, factory=offline_ai, timeout=60)
+        assert pool.start(ready_timeout=120)
+    yield pool
+    pool.shutdown()
+
+def test_stream_relays_worker_events(pool):
+    events = list(pool.process_message_stream("How can IoT sensors help farmers in Pune save water?", None, "stream-1"))
+    types = [event["type"] for event in events]
+    assert types[-1] == "done"
+    assert types.count("token") > 1
+    assert "tool_start" in types and "tool_end" in types
+    response = events[-1]["response"]
+    assert response == "".join(event["content"] for event in events[types.index("tool_end") + 1:-1])
+    assert pool.store.load("stream-1")[-1] == {"role": "assistant", "content": response}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return InMemorySessionStore(max_sessions=3, idle_ttl=60)
+    return SQLiteSessionStore(str(tmp_path / "sessions.db"), max_sessions=3, idle_ttl=60)
+
+def turns(text):
+    return [{"role": "user", "content": text}, {"role": "assistant", "content": f"Re: {text}"}]
+
+def test_store_appends_and_deletes(store):
+    store.append("a", turns("one"))
+    store.append("a", turns("two"))
+    assert [turn["content"] for turn in store.load("a")] == ["one", "Re: one", "two", "Re: two"]
+    store.save("a", turns("fresh"))
+    assert store.load("a") == turns("fresh")
+    store.delete("a")
+    assert store.load("a") is None and not store.exists("a")
+
+def test_store_evicts_idle_and_least_recent(store, monkeypatch):
+    now = time.time()
+    for index in range(5):
+        monkeypatch.setattr(time, "time", lambda: now + index)
+        store.save(f"s{index}", turns(str(index)))
+    store.evict()
+    assert [store.exists(f"s{index}") for index in range(5)] == [False, False, True, True, True]
+    monkeypatch.setattr(time, "time", lambda: now + 64)
+    # s2 has been idle for over a minute: gone on read, before any sweep
+    assert store.load("s2") is None
+    assert store.exists("s4")
+
+def test_sessions_stick_to_one_worker(tmp_path):
+    pool = WorkerPool(4, store_spec=f"sqlite:///{tmp_path / 'sessions.db'}")
+    pool._healthy = [True] * 4
+    assert len({pool.worker_for("session-1") for _ in range(10)}) == 1
+    assert sorted(pool.worker_for(None) for _ in range(8)) == [0, 0, 1, 1, 2, 2, 3, 3]
+    # A worker that failed to start gets neither sticky nor stateless requests
+    pool._healthy[pool.worker_for("session-1")] = False
+    assert pool.worker_for("session-1") in pool.routable()
+    assert len(pool.routable()) == 3
+    assert all(pool.worker_for(None) in pool.routable() for _ in range(6))
+
+def test_restarted_worker_resumes_session_from_store(pool):
+    pool.process_message("How can IoT sensors help farmers in Pune save water?", None, "resume-1")
+    index = pool.worker_for("resume-1")
+    pool._processes[index].kill()
+    pool._processes[index].join(5)
+    response = pool.process_message("What about drip irrigation in Pune?", None, "resume-1")
+    assert not isinstance(response, ErrorReply)
+    stored = pool.store.load("resume-1")
+    assert [turn["role"] for turn in stored] == ["user", "assistant", "user", "assistant"]
+    assert stored[2]["content"] == "What about drip irrigation in Pune?"